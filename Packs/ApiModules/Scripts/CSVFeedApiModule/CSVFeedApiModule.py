@@ -3,9 +3,11 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 ''' IMPORTS '''
+import codecs
 import csv
-import gzip
+import zlib
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Pattern, Dict, Any, Tuple, Union, List
 
 # disable insecure warnings
@@ -13,6 +15,9 @@ urllib3.disable_warnings()
 
 # Globals
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+FEED_CHUNK_SIZE = 1024 * 1024
+MAX_CONCURRENT_REQUESTS = 5
+FEED_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # the downloaded feeds are written to the disk beyond this size
 
 
 class Client(BaseClient):
@@ -105,74 +110,124 @@ class Client(BaseClient):
             'quotechar': quotechar,
             'skipinitialspace': skipinitialspace
         }
+        # whether none of the feeds was modified since the last fetch, set by build_iterator
+        self.feeds_not_modified = False
+        # the responses of the feeds URLs, whose conditional request headers are saved after the fetch
+        self.feed_responses: Dict[str, requests.Response] = {}
 
-    def _build_request(self, url):
+    def _build_request(self, url, headers=None):
         r = requests.Request(
             'GET',
             url,
+            headers=headers,
             auth=self._auth
         )
 
         return r.prepare()
 
-    def build_iterator(self, **kwargs):
-        results = []
-        urls = self._base_url
-        if not isinstance(urls, list):
-            urls = [urls]
-        for url in urls:
-            _session = requests.Session()
+    def send_feed_request(self, url, use_conditional_get=False, **kwargs):
+        """Sends the request of a single feed URL using the client session.
 
-            prepreq = self._build_request(url)
+        Args:
+            url: The feed's url.
+            use_conditional_get: Whether to send the conditional request headers saved for the url.
+            kwargs: Additional arguments of the request.
 
-            # this is to honour the proxy environment variables
-            kwargs.update(_session.merge_environment_settings(
-                prepreq.url,
-                {}, None, None, None  # defaults
-            ))
-            kwargs['stream'] = True
-            kwargs['verify'] = self._verify
-            kwargs['timeout'] = self.polling_timeout
+        Returns:
+            requests.Response. The streamed response of the feed.
+        """
+        kwargs = dict(kwargs)
+        headers = dict(kwargs.pop('headers', None) or {}, **(self.headers or {}))
+        if use_conditional_get:
+            headers.update(get_conditional_request_headers(url))
+        prepreq = self._build_request(url, headers)
+
+        # this is to honour the proxy environment variables
+        kwargs.update(self._session.merge_environment_settings(
+            prepreq.url,
+            {}, None, None, None  # defaults
+        ))
+        kwargs['stream'] = True
+        kwargs['verify'] = self._verify
+        kwargs['timeout'] = self.polling_timeout
 
-            if self.headers:
-                if 'headers' in kwargs:
-                    kwargs['headers'].update(self.headers)
-                else:
-                    kwargs['headers'] = self.headers
+        try:
+            r = self._session.send(prepreq, **kwargs)
+        except requests.exceptions.ConnectTimeout as exception:
+            err_msg = 'Connection Timeout Error - potential reasons might be that the Server URL parameter' \
+                      ' is incorrect or that the Server is not accessible from your host.'
+            raise DemistoException(err_msg, exception)
+        except requests.exceptions.SSLError as exception:
+            # in case the "Trust any certificate" is already checked
+            if not self._verify:
+                raise
+            err_msg = 'SSL Certificate Verification Failed - try selecting \'Trust any certificate\' checkbox in' \
+                      ' the integration configuration.'
+            raise DemistoException(err_msg, exception)
+        except requests.exceptions.ProxyError as exception:
+            err_msg = 'Proxy Error - if the \'Use system proxy\' checkbox in the integration configuration is' \
+                      ' selected, try clearing the checkbox.'
+            raise DemistoException(err_msg, exception)
+        except requests.exceptions.ConnectionError as exception:
+            # Get originating Exception in Exception chain
+            error_class = str(exception.__class__)
+            err_type = '<' + error_class[error_class.find('\'') + 1: error_class.rfind('\'')] + '>'
+            err_msg = 'Verify that the server URL parameter' \
+                      ' is correct and that you have access to the server from your host.' \
+                      '\nError Type: {}\nError Number: [{}]\nMessage: {}\n' \
+                .format(err_type, exception.errno, exception.strerror)
+            raise DemistoException(err_msg, exception)
+        return r
+
+    def build_iterator(self, use_conditional_get=False, **kwargs):
+        """Downloads the feeds and returns a CSV reader per feed URL.
 
-            try:
-                r = _session.send(prepreq, **kwargs)
-            except requests.exceptions.ConnectTimeout as exception:
-                err_msg = 'Connection Timeout Error - potential reasons might be that the Server URL parameter' \
-                          ' is incorrect or that the Server is not accessible from your host.'
-                raise DemistoException(err_msg, exception)
-            except requests.exceptions.SSLError as exception:
-                # in case the "Trust any certificate" is already checked
-                if not self._verify:
-                    raise
-                err_msg = 'SSL Certificate Verification Failed - try selecting \'Trust any certificate\' checkbox in' \
-                          ' the integration configuration.'
-                raise DemistoException(err_msg, exception)
-            except requests.exceptions.ProxyError as exception:
-                err_msg = 'Proxy Error - if the \'Use system proxy\' checkbox in the integration configuration is' \
-                          ' selected, try clearing the checkbox.'
-                raise DemistoException(err_msg, exception)
-            except requests.exceptions.ConnectionError as exception:
-                # Get originating Exception in Exception chain
-                error_class = str(exception.__class__)
-                err_type = '<' + error_class[error_class.find('\'') + 1: error_class.rfind('\'')] + '>'
-                err_msg = 'Verify that the server URL parameter' \
-                          ' is correct and that you have access to the server from your host.' \
-                          '\nError Type: {}\nError Number: [{}]\nMessage: {}\n' \
-                    .format(err_type, exception.errno, exception.strerror)
-                raise DemistoException(err_msg, exception)
+        Args:
+            use_conditional_get: Whether to send the If-None-Match and If-Modified-Since headers saved in the
+                integration context. If none of the feeds was modified, no readers are returned and
+                feeds_not_modified is set. If only some of them were not modified, they are requested again
+                without the conditional headers. The responses are kept in feed_responses.
+            kwargs: Additional arguments of the requests.
+
+        Returns:
+            List. List of dicts of a url and its CSV reader.
+        """
+        results = []
+        urls = self._base_url
+        if not isinstance(urls, list):
+            urls = [urls]
+        self.feeds_not_modified = False
+        self.feed_responses = {}
+
+        def download_feed(url, conditional=use_conditional_get):
+            r = self.send_feed_request(url, use_conditional_get=conditional, **kwargs)
+            # the content is downloaded by the worker, so a slow feed does not stall the download of the others
+            content = spool_response_content(r, FEED_CHUNK_SIZE, FEED_MAX_MEMORY_SIZE) if r.status_code == 200 \
+                else None
+            return r, content
+
+        # the feeds are downloaded concurrently, and parsed in the order of the URLs
+        with ThreadPoolExecutor(max_workers=max(min(MAX_CONCURRENT_REQUESTS, len(urls)), 1)) as executor:
+            downloads = list(executor.map(download_feed, urls))
+            not_modified_urls = [url for url, (r, _) in zip(urls, downloads) if r.status_code == 304]
+            if len(not_modified_urls) == len(urls):
+                demisto.debug('The feeds were not modified since the last fetch.')
+                self.feeds_not_modified = True
+                return results
+            if not_modified_urls:
+                full_downloads = dict(zip(not_modified_urls, executor.map(
+                    lambda url: download_feed(url, conditional=False), not_modified_urls)))
+                downloads = [full_downloads.get(url, download) for url, download in zip(urls, downloads)]
+        self.feed_responses = {url: r for url, (r, _) in zip(urls, downloads)}
+
+        for url, (r, content) in zip(urls, downloads):
             try:
                 r.raise_for_status()
             except Exception:
                 return_error('Exception in request: {} {}'.format(r.status_code, r.content))
                 raise
 
-            response = self.get_feed_content_divided_to_lines(url, r)
+            response = self.get_feed_content_divided_to_lines(url, content if content is not None else r)
             if self.feed_url_to_config:
                 fieldnames = self.feed_url_to_config.get(url, {}).get('fieldnames', [])
                 skip_first_line = self.feed_url_to_config.get(url, {}).get('skip_first_line', False)
@@ -199,21 +254,37 @@ class Client(BaseClient):
         return results
 
     def get_feed_content_divided_to_lines(self, url, raw_response):
-        """Fetch feed data and divides its content to lines
+        """Fetch feed data and divides its content to lines.
+        The content is downloaded, decompressed and decoded in chunks, so only one chunk
+        of the feed is held in memory at a time.
 
         Args:
             url: Current feed's url.
-            raw_response: The raw response from the feed's url.
+            raw_response: The raw response from the feed's url, or a file of its downloaded content.
 
         Returns:
-            List. List of lines from the feed content.
+            Iterator. Iterator of lines from the feed content.
         """
-        if self.feed_url_to_config and self.feed_url_to_config.get(url).get('is_zipped_file'):  # type: ignore
-            response_content = gzip.decompress(raw_response.content)
+        decompressor = None
+        if self.feed_url_to_config and self.feed_url_to_config.get(url, {}).get('is_zipped_file'):
+            # 16 + MAX_WBITS expects a gzip header and trailer
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+
+        remainder = ''
+        if isinstance(raw_response, requests.Response):
+            chunks = raw_response.iter_content(chunk_size=FEED_CHUNK_SIZE)
         else:
-            response_content = raw_response.content
-
-        return response_content.decode(self.encoding).split('\n')
+            chunks = iter(lambda: raw_response.read(FEED_CHUNK_SIZE), b'')
+        for chunk in chunks:
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            lines = (remainder + decoder.decode(chunk)).split('\n')
+            remainder = lines.pop()
+            yield from lines
+        if decompressor:
+            remainder += decoder.decode(decompressor.flush())
+        yield from (remainder + decoder.decode(b'', final=True)).split('\n')
 
 
 def determine_indicator_type(indicator_type, default_indicator_type, auto_detect, value):
@@ -286,11 +357,14 @@ def create_fields_mapping(raw_json: Dict[str, Any], mapping: Dict[str, Union[Tup
     return fields_mapping
 
 
-def fetch_indicators_command(client: Client, default_indicator_type: str, auto_detect: bool, limit: int = 0,
-                             create_relationships: bool = False, **kwargs):
-    iterator = client.build_iterator(**kwargs)
+def fetch_indicators_generator(client: Client, default_indicator_type: str, auto_detect: bool, limit: int = 0,
+                               create_relationships: bool = False, use_conditional_get: bool = False, **kwargs):
+    """Generator of the feed indicators.
+    The feed is parsed while it is downloaded, so the indicators can be submitted before the whole feed is parsed.
+    """
+    iterator = client.build_iterator(use_conditional_get=use_conditional_get, **kwargs)
     relationships_of_indicator = []
-    indicators = []
+    indicators_count = 0
     config = client.feed_url_to_config or {}
     for url_to_reader in iterator:
         for url, reader in url_to_reader.items():
@@ -332,12 +406,17 @@ def fetch_indicators_command(client: Client, default_indicator_type: str, auto_d
                     if client.tlp_color:
                         indicator['fields']['trafficlightprotocol'] = client.tlp_color
 
-                    indicators.append(indicator)
+                    yield indicator
+                    indicators_count += 1
                     # exit the loop if we have more indicators than the limit
-                    if limit and len(indicators) >= limit:
-                        return indicators
+                    if limit and indicators_count >= limit:
+                        return
 
-    return indicators
+
+def fetch_indicators_command(client: Client, default_indicator_type: str, auto_detect: bool, limit: int = 0,
+                             create_relationships: bool = False, **kwargs):
+    return list(fetch_indicators_generator(client, default_indicator_type, auto_detect, limit, create_relationships,
+                                           **kwargs))
 
 
 def get_indicators_command(client, args: dict, tags: Optional[List[str]] = None):
@@ -373,16 +452,21 @@ def feed_main(feed_name, params=None, prefix=''):
     }
     try:
         if command == 'fetch-indicators':
-            indicators = fetch_indicators_command(
+            # conditional requests are used only if the noUpdate parameter is supported (version 6.5.0 and above)
+            is_no_update_supported = is_demisto_version_ge('6.5.0')
+            # we submit the indicators in batches, while the feed is still being parsed
+            create_indicators_in_batches(fetch_indicators_generator(
                 client,
                 params.get('indicator_type'),
                 params.get('auto_detect_type'),
                 params.get('limit'),
-                params.get('create_relationships')
-            )
-            # we submit the indicators in batches
-            for b in batch(indicators, batch_size=2000):
-                demisto.createIndicators(b)  # type: ignore
+                params.get('create_relationships'),
+                use_conditional_get=is_no_update_supported
+            ))
+            if client.feeds_not_modified:
+                demisto.createIndicators([], noUpdate=True)  # type: ignore
+            elif is_no_update_supported:
+                save_conditional_request_headers(client.feed_responses)
         else:
             args = demisto.args()
             args['feed_name'] = feed_name
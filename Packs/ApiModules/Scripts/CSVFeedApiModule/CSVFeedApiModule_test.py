@@ -148,7 +148,82 @@ def test_get_feed_content():
             m.get(url, content=feed_url_to_config.get(url).get('content'))
             raw_response = requests.get(url)
 
-            assert client.get_feed_content_divided_to_lines(url, raw_response) == expected_output
+            assert list(client.get_feed_content_divided_to_lines(url, raw_response)) == expected_output
+
+
+@pytest.mark.parametrize('is_zipped_file', [False, True])
+def test_get_feed_content_in_chunks(mocker, is_zipped_file):
+    """
+    Given:
+    - A feed (zipped and unzipped) with multi-byte characters, downloaded in chunks of a few bytes
+
+    When:
+    - Dividing the feed content to lines
+
+    Then:
+    - Validate the lines are the same as the lines of the full decoded content
+    """
+    import gzip
+    import CSVFeedApiModule
+    mocker.patch.object(CSVFeedApiModule, 'FEED_CHUNK_SIZE', 3)
+    content = u'1.1.1.1,אב\n2.2.2.2,é\r\n\n3.3.3.3,c'.encode('utf8')
+    url = 'https://ipstack.com'
+    client = Client(url=url, feed_url_to_config={url: {'is_zipped_file': is_zipped_file}}, encoding='utf8')
+
+    with requests_mock.Mocker() as m:
+        m.get(url, content=gzip.compress(content) if is_zipped_file else content)
+        raw_response = requests.get(url, stream=True)
+        lines = client.get_feed_content_divided_to_lines(url, raw_response)
+        assert not isinstance(lines, list)
+        assert list(lines) == content.decode('utf8').split('\n')
+
+
+def test_fetch_indicators_generator():
+    """
+    Given:
+    - A feed with 5 indicators
+
+    When:
+    - Fetching the indicators with the generator, with and without a limit
+
+    Then:
+    - Validate the indicators are yielded in the order of the feed, and that the limit is honoured
+    """
+    url = 'https://ipstack.com'
+    content = '\n'.join('{}.{}.{}.{}'.format(i, i, i, i) for i in range(1, 6)).encode('utf8')
+    with requests_mock.Mocker() as m:
+        m.get(url, content=content)
+        client = Client(url=url, fieldnames='value')
+        indicators = list(fetch_indicators_generator(client, 'IP', False))
+        assert [indicator['value'] for indicator in indicators] == [
+            '1.1.1.1', '2.2.2.2', '3.3.3.3', '4.4.4.4', '5.5.5.5']
+
+        indicators = list(fetch_indicators_generator(client, 'IP', False, limit=3))
+        assert len(indicators) == 3
+
+
+def test_feed_main_submits_batches(mocker):
+    """
+    Given:
+    - A feed with 5 indicators
+
+    When:
+    - Running the fetch-indicators command
+
+    Then:
+    - Validate the indicators are submitted in batches while the feed is parsed
+    """
+    import CSVFeedApiModule
+    mocker.patch.object(CSVFeedApiModule, 'create_indicators_in_batches',
+                        side_effect=lambda indicators: create_indicators_in_batches(indicators, max_batch_size=2))
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    create_indicators = mocker.patch.object(demisto, 'createIndicators')
+    url = 'https://ipstack.com'
+    content = '\n'.join('{}.{}.{}.{}'.format(i, i, i, i) for i in range(1, 6)).encode('utf8')
+    with requests_mock.Mocker() as m:
+        m.get(url, content=content)
+        feed_main('Test', params={'url': url, 'fieldnames': 'value', 'indicator_type': 'IP'})
+    assert [len(call[0][0]) for call in create_indicators.call_args_list] == [2, 2, 1]
 
 
 @pytest.mark.parametrize('date_string,expected_result', [
@@ -369,3 +444,167 @@ def test_get_indicators_without_relations():
         indicators = fetch_indicators_command(client, default_indicator_type=itype, auto_detect=False,
                                               limit=35, create_relationships=False)
         assert indicators == expected_res
+
+
+def test_build_iterator_multiple_urls(mocker):
+    """
+    Given:
+    - A feed with several URLs, where the first URLs are the slowest to respond
+
+    When:
+    - Building the iterator, the URLs are requested concurrently
+
+    Then:
+    - Validate the readers are returned in the order of the URLs, and the client session is shared by the requests
+    """
+    import time
+    urls = ['https://example.com/feed{}.csv'.format(i) for i in range(4)]
+    with requests_mock.Mocker() as m:
+        for i, url in enumerate(urls):
+            def callback(request, context, i=i):
+                time.sleep(0.05 * (len(urls) - i))
+                return '1.1.1.{}'.format(i)
+            m.get(url, text=callback)
+        client = Client(url=urls, fieldnames='value')
+        send = mocker.spy(client._session, 'send')
+        results = client.build_iterator()
+
+        assert [list(result.keys())[0] for result in results] == urls
+        assert [[row['value'] for row in list(result.values())[0]] for result in results] == \
+            [['1.1.1.{}'.format(i)] for i in range(4)]
+    assert send.call_count == 4
+
+
+def test_build_iterator_slow_feed_body():
+    """
+    Given:
+    - A feed with two URLs, where the body of the first URL is slow to download
+
+    When:
+    - Building the iterator
+
+    Then:
+    - Validate the body of the second URL is downloaded while the first is still downloading
+    - Validate the content of both feeds is returned in the order of the URLs
+    """
+    import io
+    import threading
+    second_body_read = threading.Event()
+
+    class SlowBody(io.BytesIO):
+        def read(self, *args, **kwargs):
+            assert second_body_read.wait(timeout=5), 'the feed bodies were not downloaded concurrently'
+            return super().read(*args, **kwargs)
+
+    class Body(io.BytesIO):
+        def read(self, *args, **kwargs):
+            second_body_read.set()
+            return super().read(*args, **kwargs)
+
+    urls = ['https://example.com/feed1.csv', 'https://example.com/feed2.csv']
+    with requests_mock.Mocker() as m:
+        m.get(urls[0], body=SlowBody(b'1.1.1.1'))
+        m.get(urls[1], body=Body(b'2.2.2.2'))
+        client = Client(url=urls, fieldnames='value')
+        results = client.build_iterator()
+
+        assert [[row['value'] for row in list(result.values())[0]] for result in results] == \
+            [['1.1.1.1'], ['2.2.2.2']]
+
+
+class TestConditionalGet:
+    urls = ['https://example.com/feed1.csv', 'https://example.com/feed2.csv']
+    context = {
+        'https://example.com/feed1.csv': {'etag': '"1"', 'last_modified': 'Mon, 01 Nov 2021 10:00:00 GMT'},
+        'https://example.com/feed2.csv': {'etag': '"2"', 'last_modified': 'Mon, 01 Nov 2021 10:00:00 GMT'},
+    }
+
+    def test_feed_main_not_modified(self, mocker):
+        """
+        Given:
+        - A feed whose URLs were fetched before, with the ETag and Last-Modified headers saved in the context
+
+        When:
+        - Fetching indicators, and the server returns 304 for all the URLs
+
+        Then:
+        - Validate the conditional headers are sent, and createIndicators is called with noUpdate=True
+        """
+        mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+        mocker.patch('CSVFeedApiModule.is_demisto_version_ge', return_value=True)
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(self.context))
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        create_indicators = mocker.patch.object(demisto, 'createIndicators')
+        with requests_mock.Mocker() as m:
+            for url in self.urls:
+                m.get(url, status_code=304)
+            feed_main('CSV Feed', params={'url': self.urls, 'fieldnames': 'value', 'indicator_type': 'IP'})
+            sent_headers = {request.url: request.headers for request in m.request_history}
+            assert sent_headers[self.urls[0]]['If-None-Match'] == '"1"'
+            assert sent_headers[self.urls[1]]['If-None-Match'] == '"2"'
+            assert sent_headers[self.urls[0]]['If-Modified-Since'] == 'Mon, 01 Nov 2021 10:00:00 GMT'
+            assert m.call_count == 2
+        create_indicators.assert_called_once_with([], noUpdate=True)
+        set_context.assert_not_called()
+
+    def test_build_iterator_partially_modified(self, mocker):
+        """
+        Given:
+        - A feed whose URLs were fetched before, with the ETag and Last-Modified headers saved in the context
+
+        When:
+        - Building the iterator with conditional requests, and only the second URL was modified
+
+        Then:
+        - Validate the first URL is requested again without the conditional headers,
+          and the responses of both URLs are kept without saving their headers yet
+        """
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(self.context))
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        with requests_mock.Mocker() as m:
+            m.get(self.urls[0], [{'status_code': 304},
+                                 {'text': '1.1.1.1', 'headers': {'ETag': '"3"'}}])
+            m.get(self.urls[1], text='2.2.2.2', headers={'ETag': '"4"'})
+            client = Client(url=self.urls, fieldnames='value')
+            results = client.build_iterator(use_conditional_get=True)
+
+            assert m.call_count == 3
+            assert 'If-None-Match' not in m.request_history[-1].headers
+        assert not client.feeds_not_modified
+        assert [[row['value'] for row in list(result.values())[0]] for result in results] == [['1.1.1.1'], ['2.2.2.2']]
+        assert [client.feed_responses[url].headers['ETag'] for url in self.urls] == ['"3"', '"4"']
+        set_context.assert_not_called()
+
+    @pytest.mark.parametrize('create_indicators_error', [None, Exception('failed to create indicators')])
+    def test_feed_main_saves_headers_after_creating_indicators(self, mocker, create_indicators_error):
+        """
+        Given:
+        - A feed whose URLs were fetched before, with the ETag and Last-Modified headers saved in the context
+
+        When:
+        - Fetching indicators, and both URLs were modified
+        - Case 1: The indicators are created
+        - Case 2: createIndicators fails
+
+        Then:
+        - Case 1: Validate the new ETag of both URLs is saved in the context after the indicators were created
+        - Case 2: Validate the headers are not saved, so the next fetch downloads the feeds again
+        """
+        mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+        mocker.patch('CSVFeedApiModule.is_demisto_version_ge', return_value=True)
+        mocker.patch('CSVFeedApiModule.return_error')
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(self.context))
+        set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+        create_indicators = mocker.patch.object(demisto, 'createIndicators', side_effect=create_indicators_error)
+        with requests_mock.Mocker() as m:
+            m.get(self.urls[0], text='1.1.1.1', headers={'ETag': '"3"'})
+            m.get(self.urls[1], text='2.2.2.2', headers={'ETag': '"4"'})
+            feed_main('CSV Feed', params={'url': self.urls, 'fieldnames': 'value', 'indicator_type': 'IP'})
+
+        assert create_indicators.call_count == 1
+        if create_indicators_error:
+            set_context.assert_not_called()
+        else:
+            saved_context = set_context.call_args[0][0]
+            assert saved_context[self.urls[0]]['etag'] == '"3"'
+            assert saved_context[self.urls[1]]['etag'] == '"4"'
@@ -5,7 +5,8 @@ from CommonServerUserPython import *
 ''' IMPORTS '''
 import urllib3
 import requests
-from typing import Optional, Pattern, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Pattern, List, Dict, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
@@ -14,6 +15,9 @@ urllib3.disable_warnings()
 TAGS = 'tags'
 TLP_COLOR = 'trafficlightprotocol'
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+MAX_CONCURRENT_REQUESTS = 5
+FEED_CHUNK_SIZE = 1024 * 1024
+FEED_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # the downloaded feeds are written to the disk beyond this size
 
 
 class Client(BaseClient):
@@ -105,6 +109,8 @@ class Client(BaseClient):
         self.headers = headers
         self.encoding = encoding
         self.feed_name = feed_name
+        # the responses of the feeds URLs, whose conditional request headers are saved after the fetch
+        self.feed_responses: Dict[str, requests.Response] = {}
         if not credentials:
             credentials = {}
         self.username = None
@@ -189,9 +195,15 @@ class Client(BaseClient):
 
         return config
 
-    def build_iterator(self, **kwargs):
+    def build_iterator(self, use_conditional_get: bool = False, **kwargs):
         """
-        For each URL (service), send an HTTP request to get indicators and return them after filtering by Regex
+        For each URL (service), send an HTTP request to get indicators and return them after filtering by Regex.
+        The requests to the different URLs are sent concurrently using the client session,
+        and the results are returned in the order of the URLs.
+        :param use_conditional_get: Whether to send the If-None-Match and If-Modified-Since headers saved in the
+            integration context. If none of the feeds was modified, no results are returned and no_update is True.
+            If only some of the feeds were not modified, they are requested again without the conditional headers.
+            The responses are kept in feed_responses.
         :param kwargs: Arguments to send to the HTTP API endpoint
         :return: List of indicators
         """
@@ -206,21 +218,44 @@ class Client(BaseClient):
             kwargs['auth'] = (self.username, self.password)
         try:
             urls = self._base_url
-            url_to_response_list: List[dict] = []
             if not isinstance(urls, list):
                 urls = [urls]
-            for url in urls:
-                r = requests.get(
+
+            def get_url(url, conditional=use_conditional_get):
+                request_kwargs = kwargs
+                if conditional:
+                    conditional_headers = get_conditional_request_headers(url)
+                    if conditional_headers:
+                        request_kwargs = dict(kwargs, headers=dict(kwargs.get('headers') or {}, **conditional_headers))
+                response = self._session.get(
                     url,
-                    **kwargs
+                    **request_kwargs
                 )
                 try:
-                    r.raise_for_status()
+                    response.raise_for_status()
                 except Exception:
                     LOG(f'{self.feed_name!r} - exception in request:'
-                        f' {r.status_code!r} {r.content!r}')
+                        f' {response.status_code!r} {response.content!r}')
                     raise
-                url_to_response_list.append({url: r})
+                # the content is downloaded by the worker, so a slow feed does not stall the download of the others
+                content = None if response.status_code == 304 else \
+                    spool_response_content(response, FEED_CHUNK_SIZE, FEED_MAX_MEMORY_SIZE)
+                return response, content
+
+            with ThreadPoolExecutor(max_workers=max(min(MAX_CONCURRENT_REQUESTS, len(urls)), 1)) as executor:
+                downloads = list(executor.map(get_url, urls))
+                not_modified = [r.status_code == 304 for r, _ in downloads]
+                if all(not_modified):
+                    demisto.debug(f'{self.feed_name} - the feeds were not modified since the last fetch.')
+                    return [], True
+                if any(not_modified):
+                    not_modified_urls = [url for url, is_not_modified in zip(urls, not_modified) if is_not_modified]
+                    full_downloads = dict(zip(not_modified_urls, executor.map(
+                        lambda url: get_url(url, conditional=False), not_modified_urls)))
+                    downloads = [full_downloads.get(url, download) for url, download in zip(urls, downloads)]
+            self.feed_responses = {url: r for url, (r, _) in zip(urls, downloads)}
+            url_to_response_list: List[dict] = [{url: content} for url, (_, content) in zip(urls, downloads)]
+            no_update = all([get_no_update_value(r, url) for url, (r, _) in zip(urls, downloads)])
         except requests.exceptions.ConnectTimeout as exception:
             err_msg = 'Connection Timeout Error - potential reasons might be that the Server URL parameter' \
                       ' is incorrect or that the Server is not accessible from your host.'
@@ -249,7 +284,7 @@ class Client(BaseClient):
         results = []
         for url_to_response in url_to_response_list:
             for url, lines in url_to_response.items():
-                result = lines.iter_lines()
+                result = iter_content_lines(lines)
                 if self.encoding is not None:
                     result = map(
                         lambda x: x.decode(self.encoding).encode('utf_8'),
@@ -266,7 +301,7 @@ class Client(BaseClient):
                         result
                     )
                 results.append({url: result})
-        return results, get_no_update_value(r)
+        return results, no_update
 
     def custom_fields_creator(self, attributes: dict):
         created_custom_fields = {}
@@ -280,7 +315,7 @@ class Client(BaseClient):
         return created_custom_fields
 
 
-def get_no_update_value(response: requests.Response) -> bool:
+def get_no_update_value(response: requests.Response, url: str = '') -> bool:
     """
     detect if the feed response has been modified according to the headers etag and last_modified.
     For more information, see this:
@@ -288,19 +323,23 @@ def get_no_update_value(response: requests.Response) -> bool:
     https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/ETag
     Args:
         response: (requests.Response) The feed response.
+        url: (str) The feed URL. If given, the headers are compared to the ones saved for the URL by
+            save_conditional_request_headers, which saves them after the indicators were created.
     Returns:
         boolean with the value for noUpdate argument.
         The value should be False if the response was modified.
     """
 
     context = get_integration_context()
-    old_etag = context.get('etag')
-    old_last_modified = context.get('last_modified')
+    feed_cache = (context.get(url) or {}) if url else context
+    old_etag = feed_cache.get('etag')
+    old_last_modified = feed_cache.get('last_modified')
 
     etag = response.headers.get('ETag')
     last_modified = response.headers.get('Last-Modified')
 
-    set_integration_context({'last_modified': last_modified, 'etag': etag})
+    if not url:
+        set_integration_context({'last_modified': last_modified, 'etag': etag})
 
     if old_etag and old_etag != etag:
         demisto.debug('New indicators fetched - the ETag value has been updated,'
@@ -316,6 +355,20 @@ def get_no_update_value(response: requests.Response) -> bool:
     return True
 
 
+def iter_content_lines(content) -> Iterator[bytes]:
+    """
+    Iterates over the lines of a downloaded feed content, without their line breaks.
+    The content file is owned by the iterator, and is closed once its lines are exhausted.
+    Args:
+        content: The file of the feed content, as returned by spool_response_content.
+    Returns:
+        An iterator of the lines of the content.
+    """
+    with content:
+        for line in content:
+            yield line.rstrip(b'\r\n')
+
+
 def datestring_to_server_format(date_string: str) -> str:
     """
     formats a datestring to the ISO-8601 format which the server expects to recieve
@@ -397,9 +450,26 @@ def get_indicator_fields(line, url, feed_tags: list, tlp_color: Optional[str], c
     return attributes, value
 
 
-def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False, **kwargs):
-    iterators, no_update = client.build_iterator(**kwargs)
-    indicators = []
+def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False,
+                             use_conditional_get=False, **kwargs):
+    indicators, no_update = fetch_indicators_generator(client, feed_tags, tlp_color, itype, auto_detect,
+                                                       create_relationships, use_conditional_get, **kwargs)
+    return list(indicators), no_update
+
+
+def fetch_indicators_generator(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False,
+                               use_conditional_get=False, **kwargs):
+    """
+    Download the feeds and return a generator of their indicators, which parses the feeds while they are read,
+    so the indicators can be submitted before the whole feeds are parsed.
+    Returns:
+        Tuple of the indicators generator and the no_update value.
+    """
+    iterators, no_update = client.build_iterator(use_conditional_get=use_conditional_get, **kwargs)
+    return parse_indicators(client, iterators, feed_tags, tlp_color, itype, auto_detect, create_relationships), no_update
+
+
+def parse_indicators(client, iterators, feed_tags, tlp_color, itype, auto_detect, create_relationships=False):
     for iterator in iterators:
         for url, lines in iterator.items():
             for line in lines:
@@ -434,8 +504,7 @@ def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, c
                         custom_fields = client.custom_fields_creator(attributes)
                         indicator_data["fields"] = custom_fields
 
-                    indicators.append(indicator_data)
-    return indicators, no_update
+                    yield indicator_data
 
 
 def determine_indicator_type(indicator_type, default_indicator_type, auto_detect, value):
@@ -504,20 +573,21 @@ def feed_main(feed_name, params=None, prefix=''):
     }
     try:
         if command == 'fetch-indicators':
-            indicators, no_update = fetch_indicators_command(client, feed_tags, tlp_color,
-                                                             params.get('indicator_type'),
-                                                             params.get('auto_detect_type'),
-                                                             params.get('create_relationships'))
-
             # check if the version is higher than 6.5.0 so we can use noUpdate parameter
-            if is_demisto_version_ge('6.5.0'):
-                # we submit the indicators in batches
-                for b in batch(indicators, batch_size=2000):
-                    demisto.createIndicators(b, noUpdate=no_update)
+            is_no_update_supported = is_demisto_version_ge('6.5.0')
+            indicators, no_update = fetch_indicators_generator(client, feed_tags, tlp_color,
+                                                               params.get('indicator_type'),
+                                                               params.get('auto_detect_type'),
+                                                               params.get('create_relationships'),
+                                                               use_conditional_get=is_no_update_supported)
+
+            # we submit the indicators in batches, while the feeds are still being parsed
+            if is_no_update_supported:
+                create_indicators_in_batches(indicators, no_update=no_update, submit_empty=True)
+                save_conditional_request_headers(client.feed_responses)
             else:
                 # call createIndicators without noUpdate arg
-                for b in batch(indicators, batch_size=2000):
-                    demisto.createIndicators(b)
+                create_indicators_in_batches(indicators)
 
         else:
             args = demisto.args()
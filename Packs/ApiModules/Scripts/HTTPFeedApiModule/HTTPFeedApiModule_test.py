@@ -1,6 +1,8 @@
 from HTTPFeedApiModule import get_indicators_command, Client, datestring_to_server_format, feed_main,\
     fetch_indicators_command, get_no_update_value
+import json
 import requests_mock
+import pytest
 import demistomock as demisto
 
 
@@ -246,6 +248,40 @@ def test_feed_main_fetch_indicators(mocker, requests_mock):
     } in indicators
 
 
+def test_feed_main_fetch_indicators_in_batches(mocker, requests_mock):
+    """
+    Given
+    - A feed of 466 indicators.
+
+    When
+    - Fetching indicators, with a limit of 10KB per createIndicators batch.
+
+    Then
+    - Ensure the indicators are submitted in several batches, each with up to 10KB of indicators and the noUpdate arg.
+    """
+    import HTTPFeedApiModule
+    feed_url = 'https://www.spamhaus.org/drop/asndrop.txt'
+    mocker.patch.object(demisto, 'params', return_value={'url': feed_url, 'ignore_regex': '^;.*',
+                                                         'indicator_type': 'ASN'})
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(HTTPFeedApiModule, 'is_demisto_version_ge', return_value=True)
+    create_indicators_in_batches = HTTPFeedApiModule.create_indicators_in_batches
+    mocker.patch.object(HTTPFeedApiModule, 'create_indicators_in_batches',
+                        side_effect=lambda indicators, **kwargs: create_indicators_in_batches(
+                            indicators, max_batch_bytes=10 * 1024, **kwargs))
+    mocker.patch.object(demisto, 'createIndicators')
+
+    with open('test_data/asn_ranges.txt') as asn_ranges_txt:
+        requests_mock.get(feed_url, content=asn_ranges_txt.read().encode('utf8'))
+    feed_main('great_feed_name')
+
+    batches = [call[0][0] for call in demisto.createIndicators.call_args_list]
+    assert len(batches) > 1
+    assert sum(len(b) for b in batches) == 466
+    assert all(len(json.dumps(b)) <= 10 * 1024 for b in batches)
+    assert all('noUpdate' in call[1] for call in demisto.createIndicators.call_args_list)
+
+
 def test_feed_main_test_module(mocker, requests_mock):
     """
     Given
@@ -481,3 +517,228 @@ def test_get_no_update_value(mocker):
                    'etag': 'd309ab6e51ed310cf869dab0dfd0d34b'}  # guardrails-disable-line
     no_update = get_no_update_value(MockResponse())
     assert not no_update
+
+
+def test_build_iterator_multiple_urls_order(mocker):
+    """
+    Given
+    - A feed with several URLs, where the first URLs are the slowest to respond
+
+    When
+    - Building the iterator, the URLs are requested concurrently
+
+    Then
+    - Validate the results are returned in the order of the URLs, using the client session
+    """
+    import time
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    urls = ['https://example.com/feed{}.txt'.format(i) for i in range(4)]
+    with requests_mock.Mocker() as m:
+        for i, url in enumerate(urls):
+            def callback(request, context, i=i):
+                time.sleep(0.05 * (len(urls) - i))
+                return '1.1.1.{}\n'.format(i)
+            m.get(url, text=callback)
+        client = Client(url=urls, feed_url_to_config={url: {} for url in urls}, indicator_type='IP')
+        send = mocker.spy(client._session, 'get')
+        results, _ = client.build_iterator()
+
+    assert [list(result.keys())[0] for result in results] == urls
+    assert [list(list(result.values())[0]) for result in results] == [['1.1.1.{}'.format(i)] for i in range(4)]
+    assert send.call_count == 4
+
+
+def test_build_iterator_slow_feed_body(mocker):
+    """
+    Given
+    - A feed with two URLs, where the body of the first URL is slow to download, and has CRLF line endings
+
+    When
+    - Building the iterator
+
+    Then
+    - Validate the body of the second URL is downloaded while the first is still downloading
+    - Validate the lines of both feeds are returned in the order of the URLs
+    """
+    import io
+    import threading
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    second_body_read = threading.Event()
+
+    class SlowBody(io.BytesIO):
+        def read(self, *args, **kwargs):
+            assert second_body_read.wait(timeout=5), 'the feed bodies were not downloaded concurrently'
+            return super().read(*args, **kwargs)
+
+    class Body(io.BytesIO):
+        def read(self, *args, **kwargs):
+            second_body_read.set()
+            return super().read(*args, **kwargs)
+
+    urls = ['https://example.com/feed1.txt', 'https://example.com/feed2.txt']
+    with requests_mock.Mocker() as m:
+        m.get(urls[0], body=SlowBody(b'1.1.1.1\r\n1.1.1.2\r\n'))
+        m.get(urls[1], body=Body(b'2.2.2.2\n2.2.2.3'))
+        client = Client(url=urls, feed_url_to_config={url: {} for url in urls}, indicator_type='IP')
+        results, _ = client.build_iterator()
+
+    assert [list(list(result.values())[0]) for result in results] == [['1.1.1.1', '1.1.1.2'], ['2.2.2.2', '2.2.2.3']]
+
+
+
+def test_build_iterator_closes_content(mocker):
+    """
+    Given
+    - A feed URL which responds with 203 Non-Authoritative Information, as returned by some proxies
+
+    When
+    - Building the iterator, and exhausting the lines of the feed
+
+    Then
+    - Validate the content of the response is parsed
+    - Validate the downloaded content file is closed once its lines are exhausted, and not before
+    """
+    import HTTPFeedApiModule
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    spool = mocker.spy(HTTPFeedApiModule, 'spool_response_content')
+    url = 'https://example.com/feed.txt'
+    with requests_mock.Mocker() as m:
+        m.get(url, text='1.1.1.1\n1.1.1.2\n', status_code=203)
+        client = Client(url=url, feed_url_to_config={url: {}}, indicator_type='IP')
+        results, _ = client.build_iterator()
+
+    content = spool.spy_return
+    assert not content.closed
+    assert list(results[0][url]) == ['1.1.1.1', '1.1.1.2']
+    assert content.closed
+
+class TestConditionalGet:
+    URLS = ['https://example.com/feed1.txt', 'https://example.com/feed2.txt']
+    CONTEXT = {
+        'https://example.com/feed1.txt': {'etag': '"1"', 'last_modified': 'Fri, 30 Jul 2021 00:24:13 GMT'},
+        'https://example.com/feed2.txt': {'etag': '"2"', 'last_modified': None},
+    }
+
+    def test_not_modified(self, mocker):
+        """
+        Given
+        - A feed with two URLs, whose ETag and Last-Modified values are saved in the integration context
+
+        When
+        - Building the iterator with conditional requests, and both URLs respond with 304
+
+        Then
+        - Ensure the conditional headers are sent, no results are returned and no_update is True
+        """
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=self.CONTEXT)
+        mocker.patch.object(demisto, 'setIntegrationContext')
+        with requests_mock.Mocker() as m:
+            for url in self.URLS:
+                m.get(url, status_code=304)
+            client = Client(url=self.URLS, feed_url_to_config={url: {} for url in self.URLS})
+            results, no_update = client.build_iterator(use_conditional_get=True)
+            history = {request.url: request.headers for request in m.request_history}
+
+        assert results == []
+        assert no_update
+        assert history[self.URLS[0]]['If-None-Match'] == '"1"'
+        assert history[self.URLS[0]]['If-Modified-Since'] == 'Fri, 30 Jul 2021 00:24:13 GMT'
+        assert history[self.URLS[1]]['If-None-Match'] == '"2"'
+        assert 'If-Modified-Since' not in history[self.URLS[1]]
+        assert not demisto.setIntegrationContext.called
+
+    def test_partially_modified(self, mocker):
+        """
+        Given
+        - A feed with two URLs, whose ETag values are saved in the integration context
+
+        When
+        - Building the iterator with conditional requests, the first URL responds with 304 and the second with 200
+
+        Then
+        - Ensure the first URL is requested again without the conditional headers, and the results of both
+          URLs are returned, and the responses are kept without saving their headers yet
+        """
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(self.CONTEXT))
+        mocker.patch.object(demisto, 'setIntegrationContext')
+
+        def feed1_callback(request, context):
+            if 'If-None-Match' in request.headers:
+                context.status_code = 304
+                return ''
+            context.headers['ETag'] = '"1"'
+            return '1.1.1.1\n'
+
+        with requests_mock.Mocker() as m:
+            m.get(self.URLS[0], text=feed1_callback)
+            m.get(self.URLS[1], text='2.2.2.2\n', headers={'ETag': '"3"'})
+            client = Client(url=self.URLS, feed_url_to_config={url: {} for url in self.URLS})
+            results, no_update = client.build_iterator(use_conditional_get=True)
+            assert m.call_count == 3
+
+        assert [list(list(result.values())[0]) for result in results] == [['1.1.1.1'], ['2.2.2.2']]
+        assert not no_update
+        assert [client.feed_responses[url].headers['ETag'] for url in self.URLS] == ['"1"', '"3"']
+        assert not demisto.setIntegrationContext.called
+
+    def test_feed_main_not_modified(self, mocker):
+        """
+        Given
+        - A feed URL whose ETag value is saved in the integration context, on a server supporting noUpdate
+
+        When
+        - Fetching indicators, and the URL responds with 304
+
+        Then
+        - Ensure createIndicators is called once with no indicators and noUpdate=True
+        """
+        url = self.URLS[0]
+        mocker.patch.object(demisto, 'params', return_value={'url': url, 'feed_url_to_config': {url: {}}})
+        mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+        mocker.patch('HTTPFeedApiModule.is_demisto_version_ge', return_value=True)
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=self.CONTEXT)
+        mocker.patch.object(demisto, 'createIndicators')
+        with requests_mock.Mocker() as m:
+            m.get(url, status_code=304)
+            feed_main('great_feed_name')
+
+        demisto.createIndicators.assert_called_once_with([], noUpdate=True)
+
+    @pytest.mark.parametrize('create_indicators_error', [None, Exception('failed to create indicators')])
+    def test_feed_main_saves_headers_after_creating_indicators(self, mocker, create_indicators_error):
+        """
+        Given
+        - A feed with two URLs, whose ETag values are saved in the integration context
+
+        When
+        - Fetching indicators, and both URLs were modified
+        - Case 1: The indicators are created
+        - Case 2: createIndicators fails
+
+        Then
+        - Case 1: Ensure the new ETag values are saved per URL after the indicators were created
+        - Case 2: Ensure the headers are not saved, so the next fetch downloads the feeds again
+        """
+        mocker.patch.object(demisto, 'params',
+                            return_value={'url': self.URLS, 'feed_url_to_config': {url: {} for url in self.URLS}})
+        mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+        mocker.patch('HTTPFeedApiModule.is_demisto_version_ge', return_value=True)
+        mocker.patch('HTTPFeedApiModule.return_error')
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(self.CONTEXT))
+        mocker.patch.object(demisto, 'setIntegrationContext')
+        mocker.patch.object(demisto, 'createIndicators', side_effect=create_indicators_error)
+        with requests_mock.Mocker() as m:
+            m.get(self.URLS[0], text='1.1.1.1\n', headers={'ETag': '"3"'})
+            m.get(self.URLS[1], text='2.2.2.2\n', headers={'ETag': '"4"'})
+            feed_main('great_feed_name')
+
+        assert demisto.createIndicators.call_count == 1
+        if create_indicators_error:
+            assert not demisto.setIntegrationContext.called
+        else:
+            saved_context = demisto.setIntegrationContext.call_args[0][0]
+            assert saved_context[self.URLS[0]]['etag'] == '"3"'
+            assert saved_context[self.URLS[1]]['etag'] == '"4"'
@@ -3,11 +3,14 @@ from CommonServerPython import *
 ''' IMPORTS '''
 import urllib3
 import jmespath
-from typing import List, Dict, Union, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Union, Optional, Callable, Tuple, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
 
+MAX_CONCURRENT_REQUESTS = 5
+
 
 class Client:
     def __init__(self, url: str = '', credentials: dict = None,
@@ -59,6 +62,10 @@ class Client:
 
         # Request related attributes
         self.url = url
+        # a single session is shared by the requests of all the feeds, so connections are reused
+        self.session = requests.Session()
+        # the responses of the feeds URLs, whose conditional request headers are saved after the fetch
+        self.feed_responses: Dict[str, requests.Response] = {}
         self.verify = not insecure
         self.auth: Optional[tuple] = None
         self.headers = self.parse_headers(headers)
@@ -106,28 +113,45 @@ class Client:
         else:
             return headers
 
-    def build_iterator(self, feed: dict, **kwargs) -> Tuple[List, bool]:
+    def build_iterator(self, feed: dict, use_conditional_get: bool = False, **kwargs) -> Tuple[Optional[List], bool]:
+        """
+        Download the feed and extract its indicators.
+        :param feed: The feed configuration.
+        :param use_conditional_get: Whether to send the If-None-Match and If-Modified-Since headers saved in the
+            integration context for the feed URL. If the feed was not modified, None is returned as the result.
+            The response is kept in feed_responses.
+        :param kwargs: Additional arguments of the request.
+        :return: The extracted indicators and the noUpdate value.
+        """
         url = feed.get('url', self.url)
+        headers = self.headers
+        if use_conditional_get:
+            headers = dict(self.headers, **get_conditional_request_headers(url))
         if not self.post_data:
-            r = requests.get(
+            r = self.session.get(
                 url=url,
                 verify=self.verify,
                 auth=self.auth,
                 cert=self.cert,
-                headers=self.headers,
+                headers=headers,
                 **kwargs
             )
         else:
-            r = requests.post(
+            r = self.session.post(
                 url=url,
                 data=self.post_data,
                 verify=self.verify,
                 auth=self.auth,
                 cert=self.cert,
-                headers=self.headers,
+                headers=headers,
                 **kwargs
             )
 
+        self.feed_responses[url] = r
+        if r.status_code == 304:
+            demisto.debug(f'The feed {url} was not modified since the last fetch.')
+            return None, True
+
         try:
             r.raise_for_status()
             data = r.json()
@@ -136,10 +160,10 @@ class Client:
         except ValueError as VE:
             raise ValueError(f'Could not parse returned data to Json. \n\nError massage: {VE}')
 
-        return result, get_no_update_value(r)
+        return result, get_no_update_value(r, url)
 
 
-def get_no_update_value(response: requests.Response) -> bool:
+def get_no_update_value(response: requests.Response, url: str = '') -> bool:
     """
     detect if the feed response has been modified according to the headers etag and last_modified.
     For more information, see this:
@@ -147,19 +171,23 @@ def get_no_update_value(response: requests.Response) -> bool:
     https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/ETag
     Args:
         response: (requests.Response) The feed response.
+        url: (str) The feed URL. If given, the headers are compared to the ones saved for the URL by
+            save_conditional_request_headers, which saves them after the indicators were created.
     Returns:
         boolean with the value for noUpdate argument.
         The value should be False if the response was modified.
     """
 
     context = get_integration_context()
-    old_etag = context.get('etag')
-    old_last_modified = context.get('last_modified')
+    feed_cache = (context.get(url) or {}) if url else context
+    old_etag = feed_cache.get('etag')
+    old_last_modified = feed_cache.get('last_modified')
 
     etag = response.headers.get('ETag')
     last_modified = response.headers.get('Last-Modified')
 
-    set_integration_context({'last_modified': last_modified, 'etag': etag})
+    if not url:
+        set_integration_context({'last_modified': last_modified, 'etag': etag})
 
     if old_etag and old_etag != etag:
         demisto.debug('New indicators fetched - the ETag value has been updated,'
@@ -186,19 +214,54 @@ def test_module(client: Client, limit) -> str:
 
 
 def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list, auto_detect: bool,
-                             create_relationships: bool = False, limit: int = 0, **kwargs) -> Tuple[List[dict], bool]:
+                             create_relationships: bool = False, limit: int = 0, use_conditional_get: bool = False,
+                             **kwargs) -> Tuple[List[dict], bool]:
     """
     Fetches the indicators from client.
+    See fetch_indicators_generator for the arguments.
+    """
+    indicators, no_update = fetch_indicators_generator(client, indicator_type, feedTags, auto_detect,
+                                                       create_relationships, limit, use_conditional_get, **kwargs)
+    return list(indicators), no_update
+
+
+def fetch_indicators_generator(client: Client, indicator_type: str, feedTags: list, auto_detect: bool,
+                               create_relationships: bool = False, limit: int = 0, use_conditional_get: bool = False,
+                               **kwargs) -> Tuple[Iterator[dict], bool]:
+    """
+    Downloads the feeds and returns a generator of their indicators, so they can be submitted while they are created.
     :param client: Client of a JSON Feed
     :param indicator_type: the default indicator type
     :param feedTags: the indicator tags
     :param auto_detect: a boolean indicates if we should automatically detect the indicator_type
     :param limit: given only when get-indicators command is running. function will return number indicators as the limit
     :param create_relationships: whether to add connected indicators
+    :param use_conditional_get: whether to send conditional requests. If none of the feeds was modified, no indicators
+        are returned and no_update is True. If only some of them were modified, all the feeds are downloaded.
     """
-    indicators: List[dict] = []
     feeds_results = {}
     no_update = False
+
+    # the feeds without a custom build iterator are downloaded concurrently
+    feeds_to_download = [feed_name for feed_name, feed in client.feed_name_to_config.items()
+                         if not feed.get('custom_build_iterator')]
+    downloaded_feeds = {}
+    if feeds_to_download:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(feeds_to_download))) as executor:
+            downloaded_feeds = dict(zip(feeds_to_download, executor.map(
+                lambda feed_name: client.build_iterator(client.feed_name_to_config[feed_name],
+                                                        use_conditional_get=use_conditional_get, **kwargs),
+                feeds_to_download)))
+            not_modified_feeds = [feed_name for feed_name in feeds_to_download
+                                  if downloaded_feeds[feed_name][0] is None]
+            if not_modified_feeds and len(not_modified_feeds) == len(client.feed_name_to_config):
+                demisto.debug('The feeds were not modified since the last fetch.')
+                return iter([]), True
+            downloaded_feeds.update(zip(not_modified_feeds, executor.map(
+                lambda feed_name: client.build_iterator(client.feed_name_to_config[feed_name], **kwargs),
+                not_modified_feeds)))
+
+    feeds_no_update = []
     for feed_name, feed in client.feed_name_to_config.items():
         custom_build_iterator = feed.get('custom_build_iterator')
         if custom_build_iterator:
@@ -207,8 +270,18 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
                 raise Exception("Custom function to handle with pagination must return a list type")
             feeds_results[feed_name] = indicators_from_feed
         else:
-            feeds_results[feed_name], no_update = client.build_iterator(feed, **kwargs)
-
+            feeds_results[feed_name], feed_no_update = downloaded_feeds[feed_name]
+            feeds_no_update.append(feed_no_update)
+    if feeds_no_update:
+        no_update = all(feeds_no_update)
+    return create_indicators_generator(client, feeds_results, indicator_type, feedTags, auto_detect,
+                                       create_relationships, limit), no_update
+
+
+def create_indicators_generator(client: Client, feeds_results: Dict[str, Any], indicator_type: str, feedTags: list,
+                                auto_detect: bool, create_relationships: bool = False,
+                                limit: int = 0) -> Iterator[dict]:
+    indicators_count = 0
     for service_name, items in feeds_results.items():
         feed_config = client.feed_name_to_config.get(service_name, {})
         indicator_field = str(feed_config.get('indicator') if feed_config.get('indicator') else 'indicator')
@@ -222,15 +295,16 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
             if isinstance(item, str):
                 item = {indicator_field: item}
 
-            indicators.extend(
-                handle_indicator_function(client, item, feed_config, service_name, indicator_type, indicator_field,
-                                          use_prefix_flat, feedTags, auto_detect, mapping_function,
-                                          create_relationships, create_relationships_function))
+            item_indicators = handle_indicator_function(client, item, feed_config, service_name, indicator_type,
+                                                        indicator_field, use_prefix_flat, feedTags, auto_detect,
+                                                        mapping_function, create_relationships,
+                                                        create_relationships_function)
+            yield from item_indicators
+            indicators_count += len(item_indicators)
 
-            if limit and len(indicators) >= limit:  # We have a limitation only when get-indicators command is
+            if limit and indicators_count >= limit:  # We have a limitation only when get-indicators command is
                 # called, and then we return for each service_name "limit" of indicators
                 break
-    return indicators, no_update
 
 
 def indicator_mapping(mapping: Dict, indicator: Dict, attributes: Dict):
@@ -373,24 +447,19 @@ def feed_main(params, feed_name, prefix):
 
         elif command == 'fetch-indicators':
             create_relationships = params.get('create_relationships')
-            indicators, no_update = fetch_indicators_command(client, indicator_type, feedTags, auto_detect,
-                                                             create_relationships)
-
             # check if the version is higher than 6.5.0 so we can use noUpdate parameter
-            if is_demisto_version_ge('6.5.0'):
-                if not indicators:
-                    demisto.createIndicators(indicators, noUpdate=no_update)
-                else:
-                    for b in batch(indicators, batch_size=2000):
-                        demisto.createIndicators(b, noUpdate=no_update)
-
+            is_no_update_supported = is_demisto_version_ge('6.5.0')
+            indicators, no_update = fetch_indicators_generator(client, indicator_type, feedTags, auto_detect,
+                                                               create_relationships,
+                                                               use_conditional_get=is_no_update_supported)
+
+            # we submit the indicators in batches, while they are still being created
+            if is_no_update_supported:
+                create_indicators_in_batches(indicators, no_update=no_update, submit_empty=True)
+                save_conditional_request_headers(client.feed_responses)
             else:
                 # call createIndicators without noUpdate arg
-                if not indicators:
-                    demisto.createIndicators(indicators)
-                else:
-                    for b in batch(indicators, batch_size=2000):
-                        demisto.createIndicators(b)
+                create_indicators_in_batches(indicators, submit_empty=True)
 
         elif command == f'{prefix}get-indicators':
             # dummy command for testing
@@ -1,6 +1,8 @@
-from JSONFeedApiModule import Client, fetch_indicators_command, jmespath, get_no_update_value
+from JSONFeedApiModule import Client, fetch_indicators_command, fetch_indicators_generator, jmespath, \
+    get_no_update_value, feed_main
 from CommonServerPython import *
 import requests_mock
+import pytest
 import demistomock as demisto
 
 
@@ -125,6 +127,36 @@ def test_list_of_indicators_with_no_json_object():
         assert indicators[1].get('rawJSON') == {'indicator': '2.2.2.2'}
 
 
+def test_fetch_indicators_generator():
+    """
+    Given:
+    - A feed of 3 indicators
+
+    When:
+    - Fetching the indicators with the generator
+
+    Then:
+    - Validate the feed is downloaded before the indicators are created, and the indicators are created lazily
+    """
+    feed_name_to_config = {
+        'Github': {
+            'url': 'https://api.github.com/meta',
+            'extractor': "hooks",
+            'indicator': None
+        }
+    }
+
+    with requests_mock.Mocker() as m:
+        m.get('https://api.github.com/meta', json=json.loads(FLAT_LIST_OF_INDICATORS))
+        client = Client(url='https://api.github.com/meta', feed_name_to_config=feed_name_to_config, insecure=True)
+        indicators, _ = fetch_indicators_generator(client=client, indicator_type=None, feedTags=['test'],
+                                                   auto_detect=True)
+        assert m.call_count == 1
+
+    assert not isinstance(indicators, list)
+    assert [indicator['value'] for indicator in indicators] == ['1.1.1.1', '2.2.2.2', '3.3.3.3']
+
+
 def test_post_of_indicators_with_no_json_object():
     feed_name_to_config = {
         'Github': {
@@ -203,3 +235,147 @@ def test_get_no_update_value(mocker):
                    'etag': 'd309ab6e51ed310cf869dab0dfd0d34b'}  # guardrails-disable-line
     no_update = get_no_update_value(MockResponse())
     assert not no_update
+
+
+def test_fetch_indicators_multiple_feeds_order(mocker):
+    """
+    Given
+    - A client with several feeds, where the first feeds are the slowest to respond
+
+    When
+    - Fetching the indicators, the feeds are downloaded concurrently
+
+    Then
+    - Validate the indicators are returned in the order of the feeds configuration
+    """
+    import time
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    feed_name_to_config = {
+        'feed{}'.format(i): {
+            'url': 'https://example.com/feed{}.json'.format(i),
+            'extractor': 'items',
+            'indicator': 'ip',
+        } for i in range(4)
+    }
+    with requests_mock.Mocker() as m:
+        for i in range(4):
+            def callback(request, context, i=i):
+                time.sleep(0.05 * (4 - i))
+                return {'items': [{'ip': '1.1.1.{}'.format(i)}]}
+            m.get('https://example.com/feed{}.json'.format(i), json=callback)
+        client = Client(feed_name_to_config=feed_name_to_config)
+        indicators, _ = fetch_indicators_command(client=client, indicator_type='IP', feedTags=[], auto_detect=False)
+
+    assert [indicator['value'] for indicator in indicators] == ['1.1.1.{}'.format(i) for i in range(4)]
+
+
+FEEDS_CONTEXT = {
+    'https://example.com/feed0.json': {'etag': '"0"', 'last_modified': None},
+    'https://example.com/feed1.json': {'etag': '"1"', 'last_modified': 'Fri, 30 Jul 2021 00:24:13 GMT'},
+}
+FEEDS_CONFIG = {
+    'feed{}'.format(i): {
+        'url': 'https://example.com/feed{}.json'.format(i),
+        'extractor': 'items',
+        'indicator': 'ip',
+    } for i in range(2)
+}
+
+
+def test_fetch_indicators_not_modified(mocker):
+    """
+    Given
+    - Two feeds whose ETag and Last-Modified values are saved in the integration context
+
+    When
+    - Fetching the indicators with conditional requests, and both feeds respond with 304
+
+    Then
+    - Validate the conditional headers are sent, no indicators are returned and no_update is True
+    """
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=FEEDS_CONTEXT)
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    with requests_mock.Mocker() as m:
+        for feed in FEEDS_CONFIG.values():
+            m.get(feed['url'], status_code=304)
+        client = Client(feed_name_to_config=FEEDS_CONFIG)
+        indicators, no_update = fetch_indicators_command(client=client, indicator_type='IP', feedTags=[],
+                                                         auto_detect=False, use_conditional_get=True)
+        history = {request.url: request.headers for request in m.request_history}
+
+    assert indicators == []
+    assert no_update
+    assert history['https://example.com/feed0.json']['If-None-Match'] == '"0"'
+    assert 'If-Modified-Since' not in history['https://example.com/feed0.json']
+    assert history['https://example.com/feed1.json']['If-Modified-Since'] == 'Fri, 30 Jul 2021 00:24:13 GMT'
+    assert not demisto.setIntegrationContext.called
+
+
+def test_fetch_indicators_partially_modified(mocker):
+    """
+    Given
+    - Two feeds whose ETag values are saved in the integration context
+
+    When
+    - Fetching the indicators with conditional requests, the first feed responds with 304 and the second with 200
+
+    Then
+    - Validate the first feed is downloaded again without the conditional headers and the indicators of both
+      feeds are returned
+    """
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(FEEDS_CONTEXT))
+    mocker.patch.object(demisto, 'setIntegrationContext')
+
+    def feed0_callback(request, context):
+        if 'If-None-Match' in request.headers:
+            context.status_code = 304
+            return None
+        context.headers['ETag'] = '"0"'
+        return {'items': [{'ip': '1.1.1.0'}]}
+
+    with requests_mock.Mocker() as m:
+        m.get('https://example.com/feed0.json', json=feed0_callback)
+        m.get('https://example.com/feed1.json', json={'items': [{'ip': '1.1.1.1'}]}, headers={'ETag': '"2"'})
+        client = Client(feed_name_to_config=FEEDS_CONFIG)
+        indicators, no_update = fetch_indicators_command(client=client, indicator_type='IP', feedTags=[],
+                                                         auto_detect=False, use_conditional_get=True)
+        assert m.call_count == 3
+
+    assert [indicator['value'] for indicator in indicators] == ['1.1.1.0', '1.1.1.1']
+    assert not no_update
+
+
+@pytest.mark.parametrize('create_indicators_error', [None, Exception('failed to create indicators')])
+def test_feed_main_saves_headers_after_creating_indicators(mocker, create_indicators_error):
+    """
+    Given
+    - Two feeds whose ETag values are saved in the integration context
+
+    When
+    - Fetching indicators, and both feeds were modified
+    - Case 1: The indicators are created
+    - Case 2: createIndicators fails
+
+    Then
+    - Case 1: Validate the new ETag values are saved per URL after the indicators were created
+    - Case 2: Validate the headers are not saved, so the next fetch downloads the feeds again
+    """
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch('JSONFeedApiModule.is_demisto_version_ge', return_value=True)
+    mocker.patch('JSONFeedApiModule.return_error')
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(FEEDS_CONTEXT))
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(demisto, 'createIndicators', side_effect=create_indicators_error)
+    with requests_mock.Mocker() as m:
+        m.get('https://example.com/feed0.json', json={'items': [{'ip': '1.1.1.0'}]}, headers={'ETag': '"2"'})
+        m.get('https://example.com/feed1.json', json={'items': [{'ip': '1.1.1.1'}]}, headers={'ETag': '"3"'})
+        feed_main({'feed_name_to_config': FEEDS_CONFIG, 'indicator_type': 'IP'}, 'JSON Feed', '')
+
+    assert demisto.createIndicators.call_count == 1
+    if create_indicators_error:
+        assert not demisto.setIntegrationContext.called
+    else:
+        saved_context = demisto.setIntegrationContext.call_args[0][0]
+        assert saved_context['https://example.com/feed0.json']['etag'] == '"2"'
+        assert saved_context['https://example.com/feed1.json']['etag'] == '"3"'
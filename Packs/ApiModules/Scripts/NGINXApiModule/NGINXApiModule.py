@@ -51,6 +51,11 @@ server {
 
     proxy_cache_key $scheme$proxy_host$request_uri$extra_cache_key;
 
+    # Compress the proxied responses (the ETag of a compressed response is weakened by nginx)
+    gzip on;
+    gzip_proxied any;
+    gzip_types text/plain text/csv application/json application/json-seq;
+
     # Static test file
     location = /nginx-test {
         alias /var/lib/nginx/html/index.html;
@@ -69,6 +69,7 @@ def test_nginx_conf(tmp_path: Path):
     with open(conf_file, 'rt') as f:
         conf = f.read()
         assert 'listen 12345 default_server' in conf
+        assert 'gzip on;' in conf
 
 
 NGINX_PROCESS: Optional[subprocess.Popen] = None
@@ -2,10 +2,9 @@ import demistomock as demisto
 from CommonServerPython import *
 from CommonServerUserPython import *
 
-from typing import Union, Optional, List, Dict, Tuple
+from typing import Union, Optional, List, Dict, Tuple, Iterator
 from requests.sessions import merge_setting, CaseInsensitiveDict
 import re
-import copy
 import types
 import urllib3
 from taxii2client import v20, v21
@@ -59,6 +58,9 @@ STIX_2_TYPES_TO_CORTEX_CIDR_TYPES = {
     "ipv6-addr": FeedIndicatorType.IPv6CIDR,
 }
 
+# the maximal number of pattern term types whose cortex type is cached per client
+MAX_CACHED_TERM_TYPES = 1000
+
 
 class Taxii2FeedClient:
     def __init__(
@@ -94,6 +96,8 @@ class Taxii2FeedClient:
         self.api_root = None
         self.collections = None
         self.last_fetched_indicator__modified = None
+        # the next page of the TAXII 2.1 collection being fetched, None when there are no more pages to fetch
+        self.next_page: Optional[str] = None
 
         self.collection_to_fetch = collection_to_fetch
         self.skip_complex_mode = skip_complex_mode
@@ -132,6 +136,9 @@ class Taxii2FeedClient:
             re.compile(CIDR_ISSUBSET_VAL_PATTERN),
             re.compile(CIDR_ISUPPERSET_VAL_PATTERN),
         ]
+        # the cortex type of each pattern term type, as the same term types repeat in the patterns of a collection
+        self.indicator_types_cache: Dict[str, Optional[str]] = {}
+        self.cidr_types_cache: Dict[str, Optional[str]] = {}
 
     def init_server(self, version=TAXII_VER_2_0):
         """
@@ -221,6 +228,22 @@ class Taxii2FeedClient:
         :param limit: max amount of indicators to fetch
         :return: Cortex indicators list
         """
+        return [
+            indicator
+            for indicators in self.build_iterator_batches(limit, **kwargs)
+            for indicator in indicators
+        ]
+
+    def build_iterator_batches(
+            self, limit: int = -1, next_page: Optional[str] = None, **kwargs
+    ) -> Iterator[List[Dict[str, str]]]:
+        """
+        Polls the taxii server and yields the cortex indicators objects of each polled envelope.
+        Before each batch is yielded, client.next_page is set to the page that follows it.
+        :param limit: max amount of indicators to fetch
+        :param next_page: the next page of a TAXII 2.1 collection to resume the poll from
+        :return: Cortex indicators batches
+        """
         if not isinstance(self.collection_to_fetch, (v20.Collection, v21.Collection)):
             raise DemistoException(
                 "Could not find a collection to fetch from. "
@@ -229,12 +252,14 @@ class Taxii2FeedClient:
         if limit is None:
             limit = -1
 
+        self.next_page = None
         page_size = self.get_page_size(limit, limit)
         if page_size <= 0:
-            return []
+            return
+        if next_page and isinstance(self.collection_to_fetch, v21.Collection):
+            kwargs["next"] = next_page
         envelope = self.poll_collection(page_size, **kwargs)
-        indicators = self.extract_indicators_from_envelope_and_parse(envelope, limit)
-        return indicators
+        yield from self.extract_indicators_batches_from_envelope(envelope, limit)
 
     def extract_indicators_from_envelope_and_parse(
             self, envelope: Union[types.GeneratorType, Dict[str, str]], limit: int = -1
@@ -246,7 +271,23 @@ class Taxii2FeedClient:
         :param limit: max amount of indicators to fetch
         :return: Cortex indicators list
         """
-        indicators = []
+        return [
+            indicator
+            for indicators in self.extract_indicators_batches_from_envelope(envelope, limit)
+            for indicator in indicators
+        ]
+
+    def extract_indicators_batches_from_envelope(
+            self, envelope: Union[types.GeneratorType, Dict[str, str]], limit: int = -1
+    ) -> Iterator[List[Dict[str, str]]]:
+        """
+        Extract indicators from an 2.0 envelope generator, or 2.1 envelope (which then polls and repeats process)
+        and yields the parsed cortex indicators of each envelope
+        :param envelope: envelope containing stix objects
+        :param limit: max amount of indicators to fetch
+        :return: Cortex indicators batches
+        """
+        indicators_cnt = 0
         obj_cnt = 0
         # TAXII 2.0
         if isinstance(envelope, types.GeneratorType):
@@ -256,49 +297,45 @@ class Taxii2FeedClient:
                     # no fetched objects
                     break
                 obj_cnt += len(stix_objects)
-                indicators.extend(
-                    self.parse_indicators_list(
-                        self.extract_indicators_from_stix_objects(stix_objects)
-                    )
+                indicators = self.parse_indicators_list(
+                    self.extract_indicators_from_stix_objects(stix_objects)
                 )
-                if 0 < limit <= len(indicators):
+                if limit > -1:
+                    indicators = indicators[:limit - indicators_cnt]
+                indicators_cnt += len(indicators)
+                yield indicators
+                if 0 < limit <= indicators_cnt:
                     break
         # TAXII 2.1
         elif isinstance(envelope, Dict):
-            cur_limit = limit
-            stix_objects = envelope.get("objects")
-            obj_cnt += len(stix_objects)
-            indicators_list = self.extract_indicators_from_stix_objects(stix_objects)
-            indicators = self.parse_indicators_list(indicators_list)
-            while envelope.get("more", False):
-                page_size = self.get_page_size(limit, cur_limit)
+            while True:
+                stix_objects = envelope.get("objects") or []
+                obj_cnt += len(stix_objects)
+                indicators = self.parse_indicators_list(
+                    self.extract_indicators_from_stix_objects(stix_objects)
+                )
+                if limit > -1:
+                    indicators = indicators[:limit - indicators_cnt]
+                indicators_cnt += len(indicators)
+                reached_limit = -1 < limit <= indicators_cnt
+                self.next_page = (
+                    envelope.get("next") if envelope.get("more", False) and not reached_limit else None
+                )
+                yield indicators
+                if not self.next_page:
+                    break
+                page_size = self.get_page_size(limit, limit - indicators_cnt)
                 envelope = self.collection_to_fetch.get_objects(
-                    limit=page_size, next=envelope.get("next", "")
+                    limit=page_size, next=self.next_page
                 )
-                if isinstance(envelope, Dict):
-                    stix_objects = envelope.get("objects")
-                    obj_cnt += len(stix_objects)
-                    extracted_iocs = self.extract_indicators_from_stix_objects(
-                        stix_objects
-                    )
-                    parsed_iocs = self.parse_indicators_list(extracted_iocs)
-                    indicators.extend(parsed_iocs)
-
-                    if limit > -1:
-                        cur_limit -= len(envelope)  # type: ignore
-                        if cur_limit < 0:
-                            break
-                else:
+                if not isinstance(envelope, Dict):
                     raise DemistoException(
                         "Error: TAXII 2 client received the following response while requesting "
                         f"indicators: {str(envelope)}\n\nExpected output is json"
                     )
         demisto.debug(
-            f"TAXII 2 Feed has extracted {len(indicators)} indicators / {obj_cnt} stix objects"
+            f"TAXII 2 Feed has extracted {indicators_cnt} indicators / {obj_cnt} stix objects"
         )
-        if limit > -1:
-            return indicators[:limit]
-        return indicators
 
     def poll_collection(
             self, page_size: int, **kwargs
@@ -393,6 +430,7 @@ class Taxii2FeedClient:
                     indicator_obj,
                     STIX_2_TYPES_TO_CORTEX_TYPES,
                     field_map,
+                    self.indicator_types_cache,
                 )
             )
 
@@ -405,6 +443,7 @@ class Taxii2FeedClient:
                     indicator_obj,
                     STIX_2_TYPES_TO_CORTEX_CIDR_TYPES,
                     field_map,
+                    self.cidr_types_cache,
                 )
             )
 
@@ -416,6 +455,7 @@ class Taxii2FeedClient:
             indicator_obj: Dict[str, str],
             indicator_types: Dict[str, str],
             field_map: Dict[str, str],
+            types_cache: Optional[Dict[str, Optional[str]]] = None,
     ) -> List[Dict[str, str]]:
         """
         Get indicators from indicator regex groups
@@ -423,26 +463,46 @@ class Taxii2FeedClient:
         :param indicator_obj: taxii indicator object
         :param indicator_types: supported indicator types -> cortex types
         :param field_map: map used to create fields entry ({field_name: field_value})
+        :param types_cache: cache of the cortex type of each term type of indicator_types
         :return: Indicators list
         """
         indicators = []
         if indicator_groups:
             for term in indicator_groups:
-                for taxii_type in indicator_types.keys():
-                    # term should be list with 2 argument parsed with regex - [`type`, `indicator`]
-                    if len(term) == 2 and taxii_type in term[0]:
-                        type_ = indicator_types[taxii_type]
-                        value = term[1]
+                # term should be list with 2 argument parsed with regex - [`type`, `indicator`]
+                if len(term) == 2:
+                    type_ = self.get_indicator_type(term[0], indicator_types, types_cache)
+                    if type_:
                         indicator = self.create_indicator(
-                            indicator_obj, type_, value, field_map
+                            indicator_obj, type_, term[1], field_map
                         )
                         indicators.append(indicator)
-                        break
         if self.skip_complex_mode and len(indicators) > 1:
             # we managed to pull more than a single indicator - indicating complex relationship
             return []
         return indicators
 
+    @staticmethod
+    def get_indicator_type(
+            term_type: str,
+            indicator_types: Dict[str, str],
+            types_cache: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Optional[str]:
+        """
+        Get the cortex type of a pattern term, the type of the first supported indicator type contained in the term
+        :param term_type: the type part of the term, e.g. `ipv4-addr:value=`
+        :param indicator_types: supported indicator types -> cortex types
+        :param types_cache: cache of the cortex type of each term type, updated with the term type if given
+        :return: the cortex type, or None if the term type is not supported
+        """
+        if types_cache is not None and term_type in types_cache:
+            return types_cache[term_type]
+        type_ = next((cortex_type for taxii_type, cortex_type in indicator_types.items() if taxii_type in term_type),
+                     None)
+        if types_cache is not None and len(types_cache) < MAX_CACHED_TERM_TYPES:
+            types_cache[term_type] = type_
+        return type_
+
     def create_indicator(self, indicator_obj, type_, value, field_map):
         """
         Create a cortex indicator from a stix indicator
@@ -452,9 +512,8 @@ class Taxii2FeedClient:
         :param field_map: field map used for mapping fields ({field_name: field_value})
         :return: Cortex indicator
         """
-        ioc_obj_copy = copy.deepcopy(indicator_obj)
-        ioc_obj_copy["value"] = value
-        ioc_obj_copy["type"] = type_
+        # a shallow copy, the nested values of the stix object are shared by the indicators created from it
+        ioc_obj_copy = dict(indicator_obj, value=value, type=type_)
         indicator = {
             "value": value,
             "type": type_,
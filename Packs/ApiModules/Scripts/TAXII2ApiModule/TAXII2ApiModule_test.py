@@ -1,5 +1,6 @@
 from CommonServerPython import *
-from TAXII2ApiModule import Taxii2FeedClient, TAXII_VER_2_1, HEADER_USERNAME
+from TAXII2ApiModule import Taxii2FeedClient, TAXII_VER_2_1, HEADER_USERNAME, STIX_2_TYPES_TO_CORTEX_TYPES, \
+    STIX_2_TYPES_TO_CORTEX_CIDR_TYPES
 from taxii2client import v20, v21
 import pytest
 import json
@@ -168,6 +169,65 @@ class TestBuildIterator:
         iocs = mock_client.build_iterator(limit=0)
         assert iocs == []
 
+    def test_batches_v21(self, mocker):
+        """
+        Scenario: Call build iterator batches on a v21.Collection with 2 pages
+
+        Given:
+        - Collection to fetch is of type v21.Collection, and its first page has more pages after it
+
+        When
+        - Consuming the batches of build_iterator_batches one by one
+
+        Then:
+        - Ensure the indicators of each page are yielded as soon as the page is polled
+        - Ensure client.next_page is the page that follows each batch, and None after the last batch
+        """
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch=None, proxies=[], verify=False, tlp_color='GREEN')
+        mocker.patch.object(mock_client, "collection_to_fetch", spec=v21.Collection)
+        first_page = dict(STIX_ENVELOPE_17_IOCS_19_OBJS, more=True, next='page-2')
+        get_objects = mocker.patch.object(mock_client.collection_to_fetch, 'get_objects',
+                                          side_effect=[first_page, STIX_ENVELOPE_17_IOCS_19_OBJS])
+
+        batches = mock_client.build_iterator_batches(added_after='2021-01-01T00:00:00.000Z')
+
+        assert next(batches) == CORTEX_17_IOCS_19_OBJS
+        assert mock_client.next_page == 'page-2'
+        assert get_objects.call_count == 1
+        assert next(batches) == CORTEX_17_IOCS_19_OBJS
+        assert mock_client.next_page is None
+        assert list(batches) == []
+        assert get_objects.call_args_list[1].kwargs == {'limit': 100, 'next': 'page-2'}
+
+    def test_batches_v21_resume_and_limit(self, mocker):
+        """
+        Scenario: Resume the poll of a v21.Collection from a next page, with a limit
+
+        Given:
+        - A next page to resume the poll from
+        - A limit of 20 indicators, and pages of 17 indicators that have more pages after them
+
+        When
+        - Calling build_iterator
+
+        Then:
+        - Ensure the poll is resumed from the next page, with the given filters
+        - Ensure 20 indicators are returned, and there is no next page to resume from
+        """
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch=None, proxies=[], verify=False, tlp_color='GREEN')
+        mocker.patch.object(mock_client, "collection_to_fetch", spec=v21.Collection)
+        page = dict(STIX_ENVELOPE_17_IOCS_19_OBJS, more=True, next='next-page')
+        get_objects = mocker.patch.object(mock_client.collection_to_fetch, 'get_objects', return_value=page)
+
+        iocs = mock_client.build_iterator(limit=20, next_page='page-2', added_after='2021-01-01T00:00:00.000Z')
+
+        assert iocs == CORTEX_17_IOCS_19_OBJS + CORTEX_17_IOCS_19_OBJS[:3]
+        assert mock_client.next_page is None
+        assert get_objects.call_args_list[0].kwargs == {
+            'limit': 20, 'next': 'page-2', 'added_after': '2021-01-01T00:00:00.000Z'
+        }
+        assert get_objects.call_args_list[1].kwargs == {'limit': 3, 'next': 'next-page'}
+
 
 class TestInitServer:
     """
@@ -320,3 +380,119 @@ class TestExtractIndicatorsAndParse:
 
         assert len(actual) == 14
         assert actual == expected
+
+
+def create_stix_indicators_bundle(objects_count):
+    """
+    Creates a synthetic STIX 2.1 bundle of indicators, with simple and complex patterns and nested values
+    """
+    patterns = [
+        "[ipv4-addr:value = '10.0.{0}.{1}']",
+        "[domain-name:value = 'domain{0}-{1}.example.com']",
+        "[file:hashes.'SHA-256' = '{0:032x}{1:032x}']",
+        "[url:value = 'https://example.com/{0}/{1}' AND ipv4-addr:value ISSUBSET '10.{0}.{1}.0/24']",
+    ]
+    return {
+        'type': 'bundle',
+        'id': 'bundle--00000000-0000-4000-8000-000000000000',
+        'objects': [{
+            'type': 'indicator',
+            'spec_version': '2.1',
+            'id': 'indicator--00000000-0000-4000-8000-{:012d}'.format(i),
+            'created': '2021-11-01T10:00:00.000Z',
+            'modified': '2021-11-01T10:{:02d}:00.000Z'.format(i % 60),
+            'pattern': patterns[i % len(patterns)].format(i // 256, i % 256),
+            'pattern_type': 'stix',
+            'valid_from': '2021-11-01T10:00:00.000Z',
+            'labels': ['malicious-activity', 'label{}'.format(i % 10)],
+            'description': 'Synthetic indicator {}'.format(i),
+            'external_references': [{'source_name': 'source{}'.format(j), 'url': 'https://example.com/{}'.format(j)}
+                                    for j in range(5)],
+            'kill_chain_phases': [{'kill_chain_name': 'lockheed-martin-cyber-kill-chain', 'phase_name': 'delivery'}],
+        } for i in range(objects_count)],
+    }
+
+
+class TestIndicatorConstruction:
+    """
+    Scenario: Create the cortex indicators of STIX indicators
+    """
+
+    def test_create_indicator_shares_stix_object(self):
+        """
+        Given:
+        - A STIX indicator with nested values
+
+        When:
+        - create_indicator is called twice, with different values
+
+        Then:
+        - The rawJSON of each indicator has its own value and type
+        - The STIX indicator is not modified, and its nested values are shared instead of copied
+        """
+        stix_obj = create_stix_indicators_bundle(1)['objects'][0]
+        stix_obj_before = json.loads(json.dumps(stix_obj))
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch='', proxies=[], verify=False, tags=['tag'])
+
+        first = mock_client.create_indicator(stix_obj, FeedIndicatorType.IP, '1.1.1.1', {})
+        second = mock_client.create_indicator(stix_obj, FeedIndicatorType.URL, 'https://example.com', {})
+
+        assert (first['rawJSON']['value'], first['rawJSON']['type']) == ('1.1.1.1', FeedIndicatorType.IP)
+        assert (second['rawJSON']['value'], second['rawJSON']['type']) == ('https://example.com', FeedIndicatorType.URL)
+        assert stix_obj == stix_obj_before
+        assert first['rawJSON']['external_references'] is stix_obj['external_references']
+        assert first['fields']['tags'] == ['tag', 'malicious-activity', 'label0']
+        assert stix_obj['labels'] == ['malicious-activity', 'label0']
+
+    @pytest.mark.parametrize('term_type, indicator_types, expected_type', [
+        ('ipv4-addr:value=', STIX_2_TYPES_TO_CORTEX_TYPES, FeedIndicatorType.IP),
+        ('domain-name:value=', STIX_2_TYPES_TO_CORTEX_TYPES, FeedIndicatorType.Domain),
+        ("file:hashes.'SHA-256'=", STIX_2_TYPES_TO_CORTEX_TYPES, FeedIndicatorType.File),
+        ('ipv6-addr:value', STIX_2_TYPES_TO_CORTEX_CIDR_TYPES, FeedIndicatorType.IPv6CIDR),
+        ('email-addr:value=', STIX_2_TYPES_TO_CORTEX_TYPES, None),
+    ])
+    def test_get_indicator_type(self, term_type, indicator_types, expected_type):
+        """
+        Given:
+        - Pattern term types, of supported and unsupported indicator types
+
+        When:
+        - get_indicator_type is called twice with a cache
+
+        Then:
+        - The cortex type of the term is returned, and cached for the next call
+        """
+        types_cache = {}
+
+        assert Taxii2FeedClient.get_indicator_type(term_type, indicator_types, types_cache) == expected_type
+        assert types_cache == {term_type: expected_type}
+        assert Taxii2FeedClient.get_indicator_type(term_type, {}, types_cache) == expected_type
+
+    @pytest.mark.skipif(not os.getenv('RUN_BENCHMARKS'), reason='benchmark, set RUN_BENCHMARKS to run it')
+    def test_parse_indicators_benchmark(self):
+        """
+        Given:
+        - A synthetic STIX 2.1 bundle of 50k indicators
+
+        When:
+        - Parsing its indicators
+
+        Then:
+        - Report the parsed objects per second and the peak memory of the parsing
+        """
+        import time
+        import tracemalloc
+        objects_count = 50000
+        stix_objs = create_stix_indicators_bundle(objects_count)['objects']
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch='', proxies=[], verify=False, tlp_color='GREEN')
+
+        tracemalloc.start()
+        start = time.time()
+        indicators = mock_client.parse_indicators_list(stix_objs)
+        duration = time.time() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert len(indicators) == objects_count // 4 * 5
+        print('Parsed {} STIX objects: {:.0f} objects/second, peak memory {:.1f} MB'.format(
+            objects_count, objects_count / duration, peak_memory / 1024 / 1024))
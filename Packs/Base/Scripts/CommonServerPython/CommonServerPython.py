@@ -20,6 +20,7 @@ from collections import OrderedDict
 from datetime import datetime, timedelta
 from abc import abstractmethod
 from distutils.version import LooseVersion
+import threading
 from threading import Lock
 
 import demistomock as demisto
@@ -65,6 +66,12 @@ except Exception:
         # for more info see https://cosmicpercolator.com/2016/01/13/exception-leaks-in-python-2-and-3/
         sys.exc_clear()
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except Exception:
+    if sys.version_info[0] < 3:
+        sys.exc_clear()
+
 CONTENT_RELEASE_VERSION = '0.0.0'
 CONTENT_BRANCH_NAME = 'master'
 IS_PY3 = sys.version_info[0] == 3
@@ -1774,8 +1781,52 @@ def create_clickable_url(url):
     return '[{}]({})'.format(url, url)
 
 
+MARKDOWN_TABLE_LINE_BREAK_REGEX = re.compile(r'\r\n|\r|\n')
+
+
+def escape_markdown_table_cell(st):
+    """
+       Escapes a table cell content, same as stringEscapeMD(st, True, True) with a fast path for plain strings
+
+       :type st: ``str``
+       :param st: The cell content (required)
+
+       :return: The escaped cell content
+       :rtype: ``str``
+    """
+    if '\n' in st or '\r' in st:
+        st = MARKDOWN_TABLE_LINE_BREAK_REGEX.sub('<br>', st)
+    if '|' in st:
+        st = st.replace('|', '\\|')
+    return st
+
+
+def format_markdown_table_cell(val):
+    """
+       Formats a table cell content, same as escaping formatCell(val, False) with a fast path for scalar values
+
+       :type val: ``Any``
+       :param val: The cell content (required)
+
+       :return: The formatted cell content
+       :rtype: ``str``
+    """
+    if isinstance(val, STRING_TYPES):
+        return escape_markdown_table_cell(val)
+    if val is None:
+        return ''
+    if isinstance(val, bool):
+        return 'true' if val else 'false'
+    if isinstance(val, int):
+        return str(val)
+    if isinstance(val, float) and val - val == 0:
+        # finite floats are formatted the same as json.dumps formats them
+        return repr(val)
+    return escape_markdown_table_cell(formatCell(val, False))
+
+
 def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None, url_keys=None,
-                    date_fields=None):
+                    date_fields=None, max_rows=None):
     """
        Converts a demisto table in JSON form to a Markdown table
 
@@ -1804,6 +1855,10 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
        :type date_fields: ``list``
        :param date_fields: A list of date fields to format the value to human-readable output.
 
+       :type max_rows: ``int``
+       :param max_rows: The maximal number of rows to present. If the table has more rows, only the first max_rows
+            rows are presented, followed by the number of the rows that were not presented. Default is all the rows.
+
        :return: A string representation of the markdown table
        :rtype: ``str``
     """
@@ -1811,16 +1866,17 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
     if url_keys:
         t = url_to_clickable_markdown(t, url_keys)
 
-    mdResult = ''
+    # the table is built as a list of strings, which are joined once in the end
+    mdResult = []
     if name:
-        mdResult = '### ' + name + '\n'
+        mdResult.append('### ' + name + '\n')
 
     if metadata:
-        mdResult += metadata + '\n'
+        mdResult.append(metadata + '\n')
 
     if not t or len(t) == 0:
-        mdResult += '**No entries.**\n'
-        return mdResult
+        mdResult.append('**No entries.**\n')
+        return ''.join(mdResult)
 
     if not headers and isinstance(t, dict) and len(t.keys()) == 1:
         # in case of a single key, create a column table where each element is in a different row.
@@ -1830,6 +1886,11 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
     if not isinstance(t, list):
         t = [t]
 
+    hidden_rows_count = 0
+    if max_rows and len(t) > max_rows:
+        hidden_rows_count = len(t) - max_rows
+        t = t[:max_rows]
+
     if headers and isinstance(headers, STRING_TYPES):
         headers = [headers]
 
@@ -1860,39 +1921,43 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
             def headerTransform(s): return stringEscapeMD(s, True, True)  # noqa
         for header in headers:
             newHeaders.append(headerTransform(header))
-        mdResult += '|'
+        mdResult.append('|')
         if len(newHeaders) == 1:
-            mdResult += newHeaders[0]
+            mdResult.append(newHeaders[0])
         else:
-            mdResult += '|'.join(newHeaders)
-        mdResult += '|\n'
+            mdResult.append('|'.join(newHeaders))
+        mdResult.append('|\n')
         sep = '---'
-        mdResult += '|' + '|'.join([sep] * len(headers)) + '|\n'
+        mdResult.append('|' + '|'.join([sep] * len(headers)) + '|\n')
+        date_headers = set(date_fields or []).intersection(headers)
         for entry in t:
-            entry_copy = entry.copy()
-            if date_fields:
-                for field in date_fields:
+            vals = []
+            for h in headers:
+                val = entry.get(h)
+                if h in date_headers:
                     try:
-                        entry_copy[field] = datetime.fromtimestamp(int(entry_copy[field]) / 1000).strftime('%Y-%m-%d %H:%M:%S')
+                        val = datetime.fromtimestamp(int(val) / 1000).strftime('%Y-%m-%d %H:%M:%S')
                     except Exception:
                         pass
-
-            vals = [stringEscapeMD((formatCell(entry_copy.get(h, ''), False) if entry_copy.get(h) is not None else ''),
-                                   True, True) for h in headers]
+                vals.append(format_markdown_table_cell(val))
 
             # this pipe is optional
-            mdResult += '| '
             try:
-                mdResult += ' | '.join(vals)
+                mdResult.append('| ' + ' | '.join(vals) + ' |\n')
             except UnicodeDecodeError:
                 vals = [str(v) for v in vals]
-                mdResult += ' | '.join(vals)
-            mdResult += ' |\n'
+                mdResult.append('| ' + ' | '.join(vals) + ' |\n')
+
+        if hidden_rows_count:
+            mdResult.append('\n**{} more rows.**\n'.format(hidden_rows_count))
 
     else:
-        mdResult += '**No entries.**\n'
+        mdResult.append('**No entries.**\n')
 
-    return mdResult
+    try:
+        return ''.join(mdResult)
+    except UnicodeDecodeError:
+        return ''.join(str(part) for part in mdResult)
 
 
 tblToMd = tableToMarkdown
@@ -6916,8 +6981,208 @@ H || val.SSDeep && val.SSDeep == obj.SSDeep)': {'Malicious': {'Vendor': 'Vendor'
                                .format(indicator_type, INDICATOR_TYPE_TO_CONTEXT_KEY.keys()))
 
 
+class RateLimiter(object):
+    """Thread safe token bucket rate limiter, used by ``BaseClient`` to throttle its requests.
+    The limiter learns the actual limits of the API from the ``Retry-After`` and ``X-RateLimit-*``
+    response headers, so requests are paced just under the vendor limits.
+    A learned rate never exceeds the configured *rate*, and the configured rate is restored once the
+    rate limit resets.
+    A single limiter instance can be shared by all the threads (and clients) of the same API.
+
+    :type rate: ``float``
+    :param rate: The number of requests allowed per second.
+
+    :type capacity: ``float``
+    :param capacity: The maximum burst of requests. If None, will use the *rate*.
+
+    :type max_wait: ``float``
+    :param max_wait: The maximum number of seconds to wait on a single ``Retry-After`` or rate limit reset.
+
+    :type max_retries: ``int``
+    :param max_retries: How many times a request that got a 429 (Too Many Requests) status code is resent.
+
+    :return: No data returned
+    :rtype: ``None``
+    """
+
+    def __init__(self, rate=10, capacity=None, max_wait=60, max_retries=3):
+        if rate <= 0:
+            raise ValueError('The rate of the rate limiter must be positive, got: {}'.format(rate))
+        self.rate = float(rate)
+        self.configured_rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.throttled_time = 0.0
+        self.throttled_requests = 0
+        self._tokens = self.capacity
+        self._last_refill = time.time()
+        self._blocked_until = 0.0
+        self._rate_reset_at = 0.0
+        self._lock = Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        self._restore_configured_rate(now)
+
+    def _restore_configured_rate(self, now):
+        if self._rate_reset_at and now >= self._rate_reset_at:
+            self.rate = self.configured_rate
+            self._rate_reset_at = 0.0
+
+    def acquire(self):
+        """Waits until a request can be sent, and consumes a token for it.
+
+        :return: The number of seconds waited.
+        :rtype: ``float``
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited:
+                        self.throttled_time += waited
+                        self.throttled_requests += 1
+                    return waited
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate, 0.001)
+            time.sleep(wait)
+            waited += wait
+
+    def block(self, seconds):
+        """Blocks all the requests for the given number of seconds (bounded by *max_wait*).
+
+        :type seconds: ``float``
+        :param seconds: The number of seconds to block the requests for.
+        """
+        seconds = min(max(seconds, 0), self.max_wait)
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+            self._tokens = min(self._tokens, 0)
+
+    @staticmethod
+    def _parse_retry_after(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+        try:
+            from email.utils import parsedate_tz, mktime_tz
+            parsed = parsedate_tz(value)
+            return mktime_tz(parsed) - time.time() if parsed else None
+        except Exception:  # noqa: disable=broad-except
+            return None
+
+    @staticmethod
+    def _get_header(headers, *names):
+        for name in names:
+            value = headers.get(name)
+            if value is not None:
+                return value
+        return None
+
+    def update_from_response(self, status_code, headers):
+        """Learns the API limits from a response.
+        A ``Retry-After`` header (or a 429 status code) blocks the requests, and the ``X-RateLimit-Remaining``
+        and ``X-RateLimit-Reset`` headers spread the remaining budget over the time left until the reset.
+
+        :type status_code: ``int``
+        :param status_code: The status code of the response.
+
+        :type headers: ``dict``
+        :param headers: The (case insensitive) headers of the response.
+
+        :return: The number of seconds to wait before resending the request, if it should be resent, otherwise None.
+        :rtype: ``float``
+        """
+        headers = headers or {}
+        retry_after = self._parse_retry_after(self._get_header(headers, 'Retry-After'))
+        remaining = self._get_header(headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        reset = self._get_header(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+        try:
+            remaining = int(float(remaining)) if remaining is not None else None
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            remaining = reset = None
+
+        reset_in = None
+        if reset is not None:
+            # the reset is either an epoch timestamp or the number of seconds until the reset
+            reset_in = reset - time.time() if reset > 1e9 else reset
+
+        if retry_after is None and status_code == 429:
+            retry_after = reset_in if reset_in is not None else 1.0 / self.rate
+        if retry_after is not None:
+            self.block(retry_after)
+            return min(max(retry_after, 0), self.max_wait) if status_code == 429 else None
+
+        if remaining is not None:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                self._tokens = min(self._tokens, remaining)
+                if reset_in and reset_in > 0:
+                    # the learned rate applies until the reset, and never exceeds the configured rate
+                    self.rate = min(max(remaining / reset_in, 1.0 / self.max_wait), self.configured_rate)
+                    self._rate_reset_at = now + reset_in
+            if remaining <= 0 and reset_in:
+                self.block(reset_in)
+        return None
+
+    def get_stats(self):
+        """Returns the throttling counters of the limiter.
+
+        :return: The current rate, the number of throttled requests and the total seconds spent throttled.
+        :rtype: ``dict``
+        """
+        with self._lock:
+            self._restore_configured_rate(time.time())
+            return {
+                'rate': self.rate,
+                'throttled_requests': self.throttled_requests,
+                'throttled_time': self.throttled_time
+            }
+
+
 # Will add only if 'requests' module imported
 if 'requests' in sys.modules:
+    class ThreadRetryHTTPAdapter(HTTPAdapter):
+        """An ``HTTPAdapter`` whose retry policy can be set per thread.
+        The adapter (and its connection pools) is shared by all the threads of a client, and each thread sends
+        its requests with the retry policy it set, so requests sent concurrently with different retry policies
+        (e.g. by ``_http_request_many``) do not change the policy of each other.
+        Threads that did not set a retry policy use the default one, set by assigning ``max_retries``.
+        """
+
+        def __init__(self, *args, **kwargs):
+            self._thread_retries = threading.local()
+            super(ThreadRetryHTTPAdapter, self).__init__(*args, **kwargs)
+
+        @property
+        def max_retries(self):
+            thread_retries = getattr(self, '_thread_retries', None)
+            return getattr(thread_retries, 'max_retries', None) or self._default_max_retries
+
+        @max_retries.setter
+        def max_retries(self, value):
+            self._default_max_retries = value
+
+        def set_thread_max_retries(self, retry):
+            """Sets the retry policy of the requests sent by the current thread.
+
+            :type retry: ``Retry``
+            :param retry: The retry policy.
+
+            :return: No data returned
+            :rtype: ``None``
+            """
+            if getattr(self, '_thread_retries', None) is None:
+                self._thread_retries = threading.local()
+            self._thread_retries.max_retries = retry
+
     class BaseClient(object):
         """Client to use in integrations with powerful _http_request
         :type base_url: ``str``
@@ -6944,17 +7209,55 @@ if 'requests' in sys.modules:
             The request authorization, for example: (username, password).
             Can be None.
 
+        :type pool_connections: ``int``
+        :param pool_connections: The number of per-host connection pools to cache.
+
+        :type pool_maxsize: ``int``
+        :param pool_maxsize: The maximum number of connections to keep open (and reuse) per host.
+
+        :type keep_alive: ``bool``
+        :param keep_alive:
+            Whether to keep connections open between requests. When set to False, every request
+            is sent with a 'Connection: close' header.
+
+        :type retries: ``int``
+        :param retries:
+            The default number of retries used by the client requests.
+            Can be overridden per request with the *retries* argument of ``_http_request``.
+
+        :type status_list_to_retry: ``iterable``
+        :param status_list_to_retry: The default HTTP status codes to force a retry on.
+
+        :type backoff_factor: ``float``
+        :param backoff_factor: The default backoff factor to apply between retry attempts.
+
+        :type rate_limiter: ``RateLimiter``
+        :param rate_limiter:
+            A rate limiter to throttle the client requests with. Requests that get a 429 status code
+            are resent after the ``Retry-After`` time. If None, the requests are not throttled.
+
         :return: No data returned
         :rtype: ``None``
         """
 
-        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None):
+        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None,
+                     pool_connections=10, pool_maxsize=10, keep_alive=True, retries=0,
+                     status_list_to_retry=None, backoff_factor=5, rate_limiter=None):
             self._base_url = base_url
             self._verify = verify
             self._ok_codes = ok_codes
             self._headers = headers
             self._auth = auth
             self._session = requests.Session()
+            self._pool_connections = pool_connections
+            self._pool_maxsize = pool_maxsize
+            self._default_retry_config = (retries, status_list_to_retry, backoff_factor, False, False)
+            self._retries_by_config = {}
+            self._adapter = None
+            self._rate_limiter = rate_limiter
+            self._mount_adapter()
+            if not keep_alive:
+                self._session.headers['Connection'] = 'close'
             if proxy:
                 ensure_proxy_has_http_prefix()
             else:
@@ -6972,6 +7275,88 @@ if 'requests' in sys.modules:
             except Exception:  # noqa
                 demisto.debug('failed to close BaseClient session with the following error:\n{}'.format(traceback.format_exc()))
 
+        def _mount_adapter(self):
+            """
+            Creates the single ``HTTPAdapter`` of the client and mounts it on the session.
+            The adapter (and its connection pools) is reused by all the requests of the client,
+            so connections to the same host are kept alive instead of being re-established per request.
+            The default retry policy of the adapter is the retry policy of the client.
+
+            :return: The mounted adapter, or None if the adapter could not be created.
+            :rtype: ``HTTPAdapter``
+            """
+            try:
+                self._adapter = ThreadRetryHTTPAdapter(pool_connections=getattr(self, '_pool_connections', 10),
+                                                       pool_maxsize=getattr(self, '_pool_maxsize', 10))
+                self._adapter.max_retries = self._get_retry(
+                    *getattr(self, '_default_retry_config', (0, None, 5, False, False)))
+                self._session.mount('http://', self._adapter)
+                self._session.mount('https://', self._adapter)
+            except NameError:
+                self._adapter = None
+            return self._adapter
+
+        def _get_retry(self, retries=0, status_list_to_retry=None, backoff_factor=5, raise_on_redirect=False,
+                       raise_on_status=False):
+            """
+            Returns the retry policy of the given retry arguments, see ``_implement_retry``.
+            The policies are created once per distinct arguments and reused.
+
+            :return: The retry policy.
+            :rtype: ``Retry``
+            """
+            retry_config = (retries, tuple(status_list_to_retry) if status_list_to_retry else None,
+                            backoff_factor, raise_on_redirect, raise_on_status)
+            if getattr(self, '_retries_by_config', None) is None:
+                self._retries_by_config = {}
+            retry = self._retries_by_config.get(retry_config)
+            if retry is not None:
+                return retry
+            if retries:
+                method_whitelist = "allowed_methods" if hasattr(Retry.DEFAULT, "allowed_methods") else "method_whitelist"
+                whitelist_kawargs = {
+                    method_whitelist: frozenset(['GET', 'POST', 'PUT'])
+                }
+                retry = Retry(
+                    total=retries,
+                    read=retries,
+                    connect=retries,
+                    backoff_factor=backoff_factor,
+                    status=retries,
+                    status_forcelist=status_list_to_retry,
+                    raise_on_status=raise_on_status,
+                    raise_on_redirect=raise_on_redirect,
+                    **whitelist_kawargs
+                )
+            else:
+                retry = Retry(0, read=False)
+            self._retries_by_config[retry_config] = retry
+            return retry
+
+        def get_connection_pool_stats(self):
+            """
+            Returns the connection pool counters of the client, used to verify connections are reused.
+            A hit is a request that was sent over an already open connection, a miss is a request
+            that required opening a new connection.
+
+            :return: The number of pools and the requests, hits and misses counters over all the pools.
+            :rtype: ``dict``
+            """
+            stats = {'pools': 0, 'requests': 0, 'hits': 0, 'misses': 0}
+            adapter = getattr(self, '_adapter', None)
+            pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+            if pools is None:
+                return stats
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats['pools'] += 1
+                stats['requests'] += pool.num_requests
+                stats['misses'] += pool.num_connections
+            stats['hits'] = max(stats['requests'] - stats['misses'], 0)
+            return stats
+
         def _implement_retry(self, retries=0,
                              status_list_to_retry=None,
                              backoff_factor=5,
@@ -6979,7 +7364,10 @@ if 'requests' in sys.modules:
                              raise_on_status=False):
             """
             Implements the retry mechanism.
-            In the default case where retries = 0 the request will fail on the first time
+            In the default case where retries = 0 the request will fail on the first time.
+            The retry policy is set on the client adapter for the requests of the current thread only,
+            so requests sent concurrently by other threads keep their own policy.
+            The adapter is created once and kept mounted, so the pooled connections are not discarded.
 
             :type retries: ``int``
             :param retries: How many retries should be made in case of a failure. when set to '0'- will fail on the first time
@@ -7015,24 +7403,14 @@ if 'requests' in sys.modules:
                 been exhausted.
             """
             try:
-                method_whitelist = "allowed_methods" if hasattr(Retry.DEFAULT, "allowed_methods") else "method_whitelist"
-                whitelist_kawargs = {
-                    method_whitelist: frozenset(['GET', 'POST', 'PUT'])
-                }
-                retry = Retry(
-                    total=retries,
-                    read=retries,
-                    connect=retries,
-                    backoff_factor=backoff_factor,
-                    status=retries,
-                    status_forcelist=status_list_to_retry,
-                    raise_on_status=raise_on_status,
-                    raise_on_redirect=raise_on_redirect,
-                    **whitelist_kawargs
-                )
-                adapter = HTTPAdapter(max_retries=retry)
-                self._session.mount('http://', adapter)
-                self._session.mount('https://', adapter)
+                adapter = getattr(self, '_adapter', None)
+                if adapter is None or self._session.adapters.get('https://') is not adapter:
+                    # the session was replaced (or the client __init__ was not called), mount a new adapter
+                    adapter = self._mount_adapter()
+                if adapter is None:
+                    return
+                adapter.set_thread_max_retries(
+                    self._get_retry(retries, status_list_to_retry, backoff_factor, raise_on_redirect, raise_on_status))
             except NameError:
                 pass
 
@@ -7040,7 +7418,7 @@ if 'requests' in sys.modules:
                           params=None, data=None, files=None, timeout=10, resp_type='json', ok_codes=None,
                           return_empty_response=False, retries=0, status_list_to_retry=None,
                           backoff_factor=5, raise_on_redirect=False, raise_on_status=False,
-                          error_handler=None, empty_valid_codes=None, **kwargs):
+                          error_handler=None, empty_valid_codes=None, json_path=None, **kwargs):
             """A wrapper for requests lib to send our requests and handle requests and responses better.
 
             :type method: ``str``
@@ -7084,8 +7462,14 @@ if 'requests' in sys.modules:
             :type resp_type: ``str``
             :param resp_type:
                 Determines which data format to return from the HTTP request. The default
-                is 'json'. Other options are 'text', 'content', 'xml' or 'response'. Use 'response'
-                 to return the full response object.
+                is 'json'. Other options are 'text', 'content', 'xml', 'json_stream' or 'response'. Use 'response'
+                 to return the full response object. Use 'json_stream' to get a generator of the items of
+                 the JSON array selected by *json_path*, parsed while the response is downloaded.
+
+            :type json_path: ``str``
+            :param json_path:
+                Used with the 'json_stream' resp_type. A dot separated path of the object keys leading to the
+                array to stream, for example: 'data.items'. If None, the response itself should be an array.
 
             :type ok_codes: ``tuple``
             :param ok_codes:
@@ -7144,20 +7528,37 @@ if 'requests' in sys.modules:
                 auth = auth if auth else self._auth
                 if retries:
                     self._implement_retry(retries, status_list_to_retry, backoff_factor, raise_on_redirect, raise_on_status)
-                # Execute
-                res = self._session.request(
-                    method,
-                    address,
-                    verify=self._verify,
-                    params=params,
-                    data=data,
-                    json=json_data,
-                    files=files,
-                    headers=headers,
-                    auth=auth,
-                    timeout=timeout,
-                    **kwargs
-                )
+                else:
+                    self._implement_retry(*getattr(self, '_default_retry_config', (0, None, 5, False, False)))
+                if resp_type.lower() == 'json_stream':
+                    kwargs['stream'] = True
+                rate_limiter = getattr(self, '_rate_limiter', None)
+                rate_limit_retries = 0
+                while True:
+                    if rate_limiter:
+                        rate_limiter.acquire()
+                    # Execute
+                    res = self._session.request(
+                        method,
+                        address,
+                        verify=self._verify,
+                        params=params,
+                        data=data,
+                        json=json_data,
+                        files=files,
+                        headers=headers,
+                        auth=auth,
+                        timeout=timeout,
+                        **kwargs
+                    )
+                    if not rate_limiter:
+                        break
+                    wait = rate_limiter.update_from_response(res.status_code, res.headers)
+                    if wait is None or rate_limit_retries >= rate_limiter.max_retries:
+                        break
+                    rate_limit_retries += 1
+                    demisto.debug('Got status code 429, resending the request in {} seconds'.format(wait))
+                    res.close()
                 # Handle error responses gracefully
                 if not self._is_status_code_valid(res, ok_codes):
                     if error_handler:
@@ -7184,6 +7585,8 @@ if 'requests' in sys.modules:
                 try:
                     if resp_type == 'json':
                         return res.json()
+                    if resp_type == 'json_stream':
+                        return self._stream_json_response(res, json_path)
                     if resp_type == 'text':
                         return res.text
                     if resp_type == 'content':
@@ -7228,6 +7631,245 @@ if 'requests' in sys.modules:
                 err_msg = 'Max Retries Error- Request attempts with {} retries failed. \n{}'.format(retries, reason)
                 raise DemistoException(err_msg, exception)
 
+        def _http_request_many(self, requests_specs, max_workers=5, retries=0, status_list_to_retry=None,
+                               backoff_factor=5, raise_on_redirect=False, raise_on_status=False,
+                               raise_on_error=False):
+            """Sends several requests concurrently using a bounded thread pool sharing the client session.
+            Each request is executed by ``_http_request``, so *ok_codes*, *resp_type* and the other arguments
+            behave exactly the same as in a single request.
+
+            Example:
+            >>> results = client._http_request_many([{'method': 'GET', 'url_suffix': 'ip/{}'.format(ip)} for ip in ips])
+            >>> errors = [result for result in results if isinstance(result, Exception)]
+
+            :type requests_specs: ``list``
+            :param requests_specs:
+                A list of dicts, each holding the keyword arguments of a single ``_http_request`` call,
+                for example: {'method': 'GET', 'url_suffix': 'event', 'resp_type': 'text'}.
+                The retry arguments are shared by all the requests and can not be set per request.
+
+            :type max_workers: ``int``
+            :param max_workers:
+                The maximum number of requests to send concurrently.
+                Limited by the *pool_maxsize* of the client, so that connections are reused.
+
+            :type retries: ``int``
+            :param retries: How many retries should be made in case of a failure, see ``_http_request``.
+
+            :type status_list_to_retry: ``iterable``
+            :param status_list_to_retry: A set of integer HTTP status codes that we should force a retry on.
+
+            :type backoff_factor ``float``
+            :param backoff_factor: A backoff factor to apply between retry attempts.
+
+            :type raise_on_redirect ``bool``
+            :param raise_on_redirect: See ``_http_request``.
+
+            :type raise_on_status ``bool``
+            :param raise_on_status: See ``_http_request``.
+
+            :type raise_on_error: ``bool``
+            :param raise_on_error:
+                Whether to raise the first error (by request order) after all the requests were sent.
+                By default, the raised exception is returned in place of the result of the failed request.
+
+            :return: The results of the requests, in the same order as *requests_specs*.
+            :rtype: ``list``
+            """
+            retry_args = ('retries', 'status_list_to_retry', 'backoff_factor', 'raise_on_redirect', 'raise_on_status')
+            for spec in requests_specs:
+                if 'method' not in spec:
+                    raise ValueError('Each request spec must contain the "method" key, got: {}'.format(spec))
+                overridden = [arg for arg in retry_args if arg in spec]
+                if overridden:
+                    raise ValueError('The retry arguments {} can not be set per request in _http_request_many'
+                                     .format(overridden))
+
+            def send(spec):
+                try:
+                    return self._http_request(retries=retries, status_list_to_retry=status_list_to_retry,
+                                              backoff_factor=backoff_factor, raise_on_redirect=raise_on_redirect,
+                                              raise_on_status=raise_on_status, **spec)
+                except Exception as exception:  # noqa: disable=broad-except
+                    return exception
+
+            max_workers = max(min(max_workers, getattr(self, '_pool_maxsize', max_workers), len(requests_specs)), 1)
+            if max_workers == 1 or 'ThreadPoolExecutor' not in globals():
+                results = [send(spec) for spec in requests_specs]
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(send, requests_specs))
+
+            if raise_on_error:
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+            return results
+
+        def paginate(self, method, url_suffix='', pagination_type='offset', items_path=None, page_size=50,
+                     limit=None, max_pages=None, prefetch=False, params=None, offset_param='offset',
+                     limit_param='limit', page_param='page', first_page=1, cursor_param='cursor',
+                     next_cursor_path=None, **kwargs):
+            """Generator of the items of a paginated API endpoint, sending a request per page using ``_http_request``.
+
+            Example:
+            >>> for user in client.paginate('GET', 'users', pagination_type='cursor', items_path='data',
+            >>>                             next_cursor_path='meta.next', limit=1000, prefetch=True):
+            >>>     handle(user)
+
+            :type method: ``str``
+            :param method: The HTTP method, for example: GET, POST, and so on.
+
+            :type url_suffix: ``str``
+            :param url_suffix: The API endpoint.
+
+            :type pagination_type: ``str``
+            :param pagination_type:
+                The pagination style of the API:
+                'offset' - the *offset_param* and *limit_param* URL parameters are sent.
+                'page' - the *page_param* (starting from *first_page*) and *limit_param* URL parameters are sent.
+                'cursor' - the token found in *next_cursor_path* of a page is sent as the *cursor_param* URL parameter.
+                'link' - the URL of the 'next' relation of the ``Link`` header of a page is requested.
+
+            :type items_path: ``str``
+            :param items_path:
+                A dot separated path of the keys leading to the items list in the response, for example: 'data.items'.
+                If None, the response itself should be the items list.
+
+            :type page_size: ``int``
+            :param page_size: The number of items to request per page. A page with less items is the last page.
+
+            :type limit: ``int``
+            :param limit: The maximum number of items to return. If None, all the items are returned.
+
+            :type max_pages: ``int``
+            :param max_pages: The maximum number of pages to request. If None, all the pages are requested.
+
+            :type prefetch: ``bool``
+            :param prefetch:
+                Whether to request the next page in a background thread, while the items of the current page
+                are being handled.
+
+            :type params: ``dict``
+            :param params: URL parameters to send in all the requests.
+
+            :type offset_param: ``str``
+            :param offset_param: The offset URL parameter name.
+
+            :type limit_param: ``str``
+            :param limit_param: The page size URL parameter name. If None, the page size is not sent.
+
+            :type page_param: ``str``
+            :param page_param: The page number URL parameter name.
+
+            :type first_page: ``int``
+            :param first_page: The number of the first page.
+
+            :type cursor_param: ``str``
+            :param cursor_param: The cursor URL parameter name.
+
+            :type next_cursor_path: ``str``
+            :param next_cursor_path: A dot separated path of the keys leading to the next page cursor in the response.
+
+            :type kwargs: ``dict``
+            :param kwargs: Additional arguments of ``_http_request``, for example: headers, json_data, ok_codes.
+
+            :return: A generator of the items.
+            :rtype: ``iterator``
+            """
+            if pagination_type not in ('offset', 'page', 'cursor', 'link'):
+                raise ValueError('Unsupported pagination type: {}'.format(pagination_type))
+            if pagination_type == 'cursor' and not next_cursor_path:
+                raise ValueError('The next_cursor_path argument is required for the cursor pagination type')
+
+            def get_path(obj, path):
+                return dict_safe_get(obj, path.split('.')) if path else obj
+
+            def fetch_page(page_request):
+                page_number, page_params, full_url = page_request
+                if pagination_type == 'link':
+                    res = self._http_request(method, url_suffix, full_url=full_url, params=page_params,
+                                             resp_type='response', **kwargs)
+                    response = res.json()
+                else:
+                    res = None
+                    response = self._http_request(method, url_suffix, params=page_params, **kwargs)
+                items = get_path(response, items_path) or []
+
+                next_request = None
+                if max_pages and page_number + 1 >= max_pages:
+                    pass
+                elif pagination_type == 'offset' and len(items) >= page_size:
+                    next_params = dict(page_params, **{offset_param: page_params[offset_param] + len(items)})
+                    next_request = (page_number + 1, next_params, None)
+                elif pagination_type == 'page' and len(items) >= page_size:
+                    next_params = dict(page_params, **{page_param: page_params[page_param] + 1})
+                    next_request = (page_number + 1, next_params, None)
+                elif pagination_type == 'cursor' and items:
+                    cursor = get_path(response, next_cursor_path)
+                    if cursor:
+                        next_request = (page_number + 1, dict(page_params, **{cursor_param: cursor}), None)
+                elif pagination_type == 'link' and items:
+                    next_url = res.links.get('next', {}).get('url')
+                    if next_url:
+                        # the next link already contains the query of the next page
+                        next_request = (page_number + 1, None, next_url)
+                return items, next_request
+
+            first_params = dict(params or {})
+            if limit_param and pagination_type in ('offset', 'page'):
+                first_params[limit_param] = page_size
+            if pagination_type == 'offset':
+                first_params.setdefault(offset_param, 0)
+            elif pagination_type == 'page':
+                first_params.setdefault(page_param, first_page)
+
+            executor = ThreadPoolExecutor(max_workers=1) if prefetch and 'ThreadPoolExecutor' in globals() else None
+            try:
+                returned = 0
+                page = fetch_page((0, first_params, None))
+                while True:
+                    items, next_request = page
+                    if limit and returned + len(items) >= limit:
+                        items, next_request = items[:limit - returned], None
+                    next_page = None
+                    if next_request and executor:
+                        next_page = executor.submit(fetch_page, next_request)
+                    for item in items:
+                        yield item
+                    returned += len(items)
+                    if not next_request:
+                        return
+                    page = next_page.result() if next_page else fetch_page(next_request)
+            finally:
+                if executor:
+                    executor.shutdown(wait=False)
+
+        @staticmethod
+        def _stream_json_response(res, json_path=None, chunk_size=1024 * 64):
+            """Yields the items of a JSON array in the response body while it is downloaded.
+
+            :type res: ``requests.Response``
+            :param res: A response of a request sent with stream=True.
+
+            :type json_path: ``str``
+            :param json_path: A dot separated path of the object keys leading to the array.
+
+            :type chunk_size: ``int``
+            :param chunk_size: The size (in bytes) of the chunks to read from the response.
+
+            :return: A generator of the array items.
+            :rtype: ``iterator``
+            """
+            try:
+                for item in iter_json_array_items(res.iter_content(chunk_size=chunk_size), json_path):
+                    yield item
+            except ValueError as exception:
+                raise DemistoException('Failed to parse json object from response: {}'.format(exception),
+                                       exception, res)
+            finally:
+                res.close()
+
         def _is_status_code_valid(self, response, ok_codes=None):
             """If the status code is OK, return 'True'.
 
@@ -7249,6 +7891,120 @@ if 'requests' in sys.modules:
             return response.ok
 
 
+def iter_json_array_items(chunks, json_path=None, skipped_values=None, object_pairs_hook=None):
+    """Incrementally parses a JSON document and yields the items of one of its arrays,
+    without holding the whole document in memory.
+    Only the array items are decoded, any other value on the way to the array is skipped.
+
+    Example:
+    >>> list(iter_json_array_items(['{"total": 2, "data": {"items": [{"id": 1}', ', {"id": 2}]}}'], 'data.items'))
+    [{'id': 1}, {'id': 2}]
+
+    :type chunks: ``iterable``
+    :param chunks: The document chunks (``str`` or UTF-8 encoded ``bytes``), for example: response.iter_content().
+
+    :type json_path: ``str``
+    :param json_path:
+        A dot separated path of the object keys leading to the array, for example: 'data.items'.
+        If None, the document itself should be an array.
+
+    :type skipped_values: ``dict``
+    :param skipped_values:
+        If given, the values of the keys skipped on the way to the array are saved in it by their keys,
+        for example the metadata of a response which precedes its results array.
+
+    :type object_pairs_hook: ``callable``
+    :param object_pairs_hook: If given, used to decode the JSON objects, as in json.loads (e.g. OrderedDict).
+
+    :return: A generator of the array items.
+    :rtype: ``iterator``
+    """
+    import codecs
+    number_chars = '0123456789.eE+-'
+    decoder = json.JSONDecoder(object_pairs_hook=object_pairs_hook)
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    state = {'buffer': u'', 'pos': 0, 'eof': False}
+
+    def read_more():
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if isinstance(chunk, bytes):
+                chunk = utf8_decoder.decode(chunk)
+            # drop the consumed data, so the buffer holds only the data that was not parsed yet
+            state['buffer'] = state['buffer'][state['pos']:] + chunk
+            state['pos'] = 0
+            return True
+        state['eof'] = True
+        return False
+
+    def next_char():
+        while True:
+            buffer, pos = state['buffer'], state['pos']
+            while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return None
+
+    def expect(chars):
+        char = next_char()
+        if char is None or char not in chars:
+            raise ValueError('Failed to parse the JSON stream: expected one of {!r}, got {!r}'.format(chars, char))
+        state['pos'] += 1
+        return char
+
+    def decode_value():
+        next_char()
+        while True:
+            try:
+                buffer = state['buffer']
+                value, end = decoder.raw_decode(buffer, state['pos'])
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    # a number might be truncated at the end of the buffer, e.g. "12" of "123", "1." of "1.5",
+                    # or "1e" of "1e5", so its characters are scanned to check whether it continues in the next chunk
+                    while end < len(buffer) and buffer[end] in number_chars:
+                        end += 1
+                    if end < len(buffer) or state['eof']:
+                        value, end = decoder.raw_decode(buffer[:end], state['pos'])
+                        state['pos'] = end
+                        return value
+                elif end < len(buffer) or state['eof']:
+                    state['pos'] = end
+                    return value
+            except ValueError:
+                if state['eof']:
+                    raise
+            if not read_more() and state['pos'] >= len(state['buffer']):
+                raise ValueError('Failed to parse the JSON stream: unexpected end of data')
+
+    for key in (json_path.split('.') if json_path else []):
+        expect('{')
+        while True:
+            if next_char() == '}':
+                raise ValueError('Failed to parse the JSON stream: the key {} was not found'.format(key))
+            current_key = decode_value()
+            expect(':')
+            if current_key == key:
+                break
+            value = decode_value()
+            if skipped_values is not None:
+                skipped_values[current_key] = value
+            if expect(',}') == '}':
+                raise ValueError('Failed to parse the JSON stream: the key {} was not found'.format(key))
+
+    expect('[')
+    if next_char() == ']':
+        return
+    while True:
+        yield decode_value()
+        if expect(',]') == ']':
+            return
+
+
 def batch(iterable, batch_size=1):
     """Gets an iterable and yields slices of it.
 
@@ -7269,6 +8025,147 @@ def batch(iterable, batch_size=1):
         not_batched = not_batched[batch_size:]
 
 
+MAX_INDICATORS_BATCH_BYTES = 5 * 1024 * 1024
+MAX_INDICATORS_BATCH_SIZE = 2000
+
+
+def create_indicators_in_batches(indicators, max_batch_bytes=MAX_INDICATORS_BATCH_BYTES,
+                                 max_batch_size=MAX_INDICATORS_BATCH_SIZE, no_update=None, submit_empty=False):
+    """Submits the indicators to the server while they are generated, in batches bounded by their JSON size.
+    A batch is sent as soon as it is full, so the indicators of a feed do not have to be held in memory together.
+    Each batch waits for the previous one to be submitted, which keeps the parsing at the server's ingestion pace.
+
+    :type indicators: ``iterable``
+    :param indicators: A list or a generator of indicators.
+
+    :type max_batch_bytes: ``int``
+    :param max_batch_bytes: The maximal size, in bytes, of the JSON of the indicators in a batch.
+
+    :type max_batch_size: ``int``
+    :param max_batch_size: The maximal number of indicators in a batch.
+
+    :type no_update: ``bool``
+    :param no_update: The noUpdate argument of createIndicators (server version 6.5.0 and above).
+        If None, the argument is not sent.
+
+    :type submit_empty: ``bool``
+    :param submit_empty: Whether to call createIndicators with an empty list if there are no indicators.
+
+    :rtype: ``dict``
+    :return: The number of batches, indicators and bytes that were submitted, the total time of the
+        submission and the latency of the slowest batch, in seconds.
+    """
+    stats = {'batches': 0, 'indicators': 0, 'bytes': 0, 'total_time': 0.0, 'max_latency': 0.0}
+    kwargs = {} if no_update is None else {'noUpdate': no_update}
+
+    def submit(indicators_batch, batch_bytes):
+        start = time.time()
+        demisto.createIndicators(indicators_batch, **kwargs)
+        latency = time.time() - start
+        stats['batches'] += 1
+        stats['indicators'] += len(indicators_batch)
+        stats['bytes'] += batch_bytes
+        stats['total_time'] += latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+        demisto.debug('createIndicators batch {}: {} indicators, {} bytes, {:.3f} seconds'.format(
+            stats['batches'], len(indicators_batch), batch_bytes, latency))
+
+    current_batch = []
+    current_batch_bytes = 0
+    for indicator in indicators:
+        # the indicator's JSON and its separator in the JSON list of the batch
+        indicator_bytes = len(json.dumps(indicator, default=str)) + 2
+        if current_batch and current_batch_bytes + indicator_bytes > max_batch_bytes:
+            submit(current_batch, current_batch_bytes)
+            current_batch = []
+            current_batch_bytes = 0
+        current_batch.append(indicator)
+        current_batch_bytes += indicator_bytes
+        if len(current_batch) >= max_batch_size:
+            submit(current_batch, current_batch_bytes)
+            current_batch = []
+            current_batch_bytes = 0
+
+    if current_batch or (submit_empty and not stats['batches']):
+        submit(current_batch, current_batch_bytes)
+    demisto.debug('createIndicators submitted {indicators} indicators in {batches} batches, {bytes} bytes, '
+                  '{total_time:.3f} seconds, max batch latency {max_latency:.3f} seconds'.format(**stats))
+    return stats
+
+
+def get_conditional_request_headers(url):
+    """Gets the conditional request headers of a feed URL, according to the ETag and Last-Modified headers of the
+    last response of the URL that were saved in the integration context by ``save_conditional_request_headers``.
+    A feed that was not modified since then responds with 304.
+    The indicators of all the URLs of a feed are required when any of them was modified, so if only some of the
+    URLs respond with 304, they should be requested again without these headers.
+
+    :type url: ``str``
+    :param url: The feed URL.
+
+    :rtype: ``dict``
+    :return: The If-None-Match and If-Modified-Since headers of the URL.
+    """
+    feed_cache = get_integration_context().get(url) or {}
+    headers = {}
+    if feed_cache.get('etag'):
+        headers['If-None-Match'] = feed_cache['etag']
+    if feed_cache.get('last_modified'):
+        headers['If-Modified-Since'] = feed_cache['last_modified']
+    return headers
+
+
+def save_conditional_request_headers(url_to_response):
+    """Saves the ETag and Last-Modified headers of the feeds responses in the integration context, so they are
+    sent in the conditional requests of the next fetch.
+    Should be called only after the indicators of the responses were created, so a fetch that failed before
+    that is not skipped by the next one.
+
+    :type url_to_response: ``dict``
+    :param url_to_response: The response of each feed URL. Only the responses with status code 200 are saved.
+
+    :return: No data returned
+    :rtype: ``None``
+    """
+    modified_feeds = {url: {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+                      for url, response in url_to_response.items() if response.status_code == 200}
+    if modified_feeds:
+        context = get_integration_context()
+        context.update(modified_feeds)
+        set_integration_context(context)
+
+
+def spool_response_content(response, chunk_size=1024 * 1024, max_memory_size=10 * 1024 * 1024):
+    """Downloads the content of a streamed response into a temporary file, which is held in memory up to
+    *max_memory_size* bytes and is written to the disk beyond it.
+    Used to download the content of several responses concurrently, while they are parsed one after the other.
+
+    :type response: ``requests.Response``
+    :param response: The response, requested with stream=True. It is closed once its content is downloaded.
+
+    :type chunk_size: ``int``
+    :param chunk_size: The size of the chunks the content is downloaded in.
+
+    :type max_memory_size: ``int``
+    :param max_memory_size: The maximal size of the content to hold in memory.
+
+    :return: The file of the content, positioned at its start.
+    :rtype: ``tempfile.SpooledTemporaryFile``
+    """
+    import tempfile
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            spooled_file.write(chunk)
+    except Exception:
+        spooled_file.close()
+        raise
+    finally:
+        response.close()
+    spooled_file.seek(0)
+    return spooled_file
+
+
 def dict_safe_get(dict_object, keys, default_return_value=None, return_type=None, raise_return_type=True):
     """Recursive safe get query (for nested dicts and lists), If keys found return value otherwise return None or default value.
     Example:
@@ -17,7 +17,8 @@ from CommonServerPython import xml2json, json2xml, entryTypes, formats, tableToM
     argToBoolean, ipv4Regex, ipv4cidrRegex, ipv6cidrRegex, ipv6Regex, batch, FeedIndicatorType, \
     encode_string_results, safe_load_json, remove_empty_elements, aws_table_to_markdown, is_demisto_version_ge, \
     appendContext, auto_detect_indicator_type, handle_proxy, get_demisto_version_as_str, get_x_content_info_headers, \
-    url_to_clickable_markdown, WarningsHandler, DemistoException, SmartGetDict
+    url_to_clickable_markdown, WarningsHandler, DemistoException, SmartGetDict, \
+    create_indicators_in_batches
 import CommonServerPython
 
 try:
@@ -700,6 +701,93 @@ class TestTableToMarkdown:
 '''
         assert table == expected_md_table
 
+    @staticmethod
+    def test_max_rows():
+        """
+        Given:
+          - List of 5 objects.
+        When:
+          - Calling tableToMarkdown with max_rows=2.
+        Then:
+          - Return a table of the first 2 objects, followed by the number of the rows that were not presented.
+        """
+        data = [{'id': i} for i in range(5)]
+
+        table = tableToMarkdown('tableToMarkdown test', data, max_rows=2)
+
+        expected_md_table = '''### tableToMarkdown test
+|id|
+|---|
+| 0 |
+| 1 |
+
+**3 more rows.**
+'''
+        assert table == expected_md_table
+        assert tableToMarkdown('tableToMarkdown test', data, max_rows=5) == tableToMarkdown('tableToMarkdown test', data)
+
+    @pytest.mark.parametrize('value', ['text', 'a | b\r\nc\rd\ne', u'\u05d0', '', 0, 10, -3, True, False, 1.5, 1e16,
+                                       float('nan'), float('inf'), [], ['a', 1], {'a': 'b|c'}, [{'a': 1}], None])
+    @staticmethod
+    def test_format_markdown_table_cell(value):
+        """
+        Given:
+          - A table cell value.
+        When:
+          - Formatting it with the scalar values fast path.
+        Then:
+          - Return the same content as escaping the formatCell of the value.
+        """
+        from CommonServerPython import format_markdown_table_cell, formatCell, stringEscapeMD
+        expected = stringEscapeMD(formatCell(value, False), True, True) if value is not None else ''
+        assert format_markdown_table_cell(value) == expected
+
+    @staticmethod
+    def test_large_table():
+        """
+        Given:
+          - A synthetic table of 10k rows, with string, number, boolean, list and multiline values.
+        When:
+          - Calling tableToMarkdown.
+        Then:
+          - Ensure all the rows are rendered, with their values formatted and escaped.
+        """
+        headers = ['id', 'name', 'description', 'score', 'tags', 'active']
+        rows_count = 10000
+        data = [{'id': i, 'name': 'name {}'.format(i), 'description': 'line 1\nline 2 | {}'.format(i),
+                 'score': i / 4.0, 'tags': ['a', 'b'], 'active': i % 2 == 0} for i in range(rows_count)]
+        lines = tableToMarkdown('large table', data, headers=headers).splitlines()
+
+        assert len(lines) == rows_count + 3
+        assert lines[3] == '| 0 | name 0 | line 1<br>line 2 \\| 0 | 0.0 | a,<br>b | true |'
+        assert lines[-1] == '| 9999 | name 9999 | line 1<br>line 2 \\| 9999 | 2499.75 | a,<br>b | false |'
+
+    @staticmethod
+    @pytest.mark.skipif(not os.getenv('RUN_BENCHMARKS'), reason='benchmark, set RUN_BENCHMARKS to run it')
+    def test_large_table_benchmark():
+        """
+        Given:
+          - Synthetic tables of 1k, 10k and 100k rows, with string, number, boolean, list and multiline values.
+        When:
+          - Calling tableToMarkdown.
+        Then:
+          - Report the time of each table, and ensure the time per row does not grow with the size of the table.
+        """
+        import timeit
+        headers = ['id', 'name', 'description', 'score', 'tags', 'active']
+        time_per_row = {}
+        for rows_count in (1000, 10000, 100000):
+            data = [{'id': i, 'name': 'name {}'.format(i), 'description': 'line 1\nline 2 | {}'.format(i),
+                     'score': i / 3.0, 'tags': ['a', 'b'], 'active': i % 2 == 0} for i in range(rows_count)]
+            tables = []
+            duration = min(timeit.repeat(lambda: tables.append(tableToMarkdown('benchmark', data, headers=headers)),
+                                         repeat=2, number=1))
+            assert tables[0].count('\n') == rows_count + 3
+            time_per_row[rows_count] = duration / rows_count
+            print('tableToMarkdown of {} rows: {:.3f} seconds'.format(rows_count, duration))
+
+        assert time_per_row[100000] < 5 * time_per_row[1000]
+
 
 @pytest.mark.parametrize('data, expected_data', COMPLEX_DATA_WITH_URLS)
 def test_url_to_clickable_markdown(data, expected_data):
@@ -2617,6 +2705,564 @@ class TestBaseClient:
         response.status_code = 400
         assert not self.client._is_status_code_valid(response)
 
+    def test_http_request_reuses_adapter(self, requests_mock):
+        """
+            Given
+            - A base client
+
+            When
+            - Making http request calls with and without retries
+
+            Then
+            -  Ensure the same adapter is kept mounted and only its retry policy changes between the calls
+        """
+        from CommonServerPython import BaseClient
+        requests_mock.get('http://example.com/api/v2/event', text=json.dumps(self.text))
+        client = BaseClient('http://example.com/api/v2/', ok_codes=(200, 201), pool_maxsize=20)
+        adapter = client._session.adapters['https://']
+        assert adapter is client._adapter
+        assert adapter._pool_maxsize == 20
+
+        client._http_request('get', 'event', retries=3, status_list_to_retry=[429])
+        assert client._session.adapters['https://'] is adapter
+        assert adapter.max_retries.total == 3
+        assert 429 in adapter.max_retries.status_forcelist
+
+        client._http_request('get', 'event')
+        assert client._session.adapters['https://'] is adapter
+        assert adapter.max_retries.total == 0
+
+    def test_http_request_default_retry_policy(self, requests_mock):
+        """
+            Given
+            - A base client configured with a default retry policy
+
+            When
+            - Making http request calls with and without overriding the retries
+
+            Then
+            -  Ensure the client policy is used unless overridden by the request
+        """
+        from CommonServerPython import BaseClient
+        requests_mock.get('http://example.com/api/v2/event', text=json.dumps(self.text))
+        client = BaseClient('http://example.com/api/v2/', retries=2, backoff_factor=0.5)
+        assert client._adapter.max_retries.total == 2
+
+        client._http_request('get', 'event', retries=4)
+        assert client._adapter.max_retries.total == 4
+
+        client._http_request('get', 'event')
+        assert client._adapter.max_retries.total == 2
+        assert client._adapter.max_retries.backoff_factor == 0.5
+
+    def test_http_request_retry_policy_per_thread(self):
+        """
+            Given
+            - A base client whose requests are sent concurrently by two threads, each with its own retry policy
+
+            When
+            - Both threads set their retry policy before either of them sends its request
+
+            Then
+            -  Ensure each thread sends its request with its own retry policy
+            -  Ensure threads which did not set a retry policy use the client policy
+        """
+        if not IS_PY3:
+            pytest.skip("test not supported in py2")
+        import threading
+        from CommonServerPython import BaseClient
+        client = BaseClient('http://example.com/api/v2/', retries=1)
+        policies_set = threading.Barrier(2, timeout=5)
+        thread_retries = {}
+
+        def send_request(retries):
+            client._implement_retry(retries)
+            policies_set.wait()
+            thread_retries[retries] = client._adapter.max_retries.total
+
+        threads = [threading.Thread(target=send_request, args=(retries,)) for retries in (0, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        assert thread_retries == {0: 0, 3: 3}
+        default_retries = []
+        thread = threading.Thread(target=lambda: default_retries.append(client._adapter.max_retries.total))
+        thread.start()
+        thread.join(5)
+        assert default_retries == [1]
+
+    def test_http_request_replaced_session(self, requests_mock):
+        """
+            Given
+            - A base client whose session was replaced after the client was initialized
+
+            When
+            - Making an http request call with retries
+
+            Then
+            -  Ensure an adapter with the retry policy is mounted on the new session
+        """
+        from CommonServerPython import BaseClient
+        requests_mock.get('http://example.com/api/v2/event', text=json.dumps(self.text))
+        client = BaseClient('http://example.com/api/v2/')
+        client._session = requests.Session()
+        client._http_request('get', 'event', retries=1)
+        assert client._session.adapters['https://'] is client._adapter
+        assert client._adapter.max_retries.total == 1
+
+    def test_http_request_many(self, requests_mock):
+        """
+            Given
+            - A base client and several request specs, one of them failing
+
+            When
+            - Sending the requests with _http_request_many
+
+            Then
+            -  Ensure the results are returned in the requests order and the failure is returned in place
+        """
+        from CommonServerPython import DemistoException
+        for i in range(10):
+            requests_mock.get('http://example.com/api/v2/event/{}'.format(i), json={'id': i})
+        requests_mock.get('http://example.com/api/v2/event/bad', status_code=500)
+        requests_mock.get('http://example.com/api/v2/text', text='ok')
+        specs = [{'method': 'GET', 'url_suffix': 'event/{}'.format(i)} for i in range(10)]
+        specs.insert(3, {'method': 'GET', 'url_suffix': 'event/bad'})
+        specs.append({'method': 'GET', 'url_suffix': 'text', 'resp_type': 'text'})
+
+        results = self.client._http_request_many(specs, max_workers=4)
+
+        assert len(results) == 12
+        assert isinstance(results[3], DemistoException)
+        assert [res['id'] for res in results[:3] + results[4:11]] == list(range(10))
+        assert results[11] == 'ok'
+
+    def test_http_request_many_ok_codes_and_raise(self, requests_mock):
+        from CommonServerPython import DemistoException
+        requests_mock.get('http://example.com/api/v2/event', status_code=500, json={})
+        specs = [{'method': 'GET', 'url_suffix': 'event', 'ok_codes': (500,), 'resp_type': 'response'},
+                 {'method': 'GET', 'url_suffix': 'event'}]
+        results = self.client._http_request_many(specs)
+        assert results[0].status_code == 500
+        with raises(DemistoException, match="500"):
+            self.client._http_request_many(specs, raise_on_error=True)
+
+    def test_http_request_many_invalid_spec(self):
+        with raises(ValueError, match='method'):
+            self.client._http_request_many([{'url_suffix': 'event'}])
+        with raises(ValueError, match='retries'):
+            self.client._http_request_many([{'method': 'GET', 'retries': 3}])
+
+    def test_keep_alive_disabled(self):
+        from CommonServerPython import BaseClient
+        client = BaseClient('http://example.com/api/v2/', keep_alive=False)
+        assert client._session.headers['Connection'] == 'close'
+
+    def test_connection_pool_stats(self):
+        """
+            Given
+            - A base client and a local http server supporting keep-alive connections
+
+            When
+            - Making several http request calls to the server
+
+            Then
+            -  Ensure a single connection was opened and reused by the following requests
+        """
+        if not IS_PY3:
+            pytest.skip("test not supported in py2")
+        import threading
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        from CommonServerPython import BaseClient
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = b'{"status": "ok"}'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = BaseClient('http://127.0.0.1:{}/'.format(server.server_port))
+            assert client.get_connection_pool_stats() == {'pools': 0, 'requests': 0, 'hits': 0, 'misses': 0}
+            for _ in range(3):
+                assert client._http_request('get', 'event') == self.text
+            assert client.get_connection_pool_stats() == {'pools': 1, 'requests': 3, 'hits': 2, 'misses': 1}
+            client._session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestRateLimiter:
+    @pytest.fixture()
+    def clock(self, mocker):
+        """
+        Mocks the time module with a fake clock that is advanced by time.sleep
+        """
+        now = [1600000000.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        mocker.patch.object(CommonServerPython.time, 'time', side_effect=lambda: now[0])
+        mocker.patch.object(CommonServerPython.time, 'sleep', side_effect=sleep)
+        return now
+
+    def test_acquire_throttles_by_rate(self, clock):
+        """
+            Given
+            - A rate limiter allowing 2 requests per second with no burst
+
+            When
+            - Acquiring 5 tokens
+
+            Then
+            -  Ensure the requests are spread over 2 seconds and the throttled time is reported
+        """
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=2, capacity=1)
+        for _ in range(5):
+            limiter.acquire()
+        assert clock[0] == pytest.approx(1600000002.0)
+        stats = limiter.get_stats()
+        assert stats['throttled_requests'] == 4
+        assert stats['throttled_time'] == pytest.approx(2.0)
+
+    def test_retry_after_blocks(self, clock):
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=100)
+        assert limiter.update_from_response(429, {'Retry-After': '3'}) == 3
+        limiter.acquire()
+        assert clock[0] == pytest.approx(1600000003.0)
+
+    def test_retry_after_bounded_by_max_wait(self, clock):
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=100, max_wait=10)
+        assert limiter.update_from_response(429, {'Retry-After': '3600'}) == 10
+
+    def test_rate_limit_headers_adapt_rate(self, clock):
+        """
+            Given
+            - A rate limiter allowing 100 requests per second
+
+            When
+            - Getting a response with 10 remaining requests until a reset in 20 seconds
+
+            Then
+            -  Ensure the rate is lowered to spread the remaining budget until the reset
+        """
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=100)
+        assert limiter.update_from_response(200, {'X-RateLimit-Remaining': '10',
+                                                  'X-RateLimit-Reset': str(1600000000.0 + 20)}) is None
+        assert limiter.rate == pytest.approx(0.5)
+
+    def test_rate_limit_headers_rate_bounded_and_restored(self, clock):
+        """
+            Given
+            - A rate limiter allowing 10 requests per second
+
+            When
+            - Getting a response with 1000 remaining requests until a reset in 10 seconds, and then one with
+              10 remaining requests until a reset in 20 seconds
+
+            Then
+            -  Ensure the learned rate does not exceed the configured rate
+            -  Ensure the configured rate is restored once the rate limit resets
+        """
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=10)
+        limiter.update_from_response(200, {'X-RateLimit-Remaining': '1000', 'X-RateLimit-Reset': '10'})
+        assert limiter.rate == 10
+        limiter.update_from_response(200, {'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '20'})
+        assert limiter.rate == pytest.approx(0.5)
+        clock[0] += 19
+        assert limiter.get_stats()['rate'] == pytest.approx(0.5)
+        clock[0] += 1
+        assert limiter.get_stats()['rate'] == 10
+
+    def test_exhausted_budget_blocks_until_reset(self, clock):
+        from CommonServerPython import RateLimiter
+        limiter = RateLimiter(rate=100)
+        limiter.update_from_response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '5'})
+        limiter.acquire()
+        assert clock[0] >= 1600000005.0
+
+    def test_http_request_resends_on_429(self, mocker, clock, requests_mock):
+        """
+            Given
+            - A base client with a rate limiter
+
+            When
+            - The API responds with 429 and a Retry-After header, and then with 200
+
+            Then
+            -  Ensure the 429 response is closed, and the request is resent after the Retry-After time
+            -  Ensure the response is returned
+        """
+        from CommonServerPython import BaseClient, RateLimiter
+        requests_mock.get('http://example.com/api/v2/event', [
+            {'status_code': 429, 'headers': {'Retry-After': '2'}, 'json': {}},
+            {'status_code': 200, 'json': {'status': 'ok'}},
+        ])
+        close = mocker.spy(requests.Response, 'close')
+        limiter = RateLimiter(rate=100)
+        client = BaseClient('http://example.com/api/v2/', rate_limiter=limiter)
+        assert client._http_request('get', 'event') == {'status': 'ok'}
+        assert requests_mock.call_count == 2
+        assert [call[0][0].status_code for call in close.call_args_list] == [429]
+        assert limiter.get_stats()['throttled_time'] == pytest.approx(2.0)
+
+    def test_http_request_429_retries_exhausted(self, clock, requests_mock):
+        from CommonServerPython import BaseClient, RateLimiter
+        requests_mock.get('http://example.com/api/v2/event', status_code=429, headers={'Retry-After': '1'}, json={})
+        client = BaseClient('http://example.com/api/v2/', rate_limiter=RateLimiter(rate=100, max_retries=2))
+        with raises(DemistoException, match='429'):
+            client._http_request('get', 'event')
+        assert requests_mock.call_count == 3
+
+
+class TestPaginate:
+    from CommonServerPython import BaseClient
+    client = BaseClient('http://example.com/api/v2/')
+    ITEMS = list(range(23))
+
+    def offset_callback(self, request, context):
+        offset, limit = int(request.qs['offset'][0]), int(request.qs['limit'][0])
+        return {'data': {'items': self.ITEMS[offset:offset + limit]}}
+
+    @pytest.mark.parametrize('prefetch', [False, True])
+    def test_offset(self, requests_mock, prefetch):
+        """
+            Given
+            - An API paginated by offset with 23 items
+
+            When
+            - Paginating with a page size of 10, with and without prefetching
+
+            Then
+            -  Ensure all the items are returned in order using 3 requests
+        """
+        requests_mock.get('http://example.com/api/v2/items', json=self.offset_callback)
+        items = list(self.client.paginate('GET', 'items', items_path='data.items', page_size=10, prefetch=prefetch))
+        assert items == self.ITEMS
+        assert requests_mock.call_count == 3
+
+    def test_offset_limit_and_max_pages(self, requests_mock):
+        requests_mock.get('http://example.com/api/v2/items', json=self.offset_callback)
+        assert list(self.client.paginate('GET', 'items', items_path='data.items', page_size=10,
+                                         limit=15, prefetch=True)) == self.ITEMS[:15]
+        assert requests_mock.call_count == 2
+        assert list(self.client.paginate('GET', 'items', items_path='data.items', page_size=5,
+                                         max_pages=2)) == self.ITEMS[:10]
+        assert requests_mock.call_count == 4
+
+    def test_page(self, requests_mock):
+        def callback(request, context):
+            page, size = int(request.qs['page_number'][0]), int(request.qs['size'][0])
+            return self.ITEMS[(page - 1) * size:page * size]
+
+        requests_mock.get('http://example.com/api/v2/items', json=callback)
+        items = list(self.client.paginate('GET', 'items', pagination_type='page', page_size=10,
+                                          page_param='page_number', limit_param='size', params={'q': 'x'}))
+        assert items == self.ITEMS
+        assert requests_mock.last_request.qs == {'q': ['x'], 'page_number': ['3'], 'size': ['10']}
+
+    @pytest.mark.parametrize('prefetch', [False, True])
+    def test_cursor(self, requests_mock, prefetch):
+        def callback(request, context):
+            start = int(request.qs.get('next_token', [0])[0])
+            next_token = str(start + 10) if start + 10 < len(self.ITEMS) else None
+            return {'items': self.ITEMS[start:start + 10], 'meta': {'next': next_token}}
+
+        requests_mock.get('http://example.com/api/v2/items', json=callback)
+        items = list(self.client.paginate('GET', 'items', pagination_type='cursor', items_path='items',
+                                          cursor_param='next_token', next_cursor_path='meta.next', prefetch=prefetch))
+        assert items == self.ITEMS
+        assert requests_mock.call_count == 3
+
+    def test_link(self, requests_mock):
+        requests_mock.get('http://example.com/api/v2/items', json=[1, 2],
+                          headers={'Link': '<http://example.com/api/v2/items?page=2>; rel="next"'})
+        requests_mock.get('http://example.com/api/v2/items?page=2', json=[3])
+        items = list(self.client.paginate('GET', 'items', pagination_type='link', prefetch=True))
+        assert items == [1, 2, 3]
+
+    def test_invalid_arguments(self):
+        with raises(ValueError, match='Unsupported pagination type'):
+            list(self.client.paginate('GET', 'items', pagination_type='other'))
+        with raises(ValueError, match='next_cursor_path'):
+            list(self.client.paginate('GET', 'items', pagination_type='cursor'))
+
+
+# a literal document, so its keys are in the same order on python 2, and the name has a multi byte character
+STREAM_JSON_DOCUMENT = u'{"total": 3, "meta": {"items": ["not", "these"], "next": null}, ' \
+                       u'"data": {"items": [{"id": 1, "name": "\u05d0 [x], {y}"}, 123456, [1.5, true, null]]}}'
+
+
+STREAM_JSON_NUMBERS_DOCUMENT = '{"data": {"items": [1.5, 1e5, -1.5e-3, 0, -12, 1E+2]}}'
+
+
+@pytest.mark.parametrize('document', [STREAM_JSON_DOCUMENT, STREAM_JSON_NUMBERS_DOCUMENT])
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize('encode', [True, False])
+def test_iter_json_array_items_chunks(document, chunk_size, encode):
+    """
+        Given
+        - A JSON document split into chunks of different sizes (including multi byte characters and numbers
+          split between chunks)
+
+        When
+        - Streaming the items of a nested array
+
+        Then
+        -  Ensure the items are the same as the items of the fully parsed document
+    """
+    from CommonServerPython import iter_json_array_items
+    data = document.encode('utf-8') if encode else document
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    assert list(iter_json_array_items(chunks, 'data.items')) == json.loads(document)['data']['items']
+
+
+def test_iter_json_array_items_skipped_values():
+    """
+        Given
+        - A JSON document with values preceding the streamed array
+
+        When
+        - Streaming the items of a nested array, with a dict for the skipped values
+
+        Then
+        -  Ensure the values of the keys skipped on the way to the array are saved
+    """
+    from CommonServerPython import iter_json_array_items
+    skipped_values = {}
+    items = iter_json_array_items([STREAM_JSON_DOCUMENT], 'data.items', skipped_values=skipped_values)
+    assert next(items) == {'id': 1, 'name': u'\u05d0 [x], {y}'}
+    assert skipped_values == {'total': 3, 'meta': {'items': ['not', 'these'], 'next': None}}
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    (['[1.', '5, 2]'], [1.5, 2]),
+    (['[1e', '5]'], [1e5]),
+    (['[-', '1.5e', '-', '3]'], [-1.5e-3]),
+    (['[1', '2', '.', '5]'], [12.5]),
+])
+def test_iter_json_array_items_number_split_between_chunks(chunks, expected):
+    """
+        Given
+        - A JSON array with a number split between chunks at a digit, a decimal point or an exponent
+
+        When
+        - Streaming the items of the array
+
+        Then
+        -  Ensure the whole number is parsed
+    """
+    from CommonServerPython import iter_json_array_items
+    assert list(iter_json_array_items(chunks)) == expected
+
+
+def test_iter_json_array_items_top_level_array():
+    from CommonServerPython import iter_json_array_items
+    assert list(iter_json_array_items(['[1, ', '2', '3, {"a"', ': [4]}]'])) == [1, 23, {'a': [4]}]
+    assert list(iter_json_array_items([' [ ] '])) == []
+
+
+@pytest.mark.parametrize('document, json_path, error', [
+    ('{"data": []}', 'items', 'items was not found'),
+    ('{}', 'items', 'items was not found'),
+    ('{"items": {}}', 'items', 'expected one of'),
+    ('[1, 2', None, 'expected one of'),
+    ('[{"a": 1', None, ''),
+])
+def test_iter_json_array_items_invalid(document, json_path, error):
+    from CommonServerPython import iter_json_array_items
+    with raises(ValueError, match=error):
+        list(iter_json_array_items([document], json_path))
+
+
+def test_http_request_json_stream(requests_mock):
+    """
+        Given
+        - A base client
+
+        When
+        - Making an http request with the json_stream resp_type
+
+        Then
+        -  Ensure a generator of the selected array items is returned
+    """
+    from CommonServerPython import BaseClient
+    requests_mock.get('http://example.com/api/v2/events', text=STREAM_JSON_DOCUMENT)
+    client = BaseClient('http://example.com/api/v2/')
+    res = client._http_request('get', 'events', resp_type='json_stream', json_path='data.items')
+    assert not isinstance(res, list)
+    assert list(res) == json.loads(STREAM_JSON_DOCUMENT)['data']['items']
+    assert requests_mock.last_request.stream is True
+
+
+def test_http_request_json_stream_invalid(requests_mock):
+    from CommonServerPython import BaseClient
+    requests_mock.get('http://example.com/api/v2/events', text='{"data": 1}')
+    client = BaseClient('http://example.com/api/v2/')
+    with raises(DemistoException, match='Failed to parse json'):
+        list(client._http_request('get', 'events', resp_type='json_stream', json_path='data'))
+
+
+def test_iter_json_array_items_memory_benchmark():
+    """
+        Given
+        - A large synthetic JSON payload (~8 MB), downloaded in chunks
+
+        When
+        - Parsing it fully with json.loads vs. streaming its items with iter_json_array_items
+
+        Then
+        -  Ensure the peak memory of the streaming parser is a small fraction of the full parsing
+    """
+    if not IS_PY3:
+        pytest.skip("test not supported in py2")
+    import tracemalloc
+    from CommonServerPython import iter_json_array_items
+    item = json.dumps({'id': 0, 'name': 'event name', 'description': 'x' * 200, 'tags': ['a', 'b', 'c']})
+    count = 30000
+    chunk = (', '.join([item] * 1000)).encode('utf-8')
+
+    def chunks():
+        yield b'{"events": ['
+        for i in range(count // 1000):
+            yield (b', ' if i else b'') + chunk
+        yield b']}'
+
+    tracemalloc.start()
+    try:
+        assert len(json.loads(b''.join(chunks()))['events']) == count
+        _, full_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        parsed = 0
+        for _ in iter_json_array_items(chunks(), 'events'):
+            parsed += 1
+        _, stream_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert parsed == count
+    assert stream_peak * 10 < full_peak
+
 
 def test_parse_date_string():
     # test unconverted data remains: Z
@@ -2921,6 +3567,80 @@ def test_batch(iterable, sz, expected):
         assert expected[i] == item
 
 
+class TestCreateIndicatorsInBatches:
+    @staticmethod
+    def indicators_generator(count, parsed):
+        for i in range(count):
+            parsed.append(i)
+            yield {'value': '1.1.1.{}'.format(i), 'type': 'IP'}
+
+    def test_batches_by_bytes(self, mocker):
+        """
+        Given:
+        - A generator of 10 indicators, each taking 36 bytes of the batch JSON
+
+        When:
+        - Submitting them with a limit of 110 bytes per batch
+
+        Then:
+        - Validate each batch has up to 3 indicators, and it is submitted before the next indicators are generated
+        - Validate the returned stats
+        """
+        parsed = []
+        submitted = []
+        mocker.patch.object(demisto, 'createIndicators',
+                            side_effect=lambda indicators: submitted.append((list(indicators), len(parsed))))
+        stats = create_indicators_in_batches(self.indicators_generator(10, parsed), max_batch_bytes=110)
+
+        assert [len(indicators) for indicators, _ in submitted] == [3, 3, 3, 1]
+        # a full batch is submitted when the first indicator of the next one is parsed
+        assert [parsed_count for _, parsed_count in submitted] == [4, 7, 10, 10]
+        assert [indicator['value'] for indicators, _ in submitted for indicator in indicators] == \
+            ['1.1.1.{}'.format(i) for i in range(10)]
+        assert stats['batches'] == 4
+        assert stats['indicators'] == 10
+        assert stats['bytes'] == 360
+        assert stats['max_latency'] >= 0
+
+    def test_batches_by_size(self, mocker):
+        """
+        Given:
+        - A list of 5 indicators
+
+        When:
+        - Submitting them with up to 2 indicators per batch and no_update=False
+
+        Then:
+        - Validate 3 batches are submitted with the noUpdate argument
+        """
+        create_indicators = mocker.patch.object(demisto, 'createIndicators')
+        stats = create_indicators_in_batches(list(self.indicators_generator(5, [])), max_batch_size=2,
+                                             no_update=False)
+
+        assert stats['batches'] == 3
+        assert [len(call[0][0]) for call in create_indicators.call_args_list] == [2, 2, 1]
+        assert all(call[1] == {'noUpdate': False} for call in create_indicators.call_args_list)
+
+    @pytest.mark.parametrize('submit_empty, expected_calls', [(True, 1), (False, 0)])
+    def test_no_indicators(self, mocker, submit_empty, expected_calls):
+        """
+        Given:
+        - No indicators
+
+        When:
+        - Submitting them, with and without submit_empty
+
+        Then:
+        - Validate createIndicators is called with an empty list only if submit_empty is True
+        """
+        create_indicators = mocker.patch.object(demisto, 'createIndicators')
+        create_indicators_in_batches(iter([]), submit_empty=submit_empty, no_update=True)
+
+        assert create_indicators.call_count == expected_calls
+        if expected_calls:
+            create_indicators.assert_called_once_with([], noUpdate=True)
+
+
 regexes_test = [
     (ipv4Regex, '192.168.1.1', True),
     (ipv4Regex, '192.168.1.1/24', False),
@@ -5661,3 +6381,26 @@ class TestCustomIndicator:
                 malicious_description='malicious!'
             )
             Common.CustomIndicator('test', None, dbot_score, {'param': 'value'}, 'prefix')
+
+
+@pytest.mark.parametrize('max_memory_size', [1, 1024 * 1024])
+def test_spool_response_content(requests_mock, max_memory_size):
+    """
+        Given
+        - A streamed response
+
+        When
+        - Spooling its content to a file held in memory, or written to the disk beyond the memory size
+
+        Then
+        -  Ensure the file holds the whole content, and the response is closed
+    """
+    from CommonServerPython import spool_response_content
+    content = b'1.1.1.1\n' * 1000
+    requests_mock.get('http://example.com/feed', content=content)
+    response = requests.get('http://example.com/feed', stream=True)
+
+    spooled_file = spool_response_content(response, chunk_size=100, max_memory_size=max_memory_size)
+
+    assert spooled_file.read() == content
+    assert response.raw.closed
@@ -212,6 +212,7 @@ class Tokenizer:
 DBOT_TEXT_FIELD = 'dbot_text'
 DBOT_PROCESSED_TEXT_FIELD = 'dbot_processed_text'
 CONTEXT_KEY = 'DBotPreProcessTextData'
+DEDUP_BLOCK_SIZE = 1000
 HTML_PATTERNS = [
     re.compile(r"(?is)<(script|style).*?>.*?(</\1>)"),
     re.compile(r"(?s)<!--(.*?)-->[\n]?"),
@@ -375,20 +376,20 @@ def is_text_in_input_language(text, input_language):
     return is_correct_lang, actual_language
 
 
-def get_tf_idf_similarity_arr(documents):
-    tfidf = TfidfVectorizer(stop_words="english", min_df=1).fit_transform(documents)
-    pairwise_similarity = tfidf * tfidf.T
-    return pairwise_similarity.toarray()
-
-
 def find_duplicate_indices(texts, dedup_threshold):
-    similarity_arr = get_tf_idf_similarity_arr(texts)
-    indices_to_remove = []
-    for i in range(similarity_arr.shape[0]):
-        for j in range(similarity_arr.shape[1]):
-            if j > i and similarity_arr[i][j] > dedup_threshold:
-                indices_to_remove.append(j)
-    return set(indices_to_remove)
+    """
+    Finds the indices of the texts whose tf-idf cosine similarity to a preceding text is above the threshold.
+    The similarity is computed as a sparse product of DEDUP_BLOCK_SIZE texts at a time with the texts following them,
+    so the memory is bounded by the block size rather than by the number of texts squared.
+    """
+    tfidf = TfidfVectorizer(stop_words="english", min_df=1).fit_transform(texts).tocsr()
+    indices_to_remove = set()  # type: ignore
+    for start in range(0, tfidf.shape[0], DEDUP_BLOCK_SIZE):
+        block_similarity = (tfidf[start:start + DEDUP_BLOCK_SIZE] * tfidf[start:].T).tocoo()
+        # a column j of the block is the text start + j, which is after the text start + i of row i when j > i
+        is_duplicate = (block_similarity.data > dedup_threshold) & (block_similarity.col > block_similarity.row)
+        indices_to_remove.update((block_similarity.col[is_duplicate] + start).tolist())
+    return indices_to_remove
 
 
 def remove_duplicate_by_indices(data, duplicate_indices):
@@ -3,7 +3,8 @@ import unittest
 from CommonServerPython import *
 from DBotPreprocessTextData import clean_html_from_text, remove_line_breaks, hash_word, \
     concat_text_fields, whitelist_dict_fields, remove_short_text, remove_duplicate_by_indices, pre_process_batch, main, \
-    read_file, Tokenizer, clean_text_of_incidents_list, remove_foreign_language, is_text_in_input_language
+    read_file, Tokenizer, clean_text_of_incidents_list, remove_foreign_language, is_text_in_input_language, \
+    find_duplicate_indices
 import string
 
 from copy import deepcopy
@@ -124,6 +125,23 @@ def test_remove_dups():
     assert len(data) == 2
 
 
+def test_find_duplicate_indices(mocker):
+    """
+    Given:
+        - Texts with duplicates, some of them in a different block than the text they duplicate
+    When:
+        - Finding the duplicate indices with a block size smaller than the number of texts
+    Then:
+        - Ensure each text similar to a preceding text is found, and the first of the similar texts is kept
+    """
+    import DBotPreprocessTextData
+    mocker.patch.object(DBotPreprocessTextData, 'DEDUP_BLOCK_SIZE', 2)
+    texts = ['verify your bank account', 'urgent invoice attached', 'verify your bank account password',
+             'meeting notes', 'urgent invoice attached', 'lunch menu']
+    assert find_duplicate_indices(texts, 0.75) == {2, 4}
+    assert find_duplicate_indices(texts, 0.99) == {4}
+
+
 def test_pre_process():
     data = [
         {
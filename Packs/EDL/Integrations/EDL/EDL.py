@@ -3,15 +3,18 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 import re
+import os
 
 from base64 import b64decode
+from collections import OrderedDict
 from flask import Flask, Response, request
 from netaddr import IPSet
-from typing import Any, Dict, cast, Iterable
+from typing import Any, Dict, cast, Iterable, Iterator
 from math import ceil
 import urllib3
 import dateparser
 import hashlib
+import gevent
 
 # Disable insecure warnings
 urllib3.disable_warnings()
@@ -31,6 +34,11 @@ EDL_MISSING_REFRESH_ERR_MSG: str = 'Refresh Rate must be "number date_range_unit
 EDL_FILTER_FIELDS: Optional[str] = "name,type"
 EDL_ON_DEMAND_KEY: str = 'UpdateEDL'
 EDL_ON_DEMAND_CACHE_PATH: str = ''
+MAX_CACHED_EDLS: int = 20
+# a cached EDL older than this many refresh intervals is created again inline instead of being served stale
+MAX_STALE_REFRESH_INTERVALS: int = 2
+# rendered EDLs by the cache key of their request arguments, the least recently requested first
+EDL_CACHE: 'OrderedDict[tuple, dict]' = OrderedDict()
 
 ''' REFORMATTING REGEXES '''
 _PROTOCOL_REMOVAL = re.compile('^(?:[a-z]+:)*//')
@@ -82,6 +90,17 @@ class RequestArguments:
             self.CTX_EMPTY_EDL_COMMENT_KEY: self.add_comment_if_empty,
         }
 
+    def cache_key(self) -> tuple:
+        """Returns the key of the EDL of the request arguments in the EDL cache"""
+        return (
+            self.query.strip(),
+            self.limit,
+            self.offset,
+            bool(self.url_port_stripping),
+            bool(self.drop_invalids),
+            self.collapse_ips,
+        )
+
     @classmethod
     def from_context_json(cls, ctx_dict):
         """Returns an initiated instance of the class from a json"""
@@ -128,21 +147,37 @@ def create_new_edl(request_args: RequestArguments) -> str:
     indicator_searcher = IndicatorsSearcher(
         filter_fields=EDL_FILTER_FIELDS,
         query=request_args.query,
-        size=PAGE_SIZE,
-        limit=limit
+        size=min(PAGE_SIZE, limit) or PAGE_SIZE,
     )
-    iocs = []
-    formatted_iocs: set = set()
-    while True:
-        current_limit = limit + (limit - len(formatted_iocs))
-        indicator_searcher.limit = current_limit
-        new_iocs = find_indicators_to_limit(indicator_searcher)
-        iocs.extend(new_iocs)
-        formatted_iocs = format_indicators(iocs, request_args)
-        # continue searching iocs if 1) iocs was truncated or 2) got all available iocs
-        if len(formatted_iocs) >= len(iocs) or indicator_searcher.total <= current_limit:
-            break
-    return iterable_to_str(list(formatted_iocs)[request_args.offset:limit])
+    formatter = IndicatorsFormatter(request_args)
+    iocs_to_fetch = limit
+    # a single search is made, and each page of indicators is formatted once when it is fetched
+    for iocs in iter_indicators_pages(indicator_searcher):
+        formatter.add_iocs(iocs)
+        iocs_to_fetch -= len(iocs)
+        if iocs_to_fetch <= 0:
+            formatted_iocs_count = len(formatter)
+            if formatted_iocs_count >= limit:
+                break
+            # some of the iocs were dropped or collapsed, continue searching for the missing iocs
+            iocs_to_fetch = limit - formatted_iocs_count
+    return iterable_to_str(formatter.get_formatted_indicators()[request_args.offset:limit])
+
+
+def iter_indicators_pages(indicator_searcher: IndicatorsSearcher) -> Iterator[List[dict]]:
+    """
+    Generator of the pages of indicators of an IndicatorsSearcher
+
+    Parameters:
+        indicator_searcher (IndicatorsSearcher): The indicator searcher used to look for indicators
+
+    Returns:
+        (Iterator): Lists of Indicators dict with value,indicator_type keys
+    """
+    for ioc_res in indicator_searcher:
+        fetched_iocs = ioc_res.get('iocs') or []
+        # save only the value and type of each indicator
+        yield [{'value': ioc.get('value'), 'indicator_type': ioc.get('indicator_type')} for ioc in fetched_iocs]
 
 
 def find_indicators_to_limit(indicator_searcher: IndicatorsSearcher) -> List[dict]:
@@ -156,11 +191,8 @@ def find_indicators_to_limit(indicator_searcher: IndicatorsSearcher) -> List[dic
         (list): List of Indicators dict with value,indicator_type keys
     """
     iocs: List[dict] = []
-    for ioc_res in indicator_searcher:
-        fetched_iocs = ioc_res.get('iocs') or []
-        # save only the value and type of each indicator
-        iocs.extend({'value': ioc.get('value'), 'indicator_type': ioc.get('indicator_type')}
-                    for ioc in fetched_iocs)
+    for fetched_iocs in iter_indicators_pages(indicator_searcher):
+        iocs.extend(fetched_iocs)
     return iocs
 
 
@@ -171,17 +203,17 @@ def ip_groups_to_cidrs(ip_range_groups: Iterable):
         ip_range_groups (Iterable): an Iterable of lists containing connected IPs
 
     Returns:
-        Set. a set of CIDRs.
+        List. a list of CIDRs, in the order of the groups.
     """
-    ip_ranges = set()
+    ip_ranges = []
     for cidr in ip_range_groups:
         # handle single ips
         if len(cidr) == 1:
             # CIDR with a single IP appears with "/32" suffix so handle them differently
-            ip_ranges.add(str(cidr[0]))
+            ip_ranges.append(str(cidr[0]))
             continue
 
-        ip_ranges.add(str(cidr))
+        ip_ranges.append(str(cidr))
 
     return ip_ranges
 
@@ -193,16 +225,16 @@ def ip_groups_to_ranges(ip_range_groups: Iterable):
         ip_range_groups (Iterable): a list of lists containing connected IPs
 
     Returns:
-        Set. a set of Ranges.
+        List. a list of Ranges, in the order of the groups.
     """
-    ip_ranges = set()
+    ip_ranges = []
     for group in ip_range_groups:
         # handle single ips
         if len(group) == 1:
-            ip_ranges.add(str(group[0]))
+            ip_ranges.append(str(group[0]))
             continue
 
-        ip_ranges.add(str(group))
+        ip_ranges.append(str(group))
 
     return ip_ranges
 
@@ -215,38 +247,68 @@ def ips_to_ranges(ips: Iterable, collapse_ips: str):
         collapse_ips (str): Whether to collapse to Ranges or CIDRs.
 
     Returns:
-        Set. a list to Ranges or CIDRs.
+        List. a list to Ranges or CIDRs, sorted by their first IP.
+    """
+    return ip_set_to_ranges(IPSet(ips), collapse_ips)
+
+
+def ip_set_to_ranges(ip_set: IPSet, collapse_ips: str):
+    """Collapse an IP set to Ranges or CIDRs.
+
+    Args:
+        ip_set (IPSet): the IPs to collapse.
+        collapse_ips (str): Whether to collapse to Ranges or CIDRs.
+
+    Returns:
+        List. a list to Ranges or CIDRs, sorted by their first IP.
     """
 
     if collapse_ips == COLLAPSE_TO_RANGES:
-        ips_range_groups = IPSet(ips).iter_ipranges()
+        ips_range_groups = ip_set.iter_ipranges()
         return ip_groups_to_ranges(ips_range_groups)
 
     else:
-        cidrs = IPSet(ips).iter_cidrs()
+        cidrs = ip_set.iter_cidrs()
         return ip_groups_to_cidrs(cidrs)
 
 
-def format_indicators(iocs: list, request_args: RequestArguments) -> set:
+class IndicatorsFormatter:
+    """
+    Formats indicators to the EDL format, one page of indicators at a time.
+    The formatted indicators are kept in the order they were added, and the IPs to collapse are added to IP sets,
+    so adding a page costs only the formatting of its own indicators.
+    The collapsed IPv4 and IPv6 ranges come after the other indicators, sorted by their first IP.
     """
-    Create a list result of formatted_indicators
-     * Empty list:
-         1) if add_comment_if_empty, return {'# Empty EDL'}
-     * IP / CIDR:
-         1) if collapse_ips, collapse IPs/CIDRs
-     * URL:
-         1) if drop_invalids, drop invalids (length > 254 or has invalid chars)
-    * Other indicator types:
-        1) if drop_invalids, drop invalids (has invalid chars)
-        2) if port_stripping, strip ports
-    """
-    formatted_indicators = set()
-    ipv4_formatted_indicators = set()
-    ipv6_formatted_indicators = set()
-    for ioc in iocs:
+
+    def __init__(self, request_args: RequestArguments):
+        self.request_args = request_args
+        # a dict is used as an ordered set
+        self.formatted_indicators: Dict[str, None] = {}
+        self.ipv4_indicators = IPSet()
+        self.ipv6_indicators = IPSet()
+
+    def __len__(self) -> int:
+        return len(self.formatted_indicators) + len(self.get_collapsed_ips())
+
+    def add_iocs(self, iocs: Iterable[dict]):
+        for ioc in iocs:
+            self.add_ioc(ioc)
+
+    def add_ioc(self, ioc: dict):
+        """
+        Format an indicator and add it to the formatted indicators
+         * IP / CIDR:
+             1) if collapse_ips, collapse IPs/CIDRs
+         * URL:
+             1) if drop_invalids, drop invalids (length > 254 or has invalid chars)
+        * Other indicator types:
+            1) if drop_invalids, drop invalids (has invalid chars)
+            2) if port_stripping, strip ports
+        """
+        request_args = self.request_args
         indicator = ioc.get('value')
         if not indicator:
-            continue
+            return
         ioc_type = ioc.get('indicator_type')
         # protocol stripping
         indicator = _PROTOCOL_REMOVAL.sub('', indicator)
@@ -260,7 +322,7 @@ def format_indicators(iocs: list, request_args: RequestArguments) -> set:
             # check if removing the port changed something about the indicator
             if indicator != indicator_with_port and not request_args.url_port_stripping:
                 # if port was in the indicator and url_port_stripping param not set - ignore the indicator
-                continue
+                return
             # Reformatting to PAN-OS URL format
             with_invalid_tokens_indicator = indicator
             # mix of text and wildcard in domain field handling
@@ -269,34 +331,48 @@ def format_indicators(iocs: list, request_args: RequestArguments) -> set:
             if request_args.drop_invalids:
                 if with_invalid_tokens_indicator != indicator:
                     # invalid tokens in indicator - ignore the indicator
-                    continue
+                    return
                 if ioc_type == FeedIndicatorType.URL and len(indicator) >= PAN_OS_MAX_URL_LEN:
                     # URL indicator exceeds allowed length - ignore the indicator
-                    continue
+                    return
 
             # for PAN-OS *.domain.com does not match domain.com
             # we should provide both
             # this could generate more than num entries according to PAGE_SIZE
             if indicator.startswith('*.'):
-                formatted_indicators.add(indicator.lstrip('*.'))
+                self.formatted_indicators[indicator.lstrip('*.')] = None
 
         if request_args.collapse_ips != DONT_COLLAPSE and ioc_type in (FeedIndicatorType.IP, FeedIndicatorType.CIDR):
-            ipv4_formatted_indicators.add(indicator)
+            self.ipv4_indicators.add(indicator)
 
         elif request_args.collapse_ips != DONT_COLLAPSE and ioc_type == FeedIndicatorType.IPv6:
-            ipv6_formatted_indicators.add(indicator)
+            self.ipv6_indicators.add(indicator)
 
         else:
-            formatted_indicators.add(indicator)
+            self.formatted_indicators[indicator] = None
 
-    if len(ipv4_formatted_indicators) > 0:
-        ipv4_formatted_indicators = ips_to_ranges(ipv4_formatted_indicators, request_args.collapse_ips)
-        formatted_indicators.update(ipv4_formatted_indicators)
+    def get_collapsed_ips(self) -> List[str]:
+        collapsed_ips = []
+        if self.ipv4_indicators:
+            collapsed_ips.extend(ip_set_to_ranges(self.ipv4_indicators, self.request_args.collapse_ips))
+        if self.ipv6_indicators:
+            collapsed_ips.extend(ip_set_to_ranges(self.ipv6_indicators, self.request_args.collapse_ips))
+        return collapsed_ips
 
-    if len(ipv6_formatted_indicators) > 0:
-        ipv6_formatted_indicators = ips_to_ranges(ipv6_formatted_indicators, request_args.collapse_ips)
-        formatted_indicators.update(ipv6_formatted_indicators)
-    return formatted_indicators
+    def get_formatted_indicators(self) -> List[str]:
+        """
+        Returns the formatted indicators, in a deterministic order.
+        """
+        return list(self.formatted_indicators) + self.get_collapsed_ips()
+
+
+def format_indicators(iocs: list, request_args: RequestArguments) -> set:
+    """
+    Create a list result of formatted_indicators, see IndicatorsFormatter.add_ioc for the formatting rules.
+    """
+    formatter = IndicatorsFormatter(request_args)
+    formatter.add_iocs(iocs)
+    return set(formatter.get_formatted_indicators())
 
 
 def get_edl_on_demand():
@@ -318,6 +394,56 @@ def get_edl_on_demand():
     return edl
 
 
+def get_edl_cached(request_args: RequestArguments, refresh_interval: timedelta) -> dict:
+    """
+    Gets the EDL of the request arguments from the EDL cache.
+    A missing EDL is created and cached, evicting the least recently requested EDL when the cache is full.
+    A stale EDL is returned as is, while it is refreshed in the background, unless it is older than
+    MAX_STALE_REFRESH_INTERVALS refresh intervals, in which case it is created again before it is returned.
+
+    Parameters:
+        request_args: Request arguments
+        refresh_interval: The time after which a cached EDL is stale
+
+    Returns: The cached EDL entry, with the EDL and the time it was created
+    """
+    key = request_args.cache_key()
+    cached_edl = EDL_CACHE.get(key)
+    if cached_edl is not None and \
+            datetime.now(timezone.utc) - cached_edl['created'] >= MAX_STALE_REFRESH_INTERVALS * refresh_interval:
+        # too stale to be served, e.g. a rarely requested EDL
+        del EDL_CACHE[key]
+        cached_edl = None
+    if cached_edl is None:
+        cached_edl = {'edl': create_new_edl(request_args), 'created': datetime.now(timezone.utc), 'refreshing': False}
+        EDL_CACHE[key] = cached_edl
+        if len(EDL_CACHE) > MAX_CACHED_EDLS:
+            EDL_CACHE.popitem(last=False)
+    else:
+        EDL_CACHE.move_to_end(key)
+        if not cached_edl['refreshing'] and datetime.now(timezone.utc) - cached_edl['created'] >= refresh_interval:
+            cached_edl['refreshing'] = True
+            gevent.spawn(refresh_cached_edl, cached_edl, request_args)
+    return cached_edl
+
+
+def refresh_cached_edl(cached_edl: dict, request_args: RequestArguments):
+    """
+    Creates the EDL of a cached EDL entry again. On failure the stale EDL is kept.
+
+    Parameters:
+        cached_edl: The cached EDL entry
+        request_args: Request arguments of the EDL
+    """
+    try:
+        cached_edl['edl'] = create_new_edl(request_args)
+        cached_edl['created'] = datetime.now(timezone.utc)
+    except Exception as e:
+        demisto.error(f'Failed refreshing the cached EDL of query [{request_args.query}]: {e}')
+    finally:
+        cached_edl['refreshing'] = False
+
+
 def validate_basic_authentication(headers: dict, username: str, password: str) -> bool:
     """
     Checks whether the authentication is valid.
@@ -371,27 +497,36 @@ def route_edl() -> Response:
     request_args = get_request_args(request.args, params)
     on_demand = params.get('on_demand')
     created = datetime.now(timezone.utc)
-    edl = get_edl_on_demand() if on_demand else create_new_edl(request_args)
-    etag = f'"{hashlib.sha1(edl.encode()).hexdigest()}"'  # guardrails-disable-line
+    max_age = ceil((datetime.now() - dateparser.parse(cache_refresh_rate)).total_seconds())  # type: ignore[operator]
+    if on_demand:
+        edl = get_edl_on_demand()
+        # the on-demand EDL is modified only when it is written to its cache file
+        last_modified = datetime.fromtimestamp(os.path.getmtime(EDL_ON_DEMAND_CACHE_PATH), timezone.utc)
+    else:
+        cached_edl = get_edl_cached(request_args, timedelta(seconds=max_age))
+        edl = cached_edl['edl']
+        last_modified = cached_edl['created']
+    etag = hashlib.sha1(edl.encode()).hexdigest()  # guardrails-disable-line
     query_time = (datetime.now(timezone.utc) - created).total_seconds()
     edl_size = 0
     if edl.strip():
         edl_size = edl.count('\n') + 1  # add 1 as last line doesn't have a \n
     if len(edl) == 0 and request_args.add_comment_if_empty:
         edl = '# Empty EDL'
-    max_age = ceil((datetime.now() - dateparser.parse(cache_refresh_rate)).total_seconds())  # type: ignore[operator]
     demisto.debug(f'Returning edl of size: [{edl_size}], created: [{created}], query time seconds: [{query_time}],'
                   f' max age: [{max_age}], etag: [{etag}]')
     resp = Response(edl, status=200, mimetype='text/plain', headers=[
         ('X-EDL-Created', created.isoformat()),
         ('X-EDL-Query-Time-Secs', "{:.3f}".format(query_time)),
         ('X-EDL-Size', str(edl_size)),
-        ('ETag', etag),
     ])
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
     resp.cache_control.max_age = max_age
     resp.cache_control[
         'stale-if-error'] = '600'  # number of seconds we are willing to serve stale content when there is an error
-    return resp
+    # respond with 304 Not Modified to an If-None-Match or If-Modified-Since request of an unmodified EDL
+    return resp.make_conditional(request)
 
 
 def get_request_args(request_args: dict, params: dict) -> RequestArguments:
@@ -2,6 +2,7 @@
 import json
 import pytest
 import os
+from datetime import datetime, timedelta, timezone
 from tempfile import mkdtemp
 
 IOC_RES_LEN = 38
@@ -139,7 +140,8 @@ class TestHelperFunctions:
         import EDL as edl
         with open('EDL_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(edl, 'find_indicators_to_limit', return_value=iocs_json)
+            mocker.patch.object(edl.IndicatorsSearcher, 'search_indicators_by_version',
+                                side_effect=[{'iocs': iocs_json}, {'iocs': []}])
             request_args = edl.RequestArguments(query='', limit=38, url_port_stripping=True)
             edl_vals = edl.create_new_edl(request_args)
             for ioc in iocs_json:
@@ -150,6 +152,34 @@ class TestHelperFunctions:
                 else:
                     assert ip in edl_vals
 
+    def test_create_new_edl_formats_each_page_once(self, mocker):
+        """
+        Given:
+          - 3 pages of indicators, where the IPs of the first two pages are collapsed to a single CIDR
+        When:
+          - creating an EDL of 4 entries
+        Then:
+          - the pages are searched until there are 4 formatted entries, and each indicator is formatted once
+          - the entries are ordered by their search order, and the collapsed IPs come last
+        """
+        import EDL as edl
+        pages = [
+            [{'value': 'b.com', 'indicator_type': 'Domain'}, {'value': '1.1.1.0', 'indicator_type': 'IP'}],
+            [{'value': 'a.com', 'indicator_type': 'Domain'}, {'value': '1.1.1.1', 'indicator_type': 'IP'}],
+            [{'value': 'c.com', 'indicator_type': 'Domain'}, {'value': '2.2.2.2', 'indicator_type': 'IP'}],
+            [{'value': 'd.com', 'indicator_type': 'Domain'}, {'value': '3.3.3.3', 'indicator_type': 'IP'}],
+        ]
+        search = mocker.patch.object(edl.IndicatorsSearcher, 'search_indicators_by_version',
+                                     side_effect=[{'iocs': page} for page in pages])
+        add_ioc = mocker.spy(edl.IndicatorsFormatter, 'add_ioc')
+        request_args = edl.RequestArguments(query='', limit=4, collapse_ips=edl.COLLAPSE_TO_CIDR)
+
+        edl_vals = edl.create_new_edl(request_args)
+
+        assert edl_vals == 'b.com\na.com\nc.com\n1.1.1.0/31'
+        assert search.call_count == 3
+        assert add_ioc.call_count == 6
+
     def test_find_indicators_to_limit(self, mocker):
         """Test find indicators limit"""
         import EDL as edl
@@ -360,3 +390,117 @@ class TestHelperFunctions:
         assert res.drop_invalids == request_args["di"]
         assert res.collapse_ips == COLLAPSE_TO_RANGES
         assert res.add_comment_if_empty == request_args["ce"]
+
+    @pytest.mark.parametrize('on_demand', [False, True])
+    def test_route_edl_conditional_request(self, mocker, on_demand):
+        """
+        Given:
+            - An EDL that is not modified between requests
+        When:
+            - Requesting the EDL, then requesting it again with the ETag and Last-Modified of the first response
+        Then:
+            - The first response has the EDL, with its ETag and Last-Modified
+            - The conditional response is 304 Not Modified, without the EDL
+        """
+        import EDL as edl
+        import demistomock as demisto
+        tmp_dir = mkdtemp()
+        edl.EDL_ON_DEMAND_CACHE_PATH = os.path.join(tmp_dir, 'cache')
+        with open(edl.EDL_ON_DEMAND_CACHE_PATH, 'w') as f:
+            f.write('1.1.1.1\n2.2.2.2')
+        mocker.patch.object(demisto, 'params', return_value={'cache_refresh_rate': '5 minutes', 'on_demand': on_demand})
+        mocker.patch.object(edl, 'get_integration_context', return_value={})
+        mocker.patch.object(edl, 'create_new_edl', return_value='1.1.1.1\n2.2.2.2')
+        mocker.patch.object(edl, 'EDL_CACHE', edl.OrderedDict())
+
+        with edl.APP.test_client() as client:
+            response = client.get('/')
+            assert response.status_code == 200
+            assert response.get_data(as_text=True) == '1.1.1.1\n2.2.2.2'
+            assert response.last_modified
+
+            conditional_headers = {'If-Modified-Since': response.headers['Last-Modified']} if on_demand else \
+                {'If-None-Match': response.headers['ETag']}
+            response = client.get('/', headers=conditional_headers)
+            assert response.status_code == 304
+            assert response.get_data(as_text=True) == ''
+
+    def test_get_edl_cached(self, mocker):
+        """
+        Given:
+            - An EDL cache of up to 2 EDLs
+        When:
+            - Requesting EDLs of different request arguments, and an EDL of the same request arguments again
+        Then:
+            - An EDL is created once for each request arguments, and the least recently requested EDL is evicted
+        """
+        import EDL as edl
+        mocker.patch.object(edl, 'MAX_CACHED_EDLS', 2)
+        mocker.patch.object(edl, 'EDL_CACHE', edl.OrderedDict())
+        create_new_edl = mocker.patch.object(edl, 'create_new_edl', side_effect=lambda request_args: request_args.query)
+        refresh_interval = timedelta(minutes=5)
+
+        assert edl.get_edl_cached(edl.RequestArguments(query='type:IP'), refresh_interval)['edl'] == 'type:IP'
+        assert edl.get_edl_cached(edl.RequestArguments(query='type:URL'), refresh_interval)['edl'] == 'type:URL'
+        assert edl.get_edl_cached(edl.RequestArguments(query=' type:IP '), refresh_interval)['edl'] == 'type:IP'
+        assert create_new_edl.call_count == 2
+
+        edl.get_edl_cached(edl.RequestArguments(query='type:Domain'), refresh_interval)
+        assert list(edl.EDL_CACHE) == [edl.RequestArguments(query='type:IP').cache_key(),
+                                       edl.RequestArguments(query='type:Domain').cache_key()]
+
+    def test_get_edl_cached__stale(self, mocker):
+        """
+        Given:
+            - A cached EDL that is older than the refresh interval, but not twice as old
+        When:
+            - Requesting the EDL
+        Then:
+            - The stale EDL is returned, and is refreshed once in the background
+            - A failed refresh keeps the stale EDL
+        """
+        import EDL as edl
+        request_args = edl.RequestArguments(query='type:IP')
+        created = datetime.now(timezone.utc) - timedelta(minutes=7)
+        cached_edl = {'edl': '1.1.1.1', 'created': created, 'refreshing': False}
+        mocker.patch.object(edl, 'EDL_CACHE', edl.OrderedDict([(request_args.cache_key(), cached_edl)]))
+        spawn = mocker.patch.object(edl.gevent, 'spawn')
+
+        assert edl.get_edl_cached(request_args, timedelta(minutes=5))['edl'] == '1.1.1.1'
+        assert edl.get_edl_cached(request_args, timedelta(minutes=5))['edl'] == '1.1.1.1'
+        spawn.assert_called_once_with(edl.refresh_cached_edl, cached_edl, request_args)
+
+        mocker.patch.object(edl, 'create_new_edl', side_effect=Exception('search failed'))
+        mocker.patch.object(edl.demisto, 'error')
+        edl.refresh_cached_edl(cached_edl, request_args)
+        assert cached_edl == {'edl': '1.1.1.1', 'created': created, 'refreshing': False}
+
+        mocker.patch.object(edl, 'create_new_edl', return_value='2.2.2.2')
+        cached_edl['refreshing'] = True
+        edl.refresh_cached_edl(cached_edl, request_args)
+        assert cached_edl['edl'] == '2.2.2.2'
+        assert cached_edl['created'] > created
+        assert not cached_edl['refreshing']
+
+    def test_get_edl_cached__too_stale(self, mocker):
+        """
+        Given:
+            - A cached EDL that is older than twice the refresh interval, e.g. a rarely requested EDL
+        When:
+            - Requesting the EDL
+        Then:
+            - The EDL is created again before it is returned, instead of returning the stale EDL
+        """
+        import EDL as edl
+        request_args = edl.RequestArguments(query='type:IP')
+        created = datetime.now(timezone.utc) - timedelta(days=3)
+        cached_edl = {'edl': '1.1.1.1', 'created': created, 'refreshing': False}
+        mocker.patch.object(edl, 'EDL_CACHE', edl.OrderedDict([(request_args.cache_key(), cached_edl)]))
+        spawn = mocker.patch.object(edl.gevent, 'spawn')
+        mocker.patch.object(edl, 'create_new_edl', return_value='2.2.2.2')
+
+        new_cached_edl = edl.get_edl_cached(request_args, timedelta(minutes=5))
+        assert new_cached_edl['edl'] == '2.2.2.2'
+        assert new_cached_edl['created'] > created
+        assert edl.EDL_CACHE[request_args.cache_key()] is new_cached_edl
+        spawn.assert_not_called()
@@ -4,10 +4,11 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 import re
+import hashlib
 from base64 import b64decode
 from flask import Flask, Response, request
 from netaddr import IPAddress, IPSet
-from typing import Callable, Any, cast, Dict, Tuple
+from typing import Callable, Any, cast, Dict, Tuple, Iterator
 from math import ceil
 import dateparser
 
@@ -17,6 +18,13 @@ PAGE_SIZE: int = 200
 APP: Flask = Flask('demisto-export_iocs')
 CTX_VALUES_KEY: str = 'dmst_export_iocs_values'
 CTX_MIMETYPE_KEY: str = 'dmst_export_iocs_mimetype'
+CTX_ON_DEMAND_KEY: str = 'update_export'
+# the export created by eis-update, handed over to the server in the integration context
+CTX_OUTPUT_KEY: str = 'last_output'
+CTX_IOCS_KEY: str = 'current_iocs'
+# the local file cache of the on demand export, of the output values and of the exported IoCs
+EXPORT_CACHE_PATH: str = ''
+IOCS_CACHE_PATH: str = ''
 
 FORMAT_CSV: str = 'csv'
 FORMAT_TEXT: str = 'text'
@@ -136,6 +144,42 @@ class RequestArguments:
 
         return False
 
+    def to_context_json(self):
+        return {
+            'last_query': self.query,
+            'last_format': self.out_format,
+            'last_limit': self.limit,
+            'last_offset': self.offset,
+            'mwg_type': self.mwg_type,
+            'strip_port': self.strip_port,
+            'drop_invalids': self.drop_invalids,
+            'category_default': self.category_default,
+            'category_attribute': self.category_attribute,
+            'collapse_ips': self.collapse_ips,
+            'csv_text': self.csv_text,
+            'sort_field': self.sort_field,
+            'sort_order': self.sort_order,
+        }
+
+    @classmethod
+    def from_context_json(cls, ctx_dict):
+        """Returns an initiated instance of the class from a json"""
+        return cls(
+            query=ctx_dict.get('last_query'),
+            out_format=ctx_dict.get('last_format', FORMAT_TEXT),
+            limit=ctx_dict.get('last_limit', 10000),
+            offset=ctx_dict.get('last_offset', 0),
+            mwg_type=ctx_dict.get('mwg_type', 'string'),
+            strip_port=ctx_dict.get('strip_port', False),
+            drop_invalids=ctx_dict.get('drop_invalids', False),
+            category_default=ctx_dict.get('category_default', 'bc_category'),
+            category_attribute=','.join(ctx_dict.get('category_attribute') or []),
+            collapse_ips=ctx_dict.get('collapse_ips', DONT_COLLAPSE),
+            csv_text=ctx_dict.get('csv_text', False),
+            sort_field=ctx_dict.get('sort_field', ''),
+            sort_order=ctx_dict.get('sort_order', ''),
+        )
+
 
 ''' HELPER FUNCTIONS '''
 
@@ -176,34 +220,45 @@ def sort_iocs(request_args: RequestArguments, iocs: list) -> list:
 def refresh_outbound_context(request_args: RequestArguments, on_demand: bool = False) -> str:
     """
     Refresh the values and format using an indicator_query to call demisto.searchIndicators
-    Update integration cache only in case of running on demand
+    Update the local file cache and its metadata in the integration context only in case of running on demand
     Returns: List(IoCs in output format)
     """
     now = datetime.now()
+    iocs, out_dict = search_outbound_iocs(request_args)
+    if on_demand:
+        write_export_cache(request_args, out_dict, iocs, date_to_timestamp(now))
+    return out_dict[CTX_VALUES_KEY] if CTX_VALUES_KEY in out_dict else []
+
+
+def search_outbound_iocs(request_args: RequestArguments) -> Tuple[list, dict]:
+    """
+    Searches the IoCs of the request arguments using demisto.searchIndicators, and formats them
+    Returns: The IoCs, and a dict of the IoCs in output format and their mimetype
+    """
     # poll indicators into list from demisto
-    iocs = []
+    iocs: list = []
     out_dict: dict = {}
-    limit = request_args.offset + request_args.limit
+    iocs_to_skip = request_args.offset
+    actual_indicator_amount = 0
     indicator_searcher = IndicatorsSearcher(
         query=request_args.query,
         size=PAGE_SIZE
     )
-    while True:
-        indicator_searcher.limit = limit + 100  # fetch more indicators to reduce chances of search after truncation
-        new_iocs = find_indicators_with_limit(indicator_searcher)[request_args.offset:limit]
-        if not new_iocs:
+    # a single search is made, and each page of indicators is formatted once to count its output values
+    for new_iocs in iter_indicators_pages(indicator_searcher):
+        new_iocs, iocs_to_skip = new_iocs[iocs_to_skip:], max(0, iocs_to_skip - len(new_iocs))
+        while new_iocs and actual_indicator_amount < request_args.limit:
+            # take the iocs missing for the limit, and continue with the rest of the page if some are dropped
+            missing_amount = request_args.limit - actual_indicator_amount
+            iocs += new_iocs[:missing_amount]
+            actual_indicator_amount += count_returned_values(new_iocs[:missing_amount], request_args)
+            new_iocs = new_iocs[missing_amount:]
+        if actual_indicator_amount >= request_args.limit:
             break
-        iocs += new_iocs
+
+    if iocs:
         iocs = sort_iocs(request_args, iocs)
-        # reformat the output
-        out_dict, actual_indicator_amount = create_values_for_returned_dict(iocs, request_args)
-        if request_args.out_format in [FORMAT_CSV, FORMAT_XSOAR_CSV]:
-            actual_indicator_amount = actual_indicator_amount - 1
-        if actual_indicator_amount >= len(iocs) or (indicator_searcher.total and indicator_searcher.total <= limit):
-            # continue searching iocs if 1) iocs was truncated or 2) got all available iocs
-            break
-        # advance search window with gap size
-        limit += (limit - actual_indicator_amount)
+        out_dict, _ = create_values_for_returned_dict(iocs, request_args)
 
     if request_args.out_format == FORMAT_JSON:
         out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_JSON
@@ -221,26 +276,45 @@ def refresh_outbound_context(request_args: RequestArguments, on_demand: bool = F
     else:
         out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_TEXT
 
-    if on_demand:
-        set_integration_context({
-            "last_output": out_dict,
-            'last_run': date_to_timestamp(now),
-            'last_limit': request_args.limit,
-            'last_offset': request_args.offset,
-            'last_format': request_args.out_format,
-            'last_query': request_args.query,
-            'current_iocs': iocs,
-            'mwg_type': request_args.mwg_type,
-            'drop_invalids': request_args.drop_invalids,
-            'strip_port': request_args.strip_port,
-            'category_default': request_args.category_default,
-            'category_attribute': request_args.category_attribute,
-            'collapse_ips': request_args.collapse_ips,
-            'csv_text': request_args.csv_text,
-            'sort_field': request_args.sort_field,
-            'sort_order': request_args.sort_order,
-        })
-    return out_dict[CTX_VALUES_KEY] if CTX_VALUES_KEY in out_dict else []
+    return iocs, out_dict
+
+
+def write_export_cache(request_args: RequestArguments, out_dict: dict, iocs: list, last_run: int):
+    """
+    Writes the on demand export to the local file cache, and its metadata to the integration context
+    """
+    with open(EXPORT_CACHE_PATH, 'w') as file:
+        file.write(out_dict.get(CTX_VALUES_KEY, ''))
+    with open(IOCS_CACHE_PATH, 'w') as file:
+        json.dump(iocs, file)
+    ctx = request_args.to_context_json()
+    ctx['last_run'] = last_run
+    ctx[CTX_MIMETYPE_KEY] = out_dict.get(CTX_MIMETYPE_KEY, MIMETYPE_TEXT)
+    set_integration_context(ctx)
+
+
+def update_export_cache(ctx: dict) -> dict:
+    """
+    Creates the export updated by eis-update in the local file cache. The export handed over by the command
+    in the integration context is moved to the cache. An export that was cached by a previous run of the server
+    is searched again with its request arguments.
+    Returns: The metadata of the cached export
+    """
+    request_args = RequestArguments.from_context_json(ctx)
+    if CTX_OUTPUT_KEY in ctx:
+        write_export_cache(request_args, ctx[CTX_OUTPUT_KEY], ctx.get(CTX_IOCS_KEY) or [],
+                           ctx.get('last_run') or date_to_timestamp(datetime.now()))
+    else:
+        refresh_outbound_context(request_args, on_demand=True)
+    return get_integration_context()
+
+
+def iter_indicators_pages(indicator_searcher: IndicatorsSearcher) -> Iterator[List[dict]]:
+    """
+    Generator of the pages of indicators found using demisto.searchIndicators
+    """
+    for ioc_res in indicator_searcher:
+        yield ioc_res.get('iocs') or []
 
 
 def find_indicators_with_limit(indicator_searcher: IndicatorsSearcher) -> list:
@@ -248,12 +322,26 @@ def find_indicators_with_limit(indicator_searcher: IndicatorsSearcher) -> list:
     Finds indicators using demisto.searchIndicators
     """
     iocs: List[dict] = []
-    for ioc_res in indicator_searcher:
-        fetched_iocs = ioc_res.get('iocs') or []
+    for fetched_iocs in iter_indicators_pages(indicator_searcher):
         iocs.extend(fetched_iocs)
     return iocs
 
 
+def count_returned_values(iocs: list, request_args: RequestArguments) -> int:
+    """
+    Counts the output values of IoCs in the requested format, without the CSV headers
+    """
+    try:
+        _, actual_indicator_amount = create_values_for_returned_dict(iocs, request_args)
+    except Exception as e:
+        if str(e) != CTX_NO_URLS_IN_PROXYSG_FORMAT:
+            raise
+        return 0
+    if iocs and request_args.out_format in [FORMAT_CSV, FORMAT_XSOAR_CSV]:
+        actual_indicator_amount -= 1
+    return actual_indicator_amount
+
+
 def ip_groups_to_cidrs(ip_range_groups: list):
     """Collapse ip groups list to CIDRs
 
@@ -379,9 +467,8 @@ def json_format_single_indicator(indicator: dict):
     json_format_indicator = {
         "indicator": indicator.get("value")
     }
-    indicator.pop("value", None)
-
-    json_format_indicator["value"] = indicator
+    # the indicator is not modified, as it is formatted again after its values are counted
+    json_format_indicator["value"] = {key: value for key, value in indicator.items() if key != "value"}
     return json_format_indicator
 
 
@@ -524,8 +611,7 @@ def create_values_for_returned_dict(iocs: list, request_args: RequestArguments)
 
 def get_outbound_mimetype() -> str:
     """Returns the mimetype of the export_iocs"""
-    ctx = get_integration_context().get('last_output', {})
-    return ctx.get(CTX_MIMETYPE_KEY, 'text/plain')
+    return get_integration_context().get(CTX_MIMETYPE_KEY, 'text/plain')
 
 
 def get_outbound_ioc_values(on_demand, request_args: RequestArguments,
@@ -538,11 +624,20 @@ def get_outbound_ioc_values(on_demand, request_args: RequestArguments,
 
     last_update = last_update_data.get('last_run')
     last_query = last_update_data.get('last_query')
-    current_iocs = last_update_data.get('current_iocs')
 
     # on_demand ignores cache
     if on_demand:
+        if not last_update_data:
+            # the export was not updated on demand yet
+            return ''
+
+        if last_update_data.get(CTX_ON_DEMAND_KEY):
+            # the export was updated by eis-update, create it in the local file cache of the server
+            last_update_data = update_export_cache(last_update_data)
+
         if request_args.is_request_change(last_update_data):
+            with open(IOCS_CACHE_PATH, 'r') as file:
+                current_iocs = json.load(file)
             values_str = get_ioc_values_str_from_context(request_args=request_args, iocs=current_iocs)
 
         else:
@@ -565,7 +660,7 @@ def get_outbound_ioc_values(on_demand, request_args: RequestArguments,
 
 def get_ioc_values_str_from_context(request_args: RequestArguments, iocs=None) -> str:
     """
-    Extracts output values from cache
+    Extracts output values from the local file cache, or formats the given cached IoCs by the request arguments
     """
     if iocs:
         if request_args.offset > len(iocs):
@@ -573,14 +668,10 @@ def get_ioc_values_str_from_context(request_args: RequestArguments, iocs=None) -
 
         iocs = iocs[request_args.offset: request_args.limit + request_args.offset]
         returned_dict, _ = create_values_for_returned_dict(iocs, request_args=request_args)
-        current_cache = get_integration_context()
-        current_cache['last_output'] = returned_dict
-        set_integration_context(current_cache)
-
-    else:
-        returned_dict = get_integration_context().get('last_output', {})
+        return returned_dict.get(CTX_VALUES_KEY, '')
 
-    return returned_dict.get(CTX_VALUES_KEY, '')
+    with open(EXPORT_CACHE_PATH, 'r') as file:
+        return file.read()
 
 
 def try_parse_integer(int_to_parse: Any, err_msg: str) -> int:
@@ -750,17 +841,24 @@ def route_list_values() -> Response:
         if values.strip():
             list_size = values.count('\n') + 1  # add 1 as last line doesn't have a \n
         max_age = ceil((datetime.now() - dateparser.parse(cache_refresh_rate)).total_seconds())  # type: ignore[operator]
+        etag = hashlib.sha1(values.encode()).hexdigest()  # guardrails-disable-line
         demisto.debug(f'Returning exported indicators list of size: [{list_size}], created: [{created}], '
-                      f'query time seconds: [{query_time}], max age: [{max_age}]')
+                      f'query time seconds: [{query_time}], max age: [{max_age}], etag: [{etag}]')
         resp = Response(values, status=200, mimetype=mimetype, headers=[
             ('X-ExportIndicators-Created', created.isoformat()),
             ('X-ExportIndicators-Query-Time-Secs', "{:.3f}".format(query_time)),
             ('X-ExportIndicators-Size', str(list_size))
         ])
+        resp.set_etag(etag)
+        last_run = get_integration_context().get('last_run')
+        if params.get('on_demand') and last_run:
+            # the on-demand export is modified only when it is refreshed
+            resp.last_modified = datetime.fromtimestamp(last_run / 1000, timezone.utc)
         resp.cache_control.max_age = max_age
         resp.cache_control[
             'stale-if-error'] = '600'  # number of seconds we are willing to serve stale content when there is an error
-        return resp
+        # respond with 304 Not Modified to an If-None-Match or If-Modified-Since request of an unmodified export
+        return resp.make_conditional(request)
 
     except Exception:
         return Response(traceback.format_exc(), status=400, mimetype='text/plain')
@@ -827,7 +925,18 @@ def update_outbound_command(args, params):
     request_args = RequestArguments(query, out_format, limit, offset, mwg_type, strip_port, drop_invalids,
                                     category_default, category_attribute, collapse_ips, csv_text, sort_field, sort_order)
 
-    indicators = refresh_outbound_context(request_args, on_demand=on_demand)
+    now = datetime.now()
+    iocs, out_dict = search_outbound_iocs(request_args)
+    indicators = out_dict[CTX_VALUES_KEY] if CTX_VALUES_KEY in out_dict else []
+    # the export is handed over to the server, which moves it to its local file cache the next time it is accessed
+    ctx = request_args.to_context_json()
+    ctx.update({
+        'last_run': date_to_timestamp(now),
+        CTX_OUTPUT_KEY: out_dict,
+        CTX_IOCS_KEY: iocs,
+        CTX_ON_DEMAND_KEY: True,
+    })
+    set_integration_context(ctx)
     if indicators:
         hr = tableToMarkdown('List was updated successfully with the following values', indicators,
                              ['Indicators']) if print_indicators == 'true' else 'List was updated successfully'
@@ -838,6 +947,20 @@ def update_outbound_command(args, params):
     return CommandResults(readable_output=hr, raw_response=indicators)
 
 
+def initialize_export_cache():
+    """
+    Sets the local file cache of the on demand export. An export cached by a previous run of the server is searched
+    again with its request arguments the next time it is accessed, and an export handed over by eis-update is kept.
+    """
+    global EXPORT_CACHE_PATH, IOCS_CACHE_PATH
+    EXPORT_CACHE_PATH = demisto.uniqueFile()
+    IOCS_CACHE_PATH = demisto.uniqueFile()
+    ctx = get_integration_context()
+    if ctx and not ctx.get(CTX_ON_DEMAND_KEY):
+        ctx[CTX_ON_DEMAND_KEY] = True
+        set_integration_context(ctx)
+
+
 def main():
     """
     Main
@@ -861,6 +984,7 @@ def main():
 
     try:
         if command == 'long-running-execution':
+            initialize_export_cache()
             run_long_running(params)
         elif command in commands:
             return_results(commands[command](demisto.args(), params))
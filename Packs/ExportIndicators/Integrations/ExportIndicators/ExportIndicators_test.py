@@ -10,19 +10,96 @@ IOC_RES_LEN = 38
 
 
 class TestHelperFunctions:
-    def test_get_outbound_ioc_values_1(self, mocker):
+    def test_get_outbound_ioc_values_1(self, mocker, tmp_path):
         """Test on_demand"""
-        from ExportIndicators import get_outbound_ioc_values, RequestArguments
+        import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/iocs_cache_values_text.json', 'r') as iocs_text_values_f:
             iocs_text_dict = json.loads(iocs_text_values_f.read())
-            mocker.patch.object(demisto, 'getIntegrationContext', return_value={"last_output": iocs_text_dict})
-            request_args = RequestArguments(query='', out_format='text', limit=50, offset=0)
-            ioc_list = get_outbound_ioc_values(
+            mocker.patch.object(ei, 'EXPORT_CACHE_PATH', str(tmp_path / 'export'))
+            (tmp_path / 'export').write_text('\n'.join(iocs_text_dict))
+            request_args = ei.RequestArguments(query='', out_format='text', limit=50, offset=0)
+            ioc_list = ei.get_outbound_ioc_values(
                 on_demand=True,
-                request_args=request_args
+                request_args=request_args,
+                last_update_data=request_args.to_context_json()
             )
-            for ioc_row in ioc_list:
-                assert ioc_row in iocs_text_dict
+            assert ioc_list.split('\n') == list(iocs_text_dict)
+
+    def test_get_outbound_ioc_values_on_demand_update(self, mocker, tmp_path):
+        """
+        Given:
+            - The export was updated on demand by eis-update, with a limit of 2
+
+        When:
+            - Getting the export twice, then with a limit of 1
+
+        Then:
+            - Ensure the export is created in the local file cache once, by the arguments of the update
+            - Ensure the integration context keeps the arguments and mimetype of the export, but not its values or IoCs
+            - Ensure the export is formatted from the cached IoCs when the request arguments change
+        """
+        import ExportIndicators as ei
+        with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
+            iocs_json = json.loads(iocs_json_f.read())
+        mocker.patch.object(ei, 'EXPORT_CACHE_PATH', str(tmp_path / 'export'))
+        mocker.patch.object(ei, 'IOCS_CACHE_PATH', str(tmp_path / 'iocs'))
+        find_indicators = mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
+        request_args = ei.RequestArguments(query='', out_format='text', limit=2)
+        ctx = dict(request_args.to_context_json(), **{ei.CTX_ON_DEMAND_KEY: True})
+        mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: ctx)
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda new_ctx: ctx.update(new_ctx) or
+                            ctx.pop(ei.CTX_ON_DEMAND_KEY))
+        expected_values = '\n'.join(ioc['value'] for ioc in iocs_json[:2])
+
+        assert ei.get_outbound_ioc_values(on_demand=True, request_args=request_args, last_update_data=ctx) == \
+            expected_values
+        assert ei.get_outbound_ioc_values(on_demand=True, request_args=request_args, last_update_data=ctx) == \
+            expected_values
+        assert find_indicators.call_count == 1
+        assert ctx == dict(request_args.to_context_json(), last_run=ctx['last_run'],
+                           **{ei.CTX_MIMETYPE_KEY: ei.MIMETYPE_TEXT})
+        request_args.limit = 1
+        assert ei.get_outbound_ioc_values(on_demand=True, request_args=request_args, last_update_data=ctx) == \
+            iocs_json[0]['value']
+        assert find_indicators.call_count == 1
+
+    def test_update_outbound_command(self, mocker, tmp_path):
+        """
+        Given:
+            - On demand mode
+
+        When:
+            - Running eis-update, restarting the server, and getting the export
+
+        Then:
+            - Ensure the command searches the indicators once, and hands the export over in the integration context
+            - Ensure the server keeps the handed over export on restart, and serves it without searching again
+            - Ensure the integration context keeps the arguments and mimetype of the export, but not its values or IoCs
+        """
+        import ExportIndicators as ei
+        with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
+            iocs_json = json.loads(iocs_json_f.read())
+        mocker.patch.object(demisto, 'uniqueFile', side_effect=[str(tmp_path / 'export'), str(tmp_path / 'iocs')])
+        find_indicators = mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
+        ctx: dict = {}
+        mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: dict(ctx))
+        mocker.patch.object(demisto, 'setIntegrationContext', side_effect=lambda new_ctx: ctx.clear() or
+                            ctx.update(new_ctx))
+
+        result = ei.update_outbound_command({'list_size': '2', 'query': 'type:IP', 'format': 'text',
+                                             'print_indicators': 'true'}, {'on_demand': True})
+        assert set(result.raw_response.split('\n')) == {ioc['value'] for ioc in iocs_json[:2]}
+        assert ctx[ei.CTX_ON_DEMAND_KEY] is True
+        assert ctx[ei.CTX_IOCS_KEY] == iocs_json[:2]
+
+        ei.initialize_export_cache()
+        request_args = ei.RequestArguments.from_context_json(ctx)
+        assert ei.get_outbound_ioc_values(on_demand=True, request_args=request_args,
+                                          last_update_data=ei.get_integration_context()) == result.raw_response
+        assert find_indicators.call_count == 1
+        assert ctx == dict(request_args.to_context_json(), last_run=ctx['last_run'],
+                           **{ei.CTX_MIMETYPE_KEY: ei.MIMETYPE_TEXT})
+        assert (ctx['last_query'], ctx['last_limit']) == ('type:IP', 2)
 
     def test_get_outbound_ioc_values_2(self, mocker):
         """Test update by not on_demand with no refresh"""
@@ -180,7 +257,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='text', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             for ioc in iocs_json:
@@ -193,7 +270,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR json', limit=39)
             ei_vals = ei.refresh_outbound_context(request_args)
             assert isinstance(ei_vals, str)
@@ -205,7 +282,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR csv', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_csv.txt', 'r') as iocs_out_f:
@@ -218,7 +295,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR json-seq', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_json_seq.txt', 'r') as iocs_out_f:
@@ -230,7 +307,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_url_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='json', limit=2)
             ei_vals = ei.refresh_outbound_context(request_args)
             ei_vals = json.loads(ei_vals)
@@ -243,7 +320,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='json-seq', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_json_seq_old.txt', 'r') as iocs_out_f:
@@ -256,7 +333,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='csv', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_csv_old.txt', 'r') as iocs_out_f:
@@ -264,6 +341,33 @@ class TestHelperFunctions:
                 for ioc in iocs_out.split('\n'):
                     assert ioc in ei_vals
 
+    def test_refresh_outbound_context_pages(self, mocker):
+        """
+        Given:
+            - 3 pages of indicators, where one of the indicators has no value
+            - An offset of 1 and a limit of 3
+
+        When:
+            - Refreshing the exported values
+
+        Then:
+            - Ensure the offset is skipped, and the indicator with no value is replaced by the next indicator
+            - Ensure the search stops once the limit is reached, without fetching the last page
+        """
+        import ExportIndicators as ei
+        fetched_pages = []
+
+        def iter_indicators_pages(_):
+            for page in [['1.1.1.1', '', '1.1.1.2'], ['1.1.1.3', '1.1.1.4'], ['1.1.1.5']]:
+                fetched_pages.append(page)
+                yield [{'value': value, 'indicator_type': 'IP'} for value in page]
+
+        mocker.patch.object(ei, 'iter_indicators_pages', side_effect=iter_indicators_pages)
+        request_args = ei.RequestArguments(query='', out_format='text', limit=3, offset=1)
+
+        assert ei.refresh_outbound_context(request_args) == '1.1.1.2\n1.1.1.3\n1.1.1.4'
+        assert len(fetched_pages) == 2
+
     def test_find_indicators_with_limit_1(self, mocker):
         """Test find indicators limit"""
         import ExportIndicators as ei
@@ -472,6 +576,7 @@ class TestHelperFunctions:
 
             assert returned_output[1].get('indicator') == 'https://www.demisto.com/cool'
             assert isinstance(returned_output[1].get('value'), dict)
+            assert iocs_json[0].get('value') == '1.2.3.4:89/wget'
 
     def test_ips_to_ranges_range(self):
         from ExportIndicators import ips_to_ranges, COLLAPSE_TO_RANGES
@@ -501,6 +606,38 @@ class TestHelperFunctions:
         assert "2.2.2.2" in ip_range_list
         assert "25.24.23.22" in ip_range_list
 
+    @pytest.mark.parametrize('on_demand', [False, True])
+    def test_route_list_values_conditional_request(self, mocker, on_demand):
+        """
+        Given:
+            - An export that is not modified between requests
+
+        When:
+            - Requesting the export, then requesting it again with the ETag and Last-Modified of the first response
+
+        Then:
+            - Ensure the first response has the export, with its ETag, and with its Last-Modified in on-demand mode
+            - Ensure the conditional response is 304 Not Modified, without the export
+        """
+        import ExportIndicators as ei
+        mocker.patch.object(demisto, 'params', return_value={'indicators_query': 'type:IP', 'format': 'text',
+                                                             'cache_refresh_rate': '5 minutes',
+                                                             'on_demand': on_demand})
+        mocker.patch.object(demisto, 'getIntegrationContext', return_value={'last_run': 1578383898000})
+        mocker.patch.object(ei, 'get_outbound_ioc_values', return_value='1.1.1.1\n2.2.2.2')
+
+        with ei.APP.test_client() as client:
+            response = client.get('/')
+            assert response.status_code == 200
+            assert response.get_data(as_text=True) == '1.1.1.1\n2.2.2.2'
+            assert bool(response.last_modified) == on_demand
+
+            conditional_headers = {'If-Modified-Since': response.headers['Last-Modified']} if on_demand else \
+                {'If-None-Match': response.headers['ETag']}
+            response = client.get('/', headers=conditional_headers)
+            assert response.status_code == 304
+            assert response.get_data(as_text=True) == ''
+
     def test_empty_integartion_context_mimtype(self, mocker):
         from ExportIndicators import get_outbound_mimetype
         mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
@@ -517,7 +654,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field=sort_field, sort_order=sort_order)
             ei_vals = refresh_outbound_context(request_args)
 
@@ -529,7 +666,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field='lastSeen',
                                             sort_order='invalid_sort_order')
             ei_vals = refresh_outbound_context(request_args)
@@ -542,7 +679,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'iter_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field='invalid_field_name',
                                             sort_order='asc')
             mocker.patch.object(demisto, 'debug')
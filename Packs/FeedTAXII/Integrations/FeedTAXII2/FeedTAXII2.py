@@ -1,7 +1,7 @@
 import demistomock as demisto
 from CommonServerPython import *
 from CommonServerUserPython import *
-from typing import Any, Tuple
+from typing import Any, Iterator
 
 """ CONSTANT VARIABLES """
 
@@ -9,6 +9,8 @@ from typing import Any, Tuple
 CONTEXT_PREFIX = "TAXII2"
 COMPLEX_OBSERVATION_MODE_SKIP = "Skip indicators with more than a single observation"
 COMPLEX_OBSERVATION_MODE_CREATE_ALL = "Create indicator for each observation"
+# last run key of the collections whose fetch is in progress -> their next page to fetch
+NEXT_PAGES_KEY = "next_pages"
 
 """ HELPER FUNCTIONS """
 
@@ -55,57 +57,115 @@ def fetch_indicators_command(
     limit,
     last_run_ctx,
     fetch_full_feed: bool = False,
-) -> Tuple[list, dict]:
+) -> Iterator[list]:
     """
-    Fetch indicators from TAXII 2 server
+    Fetch indicators from TAXII 2 server, and yield them in batches, one for each polled page.
+    Before each batch is yielded, last_run_ctx is updated as if the batch was created, so saving it after creating
+    the batch resumes an interrupted fetch from the page that follows it.
     :param client: Taxii2FeedClient
     :param initial_interval: initial interval in parse_date_range format
     :param limit: upper limit of indicators to fetch
-    :param last_run_ctx: last run dict with {collection_id: last_run_time string}
+    :param last_run_ctx: last run dict with {collection_id: last_run_time string}, and the next page of each collection
+        whose fetch is in progress under NEXT_PAGES_KEY
     :param fetch_full_feed: when set to true, will ignore last run, and try to fetch the entire feed
-    :return: indicators in cortex TIM format
+    :return: batches of indicators in cortex TIM format
     """
     if initial_interval:
         initial_interval, _ = parse_date_range(
             initial_interval, date_format=TAXII_TIME_FORMAT
         )
 
-    last_fetch_time = (
-        last_run_ctx.get(client.collection_to_fetch.id)
-        if client.collection_to_fetch
-        else None
-    )
-
-    # add filter for indicator types by default
-    filter_args = {"type": "indicator"}
-
     if client.collection_to_fetch is None:
         # fetch all collections
         if client.collections is None:
             raise DemistoException(ERR_NO_COLL)
-        indicators: list = []
-        for collection in client.collections:
-            client.collection_to_fetch = collection
+        collections = client.collections
+    else:
+        # fetch from a single collection
+        collections = [client.collection_to_fetch]
+
+    next_pages = last_run_ctx.setdefault(NEXT_PAGES_KEY, {})
+    for collection in collections:
+        client.collection_to_fetch = collection
+        # add filter for indicator types by default
+        filter_args = {"type": "indicator"}
+        next_page = next_pages.get(collection.id)
+        if next_page:
+            # resume the interrupted fetch of the collection, with the filter it started with
+            filter_args["added_after"] = next_page.get("added_after")
+            client.last_fetched_indicator__modified = next_page.get("modified")
+        else:
             filter_args["added_after"] = get_added_after(
                 fetch_full_feed, initial_interval, last_run_ctx.get(collection.id)
             )
-            fetched_iocs = client.build_iterator(limit, **filter_args)
-            indicators.extend(fetched_iocs)
-            if limit >= 0:
-                limit -= len(fetched_iocs)
-                if limit <= 0:
-                    break
-            last_run_ctx[collection.id] = client.last_fetched_indicator__modified
+            client.last_fetched_indicator__modified = None
+
+        fetched_iocs_cnt = 0
+        for fetched_iocs in iter_collection_batches(client, collection, limit, filter_args, next_pages):
+            fetched_iocs_cnt += len(fetched_iocs)
+            update_collection_last_run(client, collection, last_run_ctx, filter_args.get("added_after"))
+            yield fetched_iocs
+        update_collection_last_run(client, collection, last_run_ctx, filter_args.get("added_after"))
+
+        if limit >= 0:
+            limit -= fetched_iocs_cnt
+            if limit <= 0:
+                break
+
+    if not next_pages:
+        del last_run_ctx[NEXT_PAGES_KEY]
+
+
+def iter_collection_batches(client, collection, limit, filter_args, next_pages):
+    """
+    Polls a collection and yields the batches of its indicators, resuming from its saved next page if there is one.
+    If polling the saved next page fails (e.g. the server expired the next token), its next page is dropped and
+    the fetch of the collection restarts from the saved added_after filter
+    :param client: Taxii2FeedClient
+    :param collection: the collection to fetch
+    :param limit: upper limit of indicators to fetch
+    :param filter_args: the filter of the collection fetch
+    :param next_pages: the next page of each collection whose fetch is in progress
+    :return: batches of indicators in cortex TIM format
+    """
+    next_page = next_pages.get(collection.id)
+    if next_page:
+        batches = client.build_iterator_batches(limit, next_page=next_page.get("next"), **filter_args)
+        try:
+            first_batch = next(batches, None)
+        except Exception as e:
+            demisto.debug(
+                f"Failed polling the next page of collection {collection.id}, restarting its fetch from "
+                f"{filter_args.get('added_after')}: {e}"
+            )
+            next_pages.pop(collection.id, None)
+        else:
+            if first_batch is not None:
+                yield first_batch
+                yield from batches
+            return
+    yield from client.build_iterator_batches(limit, **filter_args)
+
+
+def update_collection_last_run(client, collection, last_run_ctx, added_after):
+    """
+    Updates the last run of a collection after its last fetched page:
+    with the next page to fetch if there is one, or with the collection latest fetch time otherwise
+    :param client: Taxii2FeedClient
+    :param collection: the fetched collection
+    :param last_run_ctx: last run dict to update
+    :param added_after: the added_after filter of the collection fetch
+    """
+    next_pages = last_run_ctx[NEXT_PAGES_KEY]
+    if client.next_page:
+        next_pages[collection.id] = {
+            "next": client.next_page,
+            "added_after": added_after,
+            "modified": client.last_fetched_indicator__modified,
+        }
     else:
-        # fetch from a single collection
-        filter_args["added_after"] = get_added_after(fetch_full_feed, initial_interval, last_fetch_time)
-        indicators = client.build_iterator(limit, **filter_args)
-        last_run_ctx[client.collection_to_fetch.id] = (
-            client.last_fetched_indicator__modified
-            if client.last_fetched_indicator__modified
-            else filter_args.get("added_after")
-        )
-    return indicators, last_run_ctx
+        next_pages.pop(collection.id, None)
+        last_run_ctx[collection.id] = client.last_fetched_indicator__modified or added_after
 
 
 def get_added_after(
@@ -262,15 +322,17 @@ def main():
                 limit = -1
 
             last_run_indicators = get_feed_last_run()
-            (indicators, last_run_indicators) = fetch_indicators_command(
+            for indicators in fetch_indicators_command(
                 client,
                 initial_interval,
                 limit,
                 last_run_indicators,
                 fetch_full_feed,
-            )
-            for iter_ in batch(indicators, batch_size=2000):
-                demisto.createIndicators(iter_)
+            ):
+                for iter_ in batch(indicators, batch_size=2000):
+                    demisto.createIndicators(iter_)
+                # save the progress of the fetch, so an interrupted fetch resumes after the created indicators
+                set_feed_last_run(last_run_indicators)
 
             set_feed_last_run(last_run_indicators)
         else:
@@ -42,9 +42,10 @@ class TestFetchIndicators:
         mock_client.collections = [MockCollection(default_id, 'default'), MockCollection(nondefault_id, 'not_default')]
 
         mock_client.collection_to_fetch = mock_client.collections[0]
-        mocker.patch.object(mock_client, 'build_iterator', return_value=RESULTS_JSON)
-        indicators, last_run = fetch_indicators_command(mock_client, '1 day', -1, {})
-        assert indicators == RESULTS_JSON
+        mocker.patch.object(mock_client, 'build_iterator_batches', return_value=[RESULTS_JSON])
+        last_run = {}
+        indicators_batches = list(fetch_indicators_command(mock_client, '1 day', -1, last_run))
+        assert indicators_batches == [RESULTS_JSON]
         assert mock_client.collection_to_fetch.id in last_run
 
     def test_single_with_context(self, mocker):
@@ -71,9 +72,9 @@ class TestFetchIndicators:
 
         mock_client.collection_to_fetch = mock_client.collections[0]
         last_run = {mock_client.collections[1]: 'test'}
-        mocker.patch.object(mock_client, 'build_iterator', return_value=RESULTS_JSON)
-        indicators, last_run = fetch_indicators_command(mock_client, '1 day', -1, last_run)
-        assert indicators == RESULTS_JSON
+        mocker.patch.object(mock_client, 'build_iterator_batches', return_value=[RESULTS_JSON])
+        indicators_batches = list(fetch_indicators_command(mock_client, '1 day', -1, last_run))
+        assert indicators_batches == [RESULTS_JSON]
         assert mock_client.collection_to_fetch.id in last_run
         assert last_run.get(mock_client.collections[1]) == 'test'
 
@@ -99,8 +100,9 @@ class TestFetchIndicators:
         nondefault_id = 2
         mock_client.collections = [MockCollection(default_id, 'default'), MockCollection(nondefault_id, 'not_default')]
 
-        mocker.patch.object(mock_client, 'build_iterator', side_effect=[CORTEX_IOCS_1, CORTEX_IOCS_2])
-        indicators, last_run = fetch_indicators_command(mock_client, '1 day', -1, {})
+        mocker.patch.object(mock_client, 'build_iterator_batches', side_effect=[[CORTEX_IOCS_1], [CORTEX_IOCS_2]])
+        last_run = {}
+        indicators = [ioc for iocs in fetch_indicators_command(mock_client, '1 day', -1, last_run) for ioc in iocs]
         assert len(indicators) == 14
         assert mock_client.collection_to_fetch.id in last_run
 
@@ -127,11 +129,89 @@ class TestFetchIndicators:
         mock_client.collections = [MockCollection(id_1, 'a'), MockCollection(id_2, 'b')]
 
         last_run = {mock_client.collections[1]: 'test'}
-        mocker.patch.object(mock_client, 'build_iterator', side_effect=[CORTEX_IOCS_1, CORTEX_IOCS_2])
-        indicators, last_run = fetch_indicators_command(mock_client, '1 day', len(CORTEX_IOCS_1), last_run)
+        mocker.patch.object(mock_client, 'build_iterator_batches', side_effect=[[CORTEX_IOCS_1], [CORTEX_IOCS_2]])
+        indicators = [ioc for iocs in fetch_indicators_command(mock_client, '1 day', len(CORTEX_IOCS_1), last_run)
+                      for ioc in iocs]
         assert len(indicators) == len(CORTEX_IOCS_1)
         assert last_run.get(mock_client.collections[1]) == 'test'
 
+    def test_resume_from_next_page(self, mocker):
+        """
+        Scenario: Test resuming an interrupted collection fetch
+
+        Given:
+        - collection to fetch is available and set to 'default'
+        - the last run has the next page of the collection, from an interrupted fetch
+        - the collection has 2 more pages to fetch
+
+        When:
+        - fetch_indicators_command is called, and its batches are consumed one by one
+
+        Then:
+        - resume the fetch from the next page, with the added_after filter the fetch started with
+        - update the next page of the collection in last run after each batch that has more pages after it
+        - update last run with latest collection fetch time once the collection is fetched
+        """
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch='default', proxies=[], verify=False)
+        mock_client.collections = [MockCollection(1, 'default')]
+        mock_client.collection_to_fetch = mock_client.collections[0]
+        last_run = {NEXT_PAGES_KEY: {1: {'next': 'page-2', 'added_after': 'added', 'modified': 'modified-1'}}}
+
+        def build_iterator_batches(limit, next_page=None, **kwargs):
+            mock_client.next_page, mock_client.last_fetched_indicator__modified = 'page-3', 'modified-2'
+            yield CORTEX_IOCS_1
+            mock_client.next_page, mock_client.last_fetched_indicator__modified = None, 'modified-3'
+            yield CORTEX_IOCS_2
+
+        build_iterator_mock = mocker.patch.object(mock_client, 'build_iterator_batches',
+                                                  side_effect=build_iterator_batches)
+        batches = fetch_indicators_command(mock_client, '1 day', -1, last_run)
+
+        assert next(batches) == CORTEX_IOCS_1
+        assert mock_client.last_fetched_indicator__modified == 'modified-2'
+        build_iterator_mock.assert_called_once_with(-1, next_page='page-2', type='indicator', added_after='added')
+        assert last_run == {NEXT_PAGES_KEY: {1: {'next': 'page-3', 'added_after': 'added', 'modified': 'modified-2'}}}
+        assert next(batches) == CORTEX_IOCS_2
+        assert list(batches) == []
+        assert last_run == {1: 'modified-3'}
+
+    def test_restart_on_failed_next_page(self, mocker):
+        """
+        Scenario: Test resuming an interrupted collection fetch whose next page was rejected by the server
+
+        Given:
+        - collection to fetch is available and set to 'default'
+        - the last run has the next page of the collection, from an interrupted fetch
+        - the server fails polling the saved next page, e.g. since the next token expired
+
+        When:
+        - fetch_indicators_command is called
+
+        Then:
+        - drop the saved next page, and restart the fetch of the collection from the saved added_after filter
+        - update last run with latest collection fetch time once the collection is fetched
+        """
+        mock_client = Taxii2FeedClient(url='', collection_to_fetch='default', proxies=[], verify=False)
+        mock_client.collections = [MockCollection(1, 'default')]
+        mock_client.collection_to_fetch = mock_client.collections[0]
+        last_run = {NEXT_PAGES_KEY: {1: {'next': 'expired', 'added_after': 'added', 'modified': 'modified-1'}}}
+
+        def build_iterator_batches(limit, next_page=None, **kwargs):
+            if next_page:
+                raise Exception('invalid next token')
+            mock_client.next_page, mock_client.last_fetched_indicator__modified = None, 'modified-2'
+            yield CORTEX_IOCS_1
+
+        build_iterator_mock = mocker.patch.object(mock_client, 'build_iterator_batches',
+                                                  side_effect=build_iterator_batches)
+
+        assert list(fetch_indicators_command(mock_client, '1 day', -1, last_run)) == [CORTEX_IOCS_1]
+        assert build_iterator_mock.call_args_list == [
+            mocker.call(-1, next_page='expired', type='indicator', added_after='added'),
+            mocker.call(-1, type='indicator', added_after='added'),
+        ]
+        assert last_run == {1: 'modified-2'}
+
 
 class TestHelperFunctions:
     def test_try_parse_integer(self):
@@ -2,7 +2,7 @@ import concurrent.futures
 import secrets
 from enum import Enum
 from ipaddress import ip_address
-from typing import Tuple
+from typing import Callable, Set, Tuple
 
 import pytz
 import urllib3
@@ -25,13 +25,17 @@ LOCK_WAIT_TIME = 0.5  # time to wait for lock.acquire
 MAX_WORKERS = 8  # max concurrent workers used for events enriching
 DOMAIN_ENRCH_FLG = 'true'  # when set to true, will try to enrich offense and assets with domain names
 RULES_ENRCH_FLG = 'true'  # when set to true, will try to enrich offense with rule names
+PIPELINED_FETCH_FLG = 'false'  # when set to true, each offense is created as an incident as soon as its events fetched
 MAX_FETCH_EVENT_RETIRES = 3  # max iteration to try search the events of an offense
 SLEEP_FETCH_EVENT_RETIRES = 10  # sleep between iteration to try search the events of an offense
 MAX_NUMBER_OF_OFFENSES_TO_CHECK_SEARCH = 5  # Number of offenses to check during mirroring if search was completed.
+LOOKUP_CACHE_TTL_SECS = 3600  # time to keep ID to name lookups (offense types, rules, etc.) cached, 0 to disable cache
+LOOKUP_CACHE_MAX_SIZE = 1000  # max amount of IDs cached per lookup table
 
 ADVANCED_PARAMETERS_STRING_NAMES = [
     'DOMAIN_ENRCH_FLG',
-    'RULES_ENRCH_FLG'
+    'RULES_ENRCH_FLG',
+    'PIPELINED_FETCH_FLG'
 ]
 ADVANCED_PARAMETER_INT_NAMES = [
     'EVENTS_INTERVAL_SECS',
@@ -43,13 +47,19 @@ ADVANCED_PARAMETER_INT_NAMES = [
     'LOCK_WAIT_TIME',
     'MAX_WORKERS',
     'MAX_FETCH_EVENT_RETIRES',
-    'SLEEP_FETCH_EVENT_RETIRES'
+    'SLEEP_FETCH_EVENT_RETIRES',
+    'LOOKUP_CACHE_TTL_SECS',
+    'LOOKUP_CACHE_MAX_SIZE'
 ]
 
 ''' CONSTANTS '''
 API_USERNAME = '_api_token_key'
 RESET_KEY = 'reset'
 LAST_FETCH_KEY = 'id'
+CREATED_OFFENSES_KEY = 'created_offenses'
+OFFENSES_SEARCHES_KEY = 'offenses_searches'
+LOOKUP_CACHE_KEY = 'lookup_cache'
+LOOKUP_CACHE_TABLES = ['offense_types', 'closing_reasons', 'domains', 'rules']
 MINIMUM_API_VERSION = 10.1
 DEFAULT_RANGE_VALUE = '0-49'
 DEFAULT_TIMEOUT_VALUE = '35'
@@ -754,6 +764,53 @@ def is_valid_ip(ip: str) -> bool:
         return False
 
 
+def get_cached_names(table: str, ids: Set, get_names: Callable[[List], Dict]) -> Dict:
+    """
+    Receives IDs of a QRadar lookup table (offense types, closing reasons, domains or rules), and returns
+    their names. Names are cached in the integration context for LOOKUP_CACHE_TTL_SECS, and only IDs which are not
+    cached, or whose cached name expired, are requested from QRadar service. IDs which QRadar service did not return
+    are cached with a None name, so they are not requested again until they expire.
+    Args:
+        table (str): Name of the lookup table, one of LOOKUP_CACHE_TABLES.
+        ids (Set): IDs to retrieve their names.
+        get_names (Callable[[List], Dict]): Function performing the API call to QRadar service to retrieve
+                                            the names of the given IDs.
+
+    Returns:
+        (Dict): Dictionary of {id: name}, without the IDs which were not found.
+    """
+    if not ids:
+        return dict()
+    if LOOKUP_CACHE_TTL_SECS <= 0:
+        return get_names(list(ids))
+
+    now = int(time.time())
+    cache = json.loads(get_integration_context().get(LOOKUP_CACHE_KEY, '{}'))
+    table_cache: Dict[str, List] = cache.get(table, {})
+    names = dict()
+    ids_to_get = []
+    for id_ in ids:
+        cached = table_cache.get(str(id_))
+        if cached and now - cached[1] < LOOKUP_CACHE_TTL_SECS:
+            if cached[0] is not None:
+                names[id_] = cached[0]
+        else:
+            ids_to_get.append(id_)
+    if not ids_to_get:
+        return names
+
+    print_debug_msg(f'Retrieving {len(ids_to_get)} {table} names, {len(names)} were found in cache.')
+    new_names = get_names(ids_to_get)
+    names.update(new_names)
+    table_cache.update({str(id_): [new_names.get(id_), now] for id_ in ids_to_get})
+    # drops expired names, and the oldest names if the table exceeds its size bound
+    table_entries = sorted(((id_, cached) for id_, cached in table_cache.items()
+                            if now - cached[1] < LOOKUP_CACHE_TTL_SECS), key=lambda entry: entry[1][1])
+    cache[table] = dict(table_entries[max(len(table_entries) - LOOKUP_CACHE_MAX_SIZE, 0):])
+    set_to_integration_context_with_retries({LOOKUP_CACHE_KEY: cache})
+    return names
+
+
 def get_offense_types(client: Client, offenses: List[Dict]) -> Dict:
     """
     Receives list of offenses, and performs API call to QRadar service to retrieve the offense type names
@@ -765,12 +822,12 @@ def get_offense_types(client: Client, offenses: List[Dict]) -> Dict:
     Returns:
         (Dict): Dictionary of {offense_type_id: offense_type_name}
     """
+    def get_offense_types_names(ids: List) -> Dict:
+        offense_types = client.offense_types(filter_=f'''id in ({','.join(map(str, ids))})''', fields='id,name')
+        return {offense_type.get('id'): offense_type.get('name') for offense_type in offense_types}
+
     offense_types_ids = {offense.get('offense_type') for offense in offenses if offense.get('offense_type') is not None}
-    if not offense_types_ids:
-        return dict()
-    offense_types = client.offense_types(filter_=f'''id in ({','.join(map(str, offense_types_ids))})''',
-                                         fields='id,name')
-    return {offense_type.get('id'): offense_type.get('name') for offense_type in offense_types}
+    return get_cached_names('offense_types', offense_types_ids, get_offense_types_names)
 
 
 def get_offense_closing_reasons(client: Client, offenses: List[Dict]) -> Dict:
@@ -784,13 +841,14 @@ def get_offense_closing_reasons(client: Client, offenses: List[Dict]) -> Dict:
     Returns:
         (Dict): Dictionary of {closing_reason_id: closing_reason_name}
     """
+    def get_closing_reasons_names(ids: List) -> Dict:
+        closing_reasons = client.closing_reasons_list(filter_=f'''id in ({','.join(map(str, ids))})''',
+                                                      fields='id,text')
+        return {closing_reason.get('id'): closing_reason.get('text') for closing_reason in closing_reasons}
+
     closing_reason_ids = {offense.get('closing_reason_id') for offense in offenses
                           if offense.get('closing_reason_id') is not None}
-    if not closing_reason_ids:
-        return dict()
-    closing_reasons = client.closing_reasons_list(filter_=f'''id in ({','.join(map(str, closing_reason_ids))})''',
-                                                  fields='id,text')
-    return {closing_reason.get('id'): closing_reason.get('text') for closing_reason in closing_reasons}
+    return get_cached_names('closing_reasons', closing_reason_ids, get_closing_reasons_names)
 
 
 def get_domain_names(client: Client, outputs: List[Dict]) -> Dict:
@@ -804,11 +862,12 @@ def get_domain_names(client: Client, outputs: List[Dict]) -> Dict:
     Returns:
         (Dict): Dictionary of {domain_id: domain_name}
     """
+    def get_domains_names(ids: List) -> Dict:
+        domains_info = client.domains_list(filter_=f'''id in ({','.join(map(str, ids))})''', fields='id,name')
+        return {domain_info.get('id'): domain_info.get('name') for domain_info in domains_info}
+
     domain_ids = {offense.get('domain_id') for offense in outputs if offense.get('domain_id') is not None}
-    if not domain_ids:
-        return dict()
-    domains_info = client.domains_list(filter_=f'''id in ({','.join(map(str, domain_ids))})''', fields='id,name')
-    return {domain_info.get('id'): domain_info.get('name') for domain_info in domains_info}
+    return get_cached_names('domains', domain_ids, get_domains_names)
 
 
 def get_rules_names(client: Client, offenses: List[Dict]) -> Dict:
@@ -822,11 +881,12 @@ def get_rules_names(client: Client, offenses: List[Dict]) -> Dict:
     Returns:
         (Dict): Dictionary of {rule_id: rule_name}
     """
+    def get_rules_names_by_ids(ids: List) -> Dict:
+        rules = client.rules_list(None, None, f'''id in ({','.join(map(str, ids))})''', 'id,name')
+        return {rule.get('id'): rule.get('name') for rule in rules}
+
     rules_ids = {rule.get('id') for offense in offenses for rule in offense.get('rules', [])}
-    if not rules_ids:
-        return dict()
-    rules = client.rules_list(None, None, f'''id in ({','.join(map(str, rules_ids))})''', 'id,name')
-    return {rule.get('id'): rule.get('name') for rule in rules}
+    return get_cached_names('rules', rules_ids, get_rules_names_by_ids)
 
 
 def get_offense_addresses(client: Client, offenses: List[Dict], is_destination_addresses: bool) -> Dict:
@@ -1349,7 +1409,8 @@ def poll_offense_events_with_retry(client: Client, search_id: str, offense_id: i
 
 
 def enrich_offense_with_events(client: Client, offense: Dict, fetch_mode: str, events_columns: str, events_limit: int,
-                               max_retries: int = MAX_FETCH_EVENT_RETIRES):
+                               max_retries: int = MAX_FETCH_EVENT_RETIRES, search_id: Optional[str] = None,
+                               searches: Optional[Dict[int, str]] = None):
     """
     Enriches offense given with events.
     Has retry mechanism for events returned by query to QRadar. This is needed because events might not be
@@ -1363,6 +1424,9 @@ def enrich_offense_with_events(client: Client, offense: Dict, fetch_mode: str, e
         events_columns (str): Columns of the events to be extracted from query.
         events_limit (int): Maximum number of events to enrich the offense.
         max_retries (int): Number of retries.
+        search_id (Optional[str]): ID of a search of the offense events that was already created. If given, the search
+                                   is polled on the first try instead of creating a new search.
+        searches (Optional[Dict[int, str]]): If given, the ID of each search created is saved in it by the offense ID.
 
     Returns:
         (Dict): Enriched offense with events.
@@ -1370,16 +1434,19 @@ def enrich_offense_with_events(client: Client, offense: Dict, fetch_mode: str, e
     if is_reset_triggered():
         return offense
 
-    # decreasing 1 minute from the start_time to avoid the case where the minute queried of start_time equals end_time.
+    offense_id = offense['id']
     for i in range(max_retries):
         # retry to check if we got all the event (its not an error retry), see docstring
-        search_response = create_search_with_retry(client, fetch_mode, offense, events_columns,
-                                                   events_limit)
-        if not search_response:
-            continue
-
-        offense_id = offense['id']
-        events = poll_offense_events_with_retry(client, search_response['search_id'], offense_id)
+        if i > 0 or not search_id:
+            search_response = create_search_with_retry(client, fetch_mode, offense, events_columns,
+                                                       events_limit)
+            if not search_response:
+                continue
+            search_id = search_response['search_id']
+            if searches is not None:
+                searches[offense_id] = search_id
+
+        events = poll_offense_events_with_retry(client, search_id, offense_id)  # type: ignore[arg-type]
         min_events_size = min(offense.get('event_count', 0), events_limit)
         if len(events) >= min_events_size:
             offense = dict(offense, events=events)
@@ -1474,6 +1541,154 @@ def create_incidents_from_offenses(offenses: List[Dict], incident_type: Optional
     } for offense in offenses]
 
 
+class OffensesPipeline:
+    """
+    Pipelined fetch of offenses in a long running execution, enabled by the PIPELINED_FETCH_FLG advanced parameter.
+    Instead of waiting for the events of all the offenses of a fetch before creating their incidents,
+    each offense is created as an incident as soon as its events are fetched, and new offenses are fetched
+    while the events of slow offenses are still being searched.
+
+    The state is saved in the integration context, so no offense is lost or created twice after a restart:
+    - The last fetch ID is the highest offense ID below which all the offenses were created.
+    - The IDs of the offenses above the last fetch ID that were already created.
+    - The search IDs of the offenses in progress, which are resumed instead of creating new searches.
+    """
+
+    def __init__(self, client: Client, offenses_per_fetch: int, user_query: str, fetch_mode: str,
+                 events_columns: str, events_limit: int, ip_enrich: bool, asset_enrich: bool,
+                 incident_type: Optional[str], mirror_direction: Optional[str]):
+        self.client = client
+        self.offenses_per_fetch = offenses_per_fetch or MAXIMUM_OFFENSES_PER_FETCH
+        self.user_query = user_query
+        self.fetch_mode = fetch_mode
+        self.events_columns = events_columns
+        self.events_limit = events_limit
+        self.ip_enrich = ip_enrich
+        self.asset_enrich = asset_enrich
+        self.incident_type = incident_type
+        self.mirror_direction = mirror_direction
+        self.load_state()
+
+    def load_state(self):
+        """
+        Loads the state from the integration context. Offenses in progress from before are dropped.
+        """
+        ctx = get_integration_context()
+        self.last_fetch_id = int(json.loads(ctx.get(LAST_FETCH_KEY, '0')))
+        self.highest_fetched_id = self.last_fetch_id
+        self.created_ids: Set[int] = set(json.loads(ctx.get(CREATED_OFFENSES_KEY, '[]')))
+        # the searches are updated by the workers
+        self.searches: Dict[int, str] = {int(offense_id): search_id for offense_id, search_id
+                                         in json.loads(ctx.get(OFFENSES_SEARCHES_KEY, '{}')).items()}
+        self.saved_searches = dict(self.searches)
+        self.in_progress: Dict[int, Tuple[Dict, concurrent.futures.Future]] = {}
+
+    def fetch_offenses(self):
+        """
+        Fetches the offenses above the highest offense fetched, up to offenses_per_fetch offenses in progress,
+        and starts the enrichment of their events.
+        """
+        offenses_to_fetch = self.offenses_per_fetch - len(self.in_progress)
+        if offenses_to_fetch <= 0:
+            return
+        offense_highest_id = get_minimum_id_to_fetch(self.highest_fetched_id, self.user_query)
+        user_query = f' AND {self.user_query}' if self.user_query else ''
+        filter_fetch_query = f'id>{offense_highest_id}{user_query}'
+        print_debug_msg(f'Filter query to QRadar: {filter_fetch_query}')
+        offenses = self.client.offenses_list(f'items=0-{offenses_to_fetch - 1}', filter_=filter_fetch_query,
+                                             sort=ASCENDING_ID_ORDER)
+        if not offenses:
+            return
+        self.highest_fetched_id = offenses[-1].get('id')
+        print_debug_msg(f'New highest ID returned from QRadar offenses: {self.highest_fetched_id}')
+
+        # offenses created before a restart are fetched again
+        offenses = [offense for offense in offenses if offense.get('id') not in self.created_ids]
+        if not offenses:
+            return
+        if self.mirror_direction:
+            offenses = [dict(offense, mirror_direction=self.mirror_direction,
+                             mirror_instance=demisto.integrationInstance()) for offense in offenses]
+        # the enrichment of the offenses does not depend on their events, so it is done for all of them together
+        for offense in enrich_offenses_result(self.client, offenses, self.ip_enrich, self.asset_enrich):
+            offense_id = offense['id']
+            future = EXECUTOR.submit(
+                enrich_offense_with_events,
+                client=self.client,
+                offense=offense,
+                fetch_mode=self.fetch_mode,
+                events_columns=self.events_columns,
+                events_limit=self.events_limit,
+                search_id=self.searches.get(offense_id),
+                searches=self.searches,
+            )
+            self.in_progress[offense_id] = (offense, future)
+
+    def create_incidents(self, timeout: float):
+        """
+        Waits up to timeout seconds for offenses to be enriched with events, and creates their incidents.
+        """
+        concurrent.futures.wait([future for _, future in self.in_progress.values()], timeout=timeout,
+                                return_when=concurrent.futures.FIRST_COMPLETED)
+        offenses = []
+        for offense_id in [offense_id for offense_id, (_, future) in self.in_progress.items() if future.done()]:
+            offense, future = self.in_progress.pop(offense_id)
+            try:
+                offense = future.result()
+            except Exception:
+                print_debug_msg(f'Failed to enrich offense {offense_id} with events, creating it without events.')
+                print_debug_msg(traceback.format_exc())
+            offenses.append(offense)
+            self.searches.pop(offense_id, None)
+            self.created_ids.add(offense_id)
+
+        incidents = create_incidents_from_offenses(sanitize_outputs(offenses), self.incident_type) if offenses else []
+        self.save_state(incidents[:SAMPLE_SIZE])
+        if incidents:
+            demisto.createIncidents(incidents)
+
+    def save_state(self, samples: List[Dict]):
+        """
+        Saves the state to the integration context, if it was changed.
+        """
+        lowest_id_in_progress = min(self.in_progress) if self.in_progress else None
+        if lowest_id_in_progress is None:
+            last_fetch_id = self.highest_fetched_id
+        else:
+            last_fetch_id = max([offense_id for offense_id in self.created_ids if offense_id < lowest_id_in_progress],
+                                default=self.last_fetch_id)
+        searches = dict(self.searches)
+        if not samples and last_fetch_id == self.last_fetch_id and searches == self.saved_searches:
+            return
+        self.last_fetch_id = max(self.last_fetch_id, last_fetch_id)
+        self.created_ids = {offense_id for offense_id in self.created_ids if offense_id > self.last_fetch_id}
+        self.saved_searches = searches
+        ctx = {
+            LAST_FETCH_KEY: self.last_fetch_id,
+            CREATED_OFFENSES_KEY: sorted(self.created_ids),
+            OFFENSES_SEARCHES_KEY: {str(offense_id): search_id for offense_id, search_id in searches.items()},
+        }
+        if samples:
+            ctx['samples'] = samples
+        print_debug_msg(f'Saving last fetch ID: {self.last_fetch_id}, {len(self.in_progress)} offenses in progress.')
+        set_to_integration_context_with_retries(ctx)
+
+    def run_fetch_cycle(self):
+        """
+        Fetches new offenses, and creates the incidents of the offenses in progress as soon as their events
+        are fetched, for FETCH_SLEEP seconds.
+        """
+        self.fetch_offenses()
+        end_time = time.time() + FETCH_SLEEP
+        while self.in_progress and time.time() < end_time:
+            # the searches of the offenses in progress are saved at least every EVENTS_INTERVAL_SECS
+            self.create_incidents(timeout=min(end_time - time.time(), EVENTS_INTERVAL_SECS))
+        if not self.in_progress:
+            # saves the highest offense fetched, even if all the offenses fetched were already created
+            self.save_state([])
+        time.sleep(max(end_time - time.time(), 0))
+
+
 def long_running_execution_command(client: Client, params: Dict):
     """
     Long running execution of fetching incidents from QRadar service.
@@ -1496,6 +1711,20 @@ def long_running_execution_command(client: Client, params: Dict):
     events_limit = int(params.get('events_limit') or DEFAULT_EVENTS_LIMIT)
     incident_type = params.get('incident_type')
     mirror_direction = MIRROR_DIRECTION.get(params.get('mirror_options', DEFAULT_MIRRORING_DIRECTION))
+    if PIPELINED_FETCH_FLG.lower() == 'true' and fetch_mode != FetchMode.no_events.value:
+        pipeline = OffensesPipeline(client, offenses_per_fetch, user_query, fetch_mode, events_columns, events_limit,
+                                    ip_enrich, asset_enrich, incident_type, mirror_direction)
+        while True:
+            try:
+                if is_reset_triggered(handle_reset=True):
+                    pipeline.load_state()
+                print_debug_msg(f'Starting pipelined fetch loop. Fetch mode: {fetch_mode}.')
+                pipeline.run_fetch_cycle()
+            except Exception:
+                demisto.error('Error occurred during long running loop')
+                demisto.error(traceback.format_exc())
+                time.sleep(FETCH_SLEEP)
+
     while True:
         try:
             is_reset_triggered(handle_reset=True)
@@ -2601,6 +2830,27 @@ def qradar_reset_last_run_command() -> str:
     return 'fetch-incidents was reset successfully.'
 
 
+def qradar_lookup_cache_reset_command(args: Dict) -> str:
+    """
+    Clears the cached names of QRadar lookup tables from the integration context, so they are
+    requested again from QRadar service on the next enrichment.
+    Args:
+        args (Dict): Demisto args.
+
+    Returns:
+        (str): 'Lookup cache was reset successfully'.
+    """
+    tables = argToList(args.get('table'))
+    invalid_tables = [table for table in tables if table not in LOOKUP_CACHE_TABLES]
+    if invalid_tables:
+        raise DemistoException(f'Invalid table: {", ".join(invalid_tables)}. '
+                               f'Possible values are: {", ".join(LOOKUP_CACHE_TABLES)}.')
+    cache = json.loads(get_integration_context().get(LOOKUP_CACHE_KEY, '{}'))
+    cache = {table: names for table, names in cache.items() if tables and table not in tables}
+    set_to_integration_context_with_retries({LOOKUP_CACHE_KEY: cache})
+    return 'Lookup cache was reset successfully.'
+
+
 def qradar_get_mapping_fields_command(client: Client) -> Dict:
     """
     Returns Dict object containing the list of fields for an incident type.
@@ -2991,6 +3241,9 @@ def main() -> None:
         elif command == 'qradar-reset-last-run':
             return_results(qradar_reset_last_run_command())
 
+        elif command == 'qradar-lookup-cache-reset':
+            return_results(qradar_lookup_cache_reset_command(args))
+
         elif command == 'get-mapping-fields':
             return_results(qradar_get_mapping_fields_command(client))
 
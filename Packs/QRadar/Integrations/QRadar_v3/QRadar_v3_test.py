@@ -1092,3 +1092,160 @@ def test_ip_commands(mocker, command_func: Callable[[Client, Dict], CommandResul
     assert results.outputs_key_field == expected_command_results.outputs_key_field
     assert results.outputs == expected_command_results.outputs
     assert results.raw_response == expected_command_results.raw_response
+
+
+def test_enrich_offense_with_events_resumes_search(mocker):
+    """
+    Given:
+     - Offense to enrich with events, and the ID of a search of its events created before.
+
+    When:
+     - Enriching the offense with events, when the events of the first search are not complete.
+
+    Then:
+     - Ensure the given search is polled first, instead of creating a new search.
+     - Ensure the ID of the new search created on retry is saved by the offense ID.
+    """
+    offense = command_test_data['offenses_list']['response'][0]
+    events = sanitize_outputs(command_test_data['search_results_get']['response']['events'])
+    create_search_mock = mocker.patch.object(QRadar_v3, 'create_search_with_retry',
+                                             return_value={'search_id': 'new-search'})
+    poll_events_mock = mocker.patch.object(QRadar_v3, 'poll_offense_events_with_retry', side_effect=[[], events])
+    mocker.patch.object(QRadar_v3.time, 'sleep')
+    searches: Dict = {}
+
+    enriched_offense = enrich_offense_with_events(client, offense, 'all_events', event_columns_default_value,
+                                                  events_limit=3, max_retries=2, search_id='old-search',
+                                                  searches=searches)
+
+    assert create_search_mock.call_count == 1
+    assert [call[0][1] for call in poll_events_mock.call_args_list] == ['old-search', 'new-search']
+    assert searches == {offense['id']: 'new-search'}
+    assert enriched_offense == dict(offense, events=events)
+
+
+def test_offenses_pipeline_creates_incidents_as_enriched(mocker):
+    """
+    Given:
+     - Pipelined fetch of two offenses, where the events of the lower offense are still being fetched.
+
+    When:
+     - Creating the incidents of the offenses enriched with events.
+
+    Then:
+     - Ensure the incident of the higher offense is created without waiting for the lower offense.
+     - Ensure the last fetch ID is not advanced beyond the offense in progress, and the created offense and the search
+       of the offense in progress are saved to the context.
+     - Ensure once the lower offense is enriched, its incident is created and the last fetch ID is advanced.
+    """
+    import threading
+    from QRadar_v3 import OffensesPipeline, LAST_FETCH_KEY, CREATED_OFFENSES_KEY, OFFENSES_SEARCHES_KEY
+    set_integration_context({LAST_FETCH_KEY: '10'})
+    offenses = [{'id': 11, 'description': 'slow'}, {'id': 12, 'description': 'fast'}]
+    release_slow_offense = threading.Event()
+
+    def enrich_offense_with_events_mock(offense, searches, **kwargs):
+        searches[offense['id']] = f'search-{offense["id"]}'
+        if offense['id'] == 11:
+            release_slow_offense.wait(5)
+        return dict(offense, events=[])
+
+    offenses_list_mock = mocker.patch.object(client, 'offenses_list', return_value=offenses)
+    mocker.patch.object(QRadar_v3, 'enrich_offenses_result', side_effect=lambda _, offenses_, *args: offenses_)
+    mocker.patch.object(QRadar_v3, 'enrich_offense_with_events', side_effect=enrich_offense_with_events_mock)
+    create_incidents_mock = mocker.patch.object(QRadar_v3.demisto, 'createIncidents')
+
+    pipeline = OffensesPipeline(client, 2, '', 'all_events', '', 3, False, False, None, None)
+    pipeline.fetch_offenses()
+    assert 'id>10' in offenses_list_mock.call_args[1]['filter_']
+
+    pipeline.create_incidents(timeout=5)
+    while len(pipeline.in_progress) > 1:
+        pipeline.create_incidents(timeout=5)
+    assert [incident['name'] for incident in create_incidents_mock.call_args[0][0]] == ['12 fast']
+    ctx = QRadar_v3.get_integration_context()
+    assert json.loads(ctx[LAST_FETCH_KEY]) == 10
+    assert json.loads(ctx[CREATED_OFFENSES_KEY]) == [12]
+    assert json.loads(ctx[OFFENSES_SEARCHES_KEY]) == {'11': 'search-11'}
+
+    release_slow_offense.set()
+    pipeline.create_incidents(timeout=5)
+    assert [incident['name'] for incident in create_incidents_mock.call_args[0][0]] == ['11 slow']
+    ctx = QRadar_v3.get_integration_context()
+    assert json.loads(ctx[LAST_FETCH_KEY]) == 12
+    assert json.loads(ctx[CREATED_OFFENSES_KEY]) == []
+    assert json.loads(ctx[OFFENSES_SEARCHES_KEY]) == {}
+    set_integration_context({})
+
+
+def test_get_cached_names(mocker):
+    """
+    Given:
+     - IDs of a lookup table, some of them cached in the integration context, one of them expired.
+
+    When:
+     - Retrieving the names of the IDs.
+
+    Then:
+     - Ensure only the IDs which are not cached or expired are requested from QRadar.
+     - Ensure the names are cached, and the oldest names are dropped when the table exceeds its size bound.
+     - Ensure IDs which QRadar did not return are cached, and are not returned nor requested again.
+    """
+    from QRadar_v3 import get_cached_names, LOOKUP_CACHE_KEY
+    now = 100000
+    mocker.patch.object(QRadar_v3.time, 'time', return_value=now)
+    mocker.patch.object(QRadar_v3, 'LOOKUP_CACHE_TTL_SECS', 3600)
+    mocker.patch.object(QRadar_v3, 'LOOKUP_CACHE_MAX_SIZE', 4)
+    set_integration_context({LOOKUP_CACHE_KEY: json.dumps({'rules': {'1': ['cached', now - 10],
+                                                                     '2': ['expired', now - 4000]}})})
+    get_names_mock = mocker.Mock(side_effect=lambda ids: {id_: f'rule {id_}' for id_ in ids if id_ != 5})
+
+    names = get_cached_names('rules', {1, 2, 3, 4, 5}, get_names_mock)
+
+    assert names == {1: 'cached', 2: 'rule 2', 3: 'rule 3', 4: 'rule 4'}
+    assert sorted(get_names_mock.call_args[0][0]) == [2, 3, 4, 5]
+    cache = json.loads(QRadar_v3.get_integration_context()[LOOKUP_CACHE_KEY])
+    assert sorted(cache['rules']) == ['2', '3', '4', '5']
+    assert cache['rules']['5'] == [None, now]
+
+    get_names_mock.reset_mock()
+    assert get_cached_names('rules', {2, 3, 5}, get_names_mock) == {2: 'rule 2', 3: 'rule 3'}
+    get_names_mock.assert_not_called()
+    set_integration_context({})
+
+
+@pytest.mark.parametrize('args, expected_tables', [({}, []), ({'table': 'rules'}, ['domains'])])
+def test_qradar_lookup_cache_reset_command(args, expected_tables):
+    """
+    Given:
+     - Cached names of lookup tables.
+
+    When:
+     - Running the qradar-lookup-cache-reset command, with and without a table to reset.
+
+    Then:
+     - Ensure the names of the given table, or of all tables if none given, are removed from the cache.
+    """
+    from QRadar_v3 import qradar_lookup_cache_reset_command, LOOKUP_CACHE_KEY
+    set_integration_context({LOOKUP_CACHE_KEY: json.dumps({'rules': {'1': ['rule', 0]},
+                                                           'domains': {'1': ['domain', 0]}})})
+
+    assert qradar_lookup_cache_reset_command(args) == 'Lookup cache was reset successfully.'
+    assert list(json.loads(QRadar_v3.get_integration_context()[LOOKUP_CACHE_KEY])) == expected_tables
+    set_integration_context({})
+
+
+def test_qradar_lookup_cache_reset_command_invalid_table():
+    """
+    Given:
+     - A table which is not a lookup table.
+
+    When:
+     - Running the qradar-lookup-cache-reset command.
+
+    Then:
+     - Ensure an error is raised.
+    """
+    from QRadar_v3 import qradar_lookup_cache_reset_command
+    with pytest.raises(DemistoException):
+        qradar_lookup_cache_reset_command({'table': 'offenses'})
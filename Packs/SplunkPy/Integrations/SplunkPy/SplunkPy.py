@@ -16,7 +16,10 @@ from StringIO import StringIO
 import requests
 import urllib3
 import io
+import itertools
 import re
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -33,6 +36,9 @@ REPLACE_WITH = '_'
 REPLACE_FLAG = params.get('replaceKeys', False)
 FETCH_TIME = demisto.params().get('fetch_time')
 PROXIES = handle_proxy()
+USE_JSON_OUTPUT_MODE = argToBoolean(params.get('use_json_output_mode', False))
+RESULTS_READ_CHUNK_SIZE = 64 * 1024
+MAX_CONCURRENT_RESULTS_BATCHES = 10
 TIME_UNIT_TO_MINUTES = {'minute': 1, 'hour': 60, 'day': 24 * 60, 'week': 7 * 24 * 60, 'month': 30 * 24 * 60,
                         'year': 365 * 24 * 60}
 
@@ -62,8 +68,6 @@ INCIDENTS = 'incidents'
 DUMMY = 'dummy'
 NOTABLE = 'notable'
 ENRICHMENTS = 'enrichments'
-MAX_HANDLE_NOTABLES = 20
-MAX_SUBMIT_NOTABLES = 30
 CACHE = 'cache'
 STATUS = 'status'
 DATA = 'data'
@@ -128,8 +132,9 @@ def fetch_notables(service, cache_object=None, enrich_notables=False):
             field_trimmed = field.strip()
             searchquery_oneshot = searchquery_oneshot + ' | eval ' + field_trimmed + '=' + field_trimmed
 
+    kwargs_oneshot.update(get_output_mode_kwargs())
     oneshotsearch_results = service.jobs.oneshot(searchquery_oneshot, **kwargs_oneshot)  # type: ignore
-    reader = results.ResultsReader(oneshotsearch_results)
+    reader = get_results_reader(oneshotsearch_results)
 
     notables = []
     for item in reader:
@@ -730,9 +735,33 @@ def asset_enrichment(service, notable_data, num_enrichment_events):
     return job
 
 
+def get_enrichment_jobs(service, notables):
+    """ Retrieves the Splunk jobs of the enrichments in progress of the given notables, using a single request
+     listing the search jobs, instead of a request per enrichment.
+
+    Args:
+        service (splunklib.client.Service): Splunk service object.
+        notables (list): The submitted notables.
+
+    Returns:
+        jobs (dict): The jobs of the enrichments in progress by their sid, without the jobs which were not found in
+         Splunk, or None if the jobs could not be retrieved.
+
+    """
+    enrichment_ids = {enrichment.id for notable in notables for enrichment in notable.enrichments
+                      if enrichment.status == Enrichment.IN_PROGRESS}
+    if not enrichment_ids:
+        return {}
+    try:
+        return {job.sid: job for job in service.jobs.list(count=0) if job.sid in enrichment_ids}
+    except Exception as e:
+        demisto.error("Caught an exception while retrieving the enrichment jobs: {}".format(str(e)))
+        return None
+
+
 def handle_submitted_notables(service, incidents, cache_object):
-    """ Handles submitted notables. For each submitted notable, tries to retrieve its results, if results aren't ready,
-     it moves to the next submitted notable.
+    """ Handles submitted notables. The status of all the enrichment jobs is retrieved at once, and an incident is
+     created for each submitted notable whose enrichments were all handled.
 
     Args:
         service (splunklib.client.Service): Splunk service object.
@@ -744,10 +773,11 @@ def handle_submitted_notables(service, incidents, cache_object):
     enrichment_timeout = arg_to_number(str(demisto.params().get('enrichment_timeout', '5')))
     notables = cache_object.submitted_notables
     total = len(notables)
-    demisto.debug("Trying to handle {}/{} open enrichments".format(len(notables[:MAX_HANDLE_NOTABLES]), total))
+    demisto.debug("Trying to handle {} open enrichments".format(total))
+    jobs = get_enrichment_jobs(service, notables)
 
-    for notable in notables[:MAX_HANDLE_NOTABLES]:
-        task_status = handle_submitted_notable(service, notable, enrichment_timeout)
+    for notable in notables:
+        task_status = handle_submitted_notable(service, notable, enrichment_timeout, jobs)
         if task_status:
             incidents.append(notable.to_incident())
             handled_notables.append(notable)
@@ -758,13 +788,14 @@ def handle_submitted_notables(service, incidents, cache_object):
         demisto.debug("Handled {}/{} notables.".format(len(handled_notables), total))
 
 
-def handle_submitted_notable(service, notable, enrichment_timeout):
+def handle_submitted_notable(service, notable, enrichment_timeout, jobs):
     """ Handles submitted notable. If enrichment process timeout has reached, creates an incident.
 
     Args:
         service (splunklib.client.Service): Splunk service object
         notable (Notable): The notable
         enrichment_timeout (int): The timeout for the enrichment process
+        jobs (dict): The jobs of the enrichments in progress by their sid, as returned from get_enrichment_jobs.
 
     Returns:
         notable_status (str): The status of the notable
@@ -775,10 +806,14 @@ def handle_submitted_notable(service, notable, enrichment_timeout):
     if not notable.is_enrichment_process_exceeding_timeout(enrichment_timeout):
         demisto.debug("Trying to handle open enrichment {}".format(notable.id))
         for enrichment in notable.enrichments:
-            if enrichment.status == Enrichment.IN_PROGRESS:
+            if enrichment.status == Enrichment.IN_PROGRESS and jobs is not None:
+                job = jobs.get(enrichment.id)
                 try:
-                    job = client.Job(service=service, sid=enrichment.id)
-                    if job.is_ready():
+                    if not job or job['dispatchState'] == 'FAILED':
+                        demisto.debug('The {} enrichment job of notable {} was not found or failed'.format(
+                            enrichment.type, notable.id))
+                        enrichment.status = Enrichment.FAILED
+                    elif job['isDone'] == '1':
                         demisto.debug('Handling open {} enrichment for notable {}'.format(enrichment.type, notable.id))
                         for item in results.ResultsReader(job.results()):
                             enrichment.data.append(item)
@@ -803,7 +838,8 @@ def handle_submitted_notable(service, notable, enrichment_timeout):
 
 
 def submit_notables(service, incidents, cache_object):
-    """ Submits fetched notables to Splunk for an enrichment.
+    """ Submits fetched notables to Splunk for an enrichment. Notables are submitted as long as the number of the
+     enrichment jobs in progress does not exceed the maximum number of running enrichment jobs.
 
     Args:
         service (splunklib.client.Service): Splunk service object
@@ -813,14 +849,24 @@ def submit_notables(service, incidents, cache_object):
     """
     failed_notables, submitted_notables = [], []
     num_enrichment_events = arg_to_number(str(demisto.params().get('num_enrichment_events', '20')))
+    # a notable needs a job for each enrichment type, so at least one notable can always be submitted
+    max_running_jobs = max(arg_to_number(demisto.params().get('max_running_enrichment_jobs') or '90'),
+                           len(ENABLED_ENRICHMENTS))
+    running_jobs = sum(enrichment.status == Enrichment.IN_PROGRESS
+                       for notable in cache_object.submitted_notables for enrichment in notable.enrichments)
     notables = cache_object.not_yet_submitted_notables
     total = len(notables)
     if notables:
-        demisto.debug('Enriching {}/{} fetched notables'.format(len(notables[:MAX_SUBMIT_NOTABLES]), total))
+        demisto.debug('Enriching fetched notables, {} notables are waiting and {} enrichment jobs are '
+                      'running'.format(total, running_jobs))
 
-    for notable in notables[:MAX_SUBMIT_NOTABLES]:
+    for notable in notables:
+        if running_jobs + len(ENABLED_ENRICHMENTS) - len(notable.enrichments) > max_running_jobs:
+            demisto.debug('Reached the maximum of {} running enrichment jobs'.format(max_running_jobs))
+            break
         task_status = submit_notable(service, notable, num_enrichment_events)
         if task_status:
+            running_jobs += sum(enrichment.status == Enrichment.IN_PROGRESS for enrichment in notable.enrichments)
             cache_object.submitted_notables.append(notable)
             submitted_notables.append(notable)
             demisto.debug('Submitted enrichment request to Splunk for notable {}'.format(notable.id))
@@ -1357,14 +1403,64 @@ class ResponseReaderWrapper(io.RawIOBase):
         return self.responseReader.read(n)
 
     def readinto(self, b):
-        sz = len(b)
-        data = self.responseReader.read(sz)
-        for idx, ch in enumerate(data):
-            b[idx] = ch
-
+        data = self.responseReader.read(len(b))
+        b[:len(data)] = data
         return len(data)
 
 
+class JSONResultsReader(object):
+    """ Reads search results requested from Splunk with output_mode=json.
+    Yields each message as a results.Message and each result as an OrderedDict, as results.ResultsReader does
+    for the XML output mode, while the results are read from the response, without parsing XML.
+    """
+
+    def __init__(self, response, chunk_size=RESULTS_READ_CHUNK_SIZE):
+        self.response = response
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        first_chunk = self.response.read(self.chunk_size)
+        if not first_chunk:
+            return
+        chunks = itertools.chain([first_chunk], iter(lambda: self.response.read(self.chunk_size), b''))
+        # the messages precede the results in the response, so they are saved once the first result is read
+        skipped_values = {}  # type: Dict[str, Any]
+        rows = iter_json_array_items(chunks, 'results', skipped_values=skipped_values, object_pairs_hook=OrderedDict)
+        try:
+            first_row = next(rows, None)
+        except ValueError:
+            # a response of a search without results might contain only messages
+            if 'messages' not in skipped_values:
+                raise
+            first_row = None
+
+        for message in skipped_values.get('messages') or []:
+            yield results.Message(message.get('type'), message.get('text'))
+        if first_row is None:
+            return
+        yield first_row
+        for row in rows:
+            yield row
+
+
+def get_output_mode_kwargs():
+    """ Returns the kwargs to request search results from Splunk in the configured output mode. """
+    return {'output_mode': 'json'} if USE_JSON_OUTPUT_MODE else {}
+
+
+def get_results_reader(response):
+    """ Returns a reader of the search results in the response, according to the configured output mode.
+
+    Args:
+        response (ResponseReader): The response of a search results request, requested with get_output_mode_kwargs.
+
+    Returns (JSONResultsReader or ResultsReader): The search results reader.
+    """
+    if USE_JSON_OUTPUT_MODE:
+        return JSONResultsReader(response)
+    return results.ResultsReader(io.BufferedReader(ResponseReaderWrapper(response)))
+
+
 def get_current_splunk_time(splunk_service):
     t = datetime.utcnow() - timedelta(days=3)
     time = t.strftime(SPLUNK_TIME_FORMAT)
@@ -1654,6 +1750,7 @@ def get_current_results_batch(search_job, batch_size, results_offset):
         "count": batch_size,
         "offset": results_offset
     }
+    current_batch_kwargs.update(get_output_mode_kwargs())
 
     results_batch = search_job.results(**current_batch_kwargs)
     return results_batch
@@ -1662,7 +1759,7 @@ def get_current_results_batch(search_job, batch_size, results_offset):
 def parse_batch_of_results(current_batch_of_results, max_results_to_add, app):
     parsed_batch_results = []
     batch_dbot_scores = []
-    results_reader = results.ResultsReader(io.BufferedReader(ResponseReaderWrapper(current_batch_of_results)))
+    results_reader = get_results_reader(current_batch_of_results)
     for item in results_reader:
         if isinstance(item, results.Message):
             if "Error in" in item.message:
@@ -1683,6 +1780,44 @@ def parse_batch_of_results(current_batch_of_results, max_results_to_add, app):
     return parsed_batch_results, batch_dbot_scores
 
 
+def get_parsed_results_batches(search_job, batch_size, results_count, app, max_concurrent_batches=1):
+    """Requests and parses the batches of the search job results, and yields them in the order of their offsets.
+    Up to max_concurrent_batches batches are requested and parsed concurrently, so the next batches are downloaded
+    while the previous ones are consumed, and no more than max_concurrent_batches batches are held at a time.
+
+    Args:
+        search_job (splunklib.client.Job): The search job to get its results.
+        batch_size (int): The number of results in a batch.
+        results_count (int): The number of results to get.
+        app (str): The application namespace of the search, added to the results.
+        max_concurrent_batches (int): The maximum number of batches requested at the same time.
+
+    Yields:
+        tuple: The parsed results and the DBot scores of each batch.
+    """
+    def get_parsed_batch(results_offset):
+        batch_of_results = get_current_results_batch(search_job, batch_size, results_offset)
+        return parse_batch_of_results(batch_of_results, min(batch_size, results_count - results_offset), app)
+
+    offsets = iter(xrange(0, results_count, batch_size))
+    if max_concurrent_batches <= 1:
+        for results_offset in offsets:
+            yield get_parsed_batch(results_offset)
+        return
+
+    pool = ThreadPool(max_concurrent_batches)
+    try:
+        pending_batches = deque(pool.apply_async(get_parsed_batch, (results_offset,))
+                                for results_offset in itertools.islice(offsets, max_concurrent_batches))
+        while pending_batches:
+            parsed_batch = pending_batches.popleft().get()
+            for results_offset in itertools.islice(offsets, 1):
+                pending_batches.append(pool.apply_async(get_parsed_batch, (results_offset,)))
+            yield parsed_batch
+    finally:
+        pool.terminate()
+
+
 def splunk_search_command(service):
     args = demisto.args()
 
@@ -1696,21 +1831,19 @@ def splunk_search_command(service):
         # In Splunk, a result limit of 0 means no limit.
         results_limit = float("inf")
     batch_size = int(demisto.args().get("batch_limit", 25000))
+    max_concurrent_batches = min(int(demisto.args().get("max_concurrent_batches", 1)), MAX_CONCURRENT_RESULTS_BATCHES)
+    results_count = int(min(int(num_of_results_from_query), results_limit))
 
-    results_offset = 0
     total_parsed_results = []  # type: List[Dict[str,Any]]
     dbot_scores = []  # type: List[Dict[str,Any]]
 
-    while len(total_parsed_results) < int(num_of_results_from_query) and len(total_parsed_results) < results_limit:
-        current_batch_of_results = get_current_results_batch(search_job, batch_size, results_offset)
-        max_results_to_add = results_limit - len(total_parsed_results)
-        parsed_batch_results, batch_dbot_scores = parse_batch_of_results(current_batch_of_results, max_results_to_add,
-                                                                         search_kwargs.get('app', ''))
+    # the batches are parsed as they arrive, so only the parsed results are held and not the raw batches
+    for parsed_batch_results, batch_dbot_scores in get_parsed_results_batches(search_job, batch_size, results_count,
+                                                                              search_kwargs.get('app', ''),
+                                                                              max_concurrent_batches):
         total_parsed_results.extend(parsed_batch_results)
         dbot_scores.extend(batch_dbot_scores)
 
-        results_offset += batch_size
-
     entry_context = create_entry_context(args, total_parsed_results, dbot_scores)
     human_readable = build_search_human_readable(args, total_parsed_results)
 
@@ -1757,7 +1890,7 @@ def splunk_results_command(service):
         else:
             return_error(error.message, error)
     else:
-        for result in results.ResultsReader(job.results(count=limit)):
+        for result in get_results_reader(job.results(count=limit, **get_output_mode_kwargs())):
             if isinstance(result, results.Message):
                 demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(result.message)})
             elif isinstance(result, dict):
@@ -1,3 +1,4 @@
+import io
 from copy import deepcopy
 import pytest
 import SplunkPy as splunk
@@ -570,6 +571,148 @@ def test_is_enrichment_exceeding_timeout(drilldown_creation_time, asset_creation
     assert notable.is_enrichment_process_exceeding_timeout(enrichment_timeout) is output
 
 
+class MockJob(dict):
+    def __init__(self, sid, dispatch_state='DONE', is_done='1'):
+        super(MockJob, self).__init__(dispatchState=dispatch_state, isDone=is_done)
+        self.sid = sid
+
+    def results(self):
+        return self.sid
+
+
+def test_handle_submitted_notables(mocker):
+    """
+    Scenario: The status of the enrichment jobs of all the submitted notables is retrieved at once, and an incident
+     is created for each notable whose enrichments were all handled.
+
+    Given:
+    - A notable whose enrichment jobs are done
+    - A notable with a done enrichment job and a running one
+    - A notable whose enrichment job was not found in Splunk
+
+    When:
+    - handle_submitted_notables is called
+
+    Then:
+    - Ensure the jobs are listed with a single request
+    - Ensure incidents are created for the first and third notables, and the second notable is still submitted
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.DRILLDOWN_ENRICHMENT, splunk.ASSET_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={'enrichment_timeout': '5'})
+    mocker.patch('splunklib.results.ResultsReader', side_effect=lambda sid: [{'result_of': sid}])
+    notables = []
+    for notable_id, enrichment_ids in (('n1', ('d1', 'a1')), ('n2', ('d2', 'a2')), ('n3', ('d3', 'a3'))):
+        notable = splunk.Notable({splunk.EVENT_ID: notable_id})
+        notable.enrichments = [splunk.Enrichment(splunk.DRILLDOWN_ENRICHMENT, enrichment_id=enrichment_ids[0]),
+                               splunk.Enrichment(splunk.ASSET_ENRICHMENT, enrichment_id=enrichment_ids[1])]
+        notables.append(notable)
+    service = mocker.Mock()
+    service.jobs.list.return_value = [MockJob('d1'), MockJob('a1'), MockJob('d2'),
+                                      MockJob('a2', dispatch_state='RUNNING', is_done='0'), MockJob('a3'),
+                                      MockJob('other')]
+    cache_object = splunk.Cache(submitted_notables=list(notables))
+    incidents = []
+
+    splunk.handle_submitted_notables(service, incidents, cache_object)
+
+    service.jobs.list.assert_called_once_with(count=0)
+    assert [json.loads(incident['rawJSON'])[splunk.EVENT_ID] for incident in incidents] == ['n1', 'n3']
+    assert cache_object.submitted_notables == [notables[1]]
+    assert notables[0].enrichments[0].data == [{'result_of': 'd1'}]
+    assert [e.status for e in notables[1].enrichments] == [splunk.Enrichment.SUCCESSFUL, splunk.Enrichment.IN_PROGRESS]
+    assert [e.status for e in notables[2].enrichments] == [splunk.Enrichment.FAILED, splunk.Enrichment.SUCCESSFUL]
+
+
+def test_handle_submitted_notables_jobs_listing_failed(mocker):
+    """
+    Given:
+    - A submitted notable, and the request listing the jobs fails
+
+    When:
+    - handle_submitted_notables is called
+
+    Then:
+    - Ensure the enrichments are still in progress, and no incident is created
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.DRILLDOWN_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={'enrichment_timeout': '5'})
+    mocker.patch.object(demisto, 'error')
+    notable = splunk.Notable({splunk.EVENT_ID: 'n1'},
+                             enrichments=[splunk.Enrichment(splunk.DRILLDOWN_ENRICHMENT, enrichment_id='d1')])
+    service = mocker.Mock()
+    service.jobs.list.side_effect = Exception('connection error')
+    cache_object = splunk.Cache(submitted_notables=[notable])
+    incidents = []
+
+    splunk.handle_submitted_notables(service, incidents, cache_object)
+
+    assert incidents == []
+    assert cache_object.submitted_notables == [notable]
+    assert notable.enrichments[0].status == splunk.Enrichment.IN_PROGRESS
+
+
+def test_submit_notables_max_running_jobs(mocker):
+    """
+    Scenario: Notables are submitted as long as the enrichment jobs in progress do not exceed the maximum.
+
+    Given:
+    - Two enrichment types, a maximum of 5 running enrichment jobs, and a submitted notable with 2 running jobs
+    - Three notables waiting to be submitted
+
+    When:
+    - submit_notables is called
+
+    Then:
+    - Ensure only the first waiting notable is submitted, and the others are still waiting
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.DRILLDOWN_ENRICHMENT, splunk.ASSET_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={'max_running_enrichment_jobs': '5'})
+    mocker.patch.object(splunk, 'drilldown_enrichment', return_value={'sid': 'drilldown'})
+    mocker.patch.object(splunk, 'asset_enrichment', return_value={'sid': 'asset'})
+    submitted_notable = splunk.Notable({splunk.EVENT_ID: 'n0'}, enrichments=[
+        splunk.Enrichment(splunk.DRILLDOWN_ENRICHMENT, enrichment_id='d0'),
+        splunk.Enrichment(splunk.ASSET_ENRICHMENT, enrichment_id='a0')])
+    waiting_notables = [splunk.Notable({splunk.EVENT_ID: notable_id}) for notable_id in ('n1', 'n2', 'n3')]
+    cache_object = splunk.Cache(not_yet_submitted_notables=list(waiting_notables),
+                                submitted_notables=[submitted_notable])
+    incidents = []
+
+    splunk.submit_notables(mocker.Mock(), incidents, cache_object)
+
+    assert incidents == []
+    assert cache_object.submitted_notables == [submitted_notable, waiting_notables[0]]
+    assert cache_object.not_yet_submitted_notables == waiting_notables[1:]
+    assert splunk.drilldown_enrichment.call_count == 1
+
+
+@pytest.mark.parametrize('max_running_enrichment_jobs', [None, ''])
+def test_submit_notables_default_max_running_jobs(mocker, max_running_enrichment_jobs):
+    """
+    Scenario: The maximum of running enrichment jobs defaults to 90 when it is not set.
+
+    Given:
+    - Two enrichment types, and an empty maximum of running enrichment jobs
+    - Three notables waiting to be submitted
+
+    When:
+    - submit_notables is called
+
+    Then:
+    - Ensure all the waiting notables are submitted
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.DRILLDOWN_ENRICHMENT, splunk.ASSET_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={'max_running_enrichment_jobs': max_running_enrichment_jobs})
+    mocker.patch.object(splunk, 'drilldown_enrichment', return_value={'sid': 'drilldown'})
+    mocker.patch.object(splunk, 'asset_enrichment', return_value={'sid': 'asset'})
+    waiting_notables = [splunk.Notable({splunk.EVENT_ID: notable_id}) for notable_id in ('n1', 'n2', 'n3')]
+    cache_object = splunk.Cache(not_yet_submitted_notables=list(waiting_notables))
+
+    splunk.submit_notables(mocker.Mock(), [], cache_object)
+
+    assert cache_object.submitted_notables == waiting_notables
+    assert cache_object.not_yet_submitted_notables == []
+
+
 INCIDENT_1 = {'name': 'incident1', 'rawJSON': json.dumps({})}
 INCIDENT_2 = {'name': 'incident2', 'rawJSON': json.dumps({})}
 
@@ -1070,3 +1213,186 @@ def test_build_search_human_readable(mocker):
     splunk.build_search_human_readable(args, results)
     headers = func_patch.call_args[0][1]
     assert headers == expected_headers
+
+
+SEARCH_RESULTS_JSON = '{"preview": false, "init_offset": 0, ' \
+                      '"messages": [{"type": "DEBUG", "text": "base lispy: [ AND ]"}], ' \
+                      '"fields": [{"name": "host"}, {"name": "count"}], ' \
+                      '"results": [{"host": "host1", "count": "1.5"}, ' \
+                      '{"host": "host2", "count": "2", "values": ["a", "b"]}]}'
+
+
+def test_response_reader_wrapper_readinto():
+    """
+    Given:
+        a search results response
+
+    When:
+        reading it through a buffered ResponseReaderWrapper
+
+    Then:
+        the whole response is read
+    """
+    data = b'<results>' + b'a' * 100000 + b'</results>'
+    reader = io.BufferedReader(splunk.ResponseReaderWrapper(io.BytesIO(data)))
+    assert reader.read(len(data)) == data
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_json_results_reader(chunk_size):
+    """
+    Given:
+        a search results response in JSON output mode, read in chunks of different sizes
+
+    When:
+        iterating the results with JSONResultsReader
+
+    Then:
+        the messages are yielded as results.Message before the results, and the results keep their fields order
+    """
+    reader = splunk.JSONResultsReader(io.BytesIO(SEARCH_RESULTS_JSON.encode('utf-8')), chunk_size=chunk_size)
+
+    items = list(reader)
+
+    assert isinstance(items[0], splunk.results.Message)
+    assert items[0].type == 'DEBUG'
+    assert items[0].message == 'base lispy: [ AND ]'
+    assert items[1:] == [{'host': 'host1', 'count': '1.5'}, {'host': 'host2', 'count': '2', 'values': ['a', 'b']}]
+    assert list(items[2].keys()) == ['host', 'count', 'values']
+
+
+@pytest.mark.parametrize('response, expected_messages', [
+    (b'', []),
+    (json.dumps({'messages': [{'type': 'FATAL', 'text': 'Error in search'}]}).encode('utf-8'), ['Error in search']),
+    (json.dumps({'messages': [], 'results': []}).encode('utf-8'), []),
+])
+def test_json_results_reader_without_results(response, expected_messages):
+    """
+    Given:
+        an empty search results response, a response with only messages, and a response with no results
+
+    When:
+        iterating the results with JSONResultsReader
+
+    Then:
+        only the messages are yielded
+    """
+    items = list(splunk.JSONResultsReader(io.BytesIO(response)))
+    assert [item.message for item in items] == expected_messages
+
+
+def test_parse_batch_of_results_json_output_mode(mocker):
+    """
+    Given:
+        a batch of search results in JSON output mode
+
+    When:
+        parsing the batch with parse_batch_of_results
+
+    Then:
+        the messages and results are parsed, and a DBot score is added for each host
+    """
+    mocker.patch.object(splunk, 'USE_JSON_OUTPUT_MODE', True)
+    response = io.BytesIO(SEARCH_RESULTS_JSON.encode('utf-8'))
+
+    parsed_results, dbot_scores = splunk.parse_batch_of_results(response, 10, 'search')
+
+    assert parsed_results[0] == 'base lispy: [ AND ]'
+    assert [result['host'] for result in parsed_results[1:]] == ['host1', 'host2']
+    assert all(result['app'] == 'search' for result in parsed_results[1:])
+    assert [score['Indicator'] for score in dbot_scores] == ['host1', 'host2']
+
+
+def test_get_current_results_batch_output_mode(mocker):
+    """
+    Given:
+        the JSON output mode is configured
+
+    When:
+        requesting a batch of search results
+
+    Then:
+        the results are requested with output_mode=json
+    """
+    mocker.patch.object(splunk, 'USE_JSON_OUTPUT_MODE', True)
+    search_job = mocker.Mock()
+
+    splunk.get_current_results_batch(search_job, 100, 200)
+
+    search_job.results.assert_called_with(count=100, offset=200, output_mode='json')
+
+
+@pytest.mark.parametrize('max_concurrent_batches', [1, 3])
+def test_get_parsed_results_batches(mocker, max_concurrent_batches):
+    """
+    Given:
+        a search job with 10 results, where the first batches are the slowest to respond
+
+    When:
+        getting its results in batches of 3, with and without concurrent batches
+
+    Then:
+        the batches are yielded in the order of their offsets, no more than max_concurrent_batches batches are
+        requested at a time, and the last batch is limited to the remaining results
+    """
+    import threading
+    import time
+    mocker.patch.object(splunk, 'USE_JSON_OUTPUT_MODE', True)
+    lock = threading.Lock()
+    requests_state = {'running': 0, 'max_running': 0}
+
+    def get_results(count, offset, output_mode):
+        with lock:
+            requests_state['running'] += 1
+            requests_state['max_running'] = max(requests_state['max_running'], requests_state['running'])
+        time.sleep(0.01 * (10 - offset) / 3)
+        with lock:
+            requests_state['running'] -= 1
+        rows = [{'host': 'host{}'.format(i)} for i in range(offset, offset + count)]
+        return io.BytesIO(json.dumps({'results': rows}).encode('utf-8'))
+
+    search_job = mocker.Mock()
+    search_job.results.side_effect = get_results
+
+    batches = list(splunk.get_parsed_results_batches(search_job, 3, 10, '', max_concurrent_batches))
+
+    assert [[row['host'] for row in parsed_results] for parsed_results, _ in batches] == \
+        [['host0', 'host1', 'host2'], ['host3', 'host4', 'host5'], ['host6', 'host7', 'host8'], ['host9']]
+    assert [len(dbot_scores) for _, dbot_scores in batches] == [3, 3, 3, 1]
+    assert 1 <= requests_state['max_running'] <= max_concurrent_batches
+    assert search_job.results.call_count == 4
+
+
+def test_splunk_search_command_concurrent_batches(mocker):
+    """
+    Given:
+        a search with 5 results, an event limit of 4 and a batch limit of 2, with 2 concurrent batches
+
+    When:
+        running the splunk-search command
+
+    Then:
+        only the batches of the first 4 results are requested, and the results are returned in their order
+    """
+    mocker.patch.object(splunk, 'USE_JSON_OUTPUT_MODE', True)
+    mocker.patch.object(demisto, 'args', return_value={'query': 'index=main', 'event_limit': '4', 'batch_limit': '2',
+                                                       'max_concurrent_batches': '2'})
+    mocker.patch.object(demisto, 'results')
+
+    def get_results(count, offset, output_mode):
+        rows = [{'host': 'host{}'.format(i)} for i in range(offset, offset + count)]
+        return io.BytesIO(json.dumps({'results': rows}).encode('utf-8'))
+
+    search_job = mocker.MagicMock()
+    search_job.__getitem__.return_value = '5'
+    search_job.results.side_effect = get_results
+    service = mocker.Mock()
+    service.jobs.create.return_value = search_job
+
+    splunk.splunk_search_command(service)
+
+    entry = demisto.results.call_args[0][0]
+    assert [result['host'] for result in entry['Contents']] == ['host0', 'host1', 'host2', 'host3']
+    assert [score['Indicator'] for score in entry['EntryContext']['DBotScore']] == \
+        ['host0', 'host1', 'host2', 'host3']
+    assert search_job.results.call_count == 2
@@ -9,6 +9,7 @@ from typing import Callable, List, Generator
 from ssl import SSLContext, SSLError, PROTOCOL_TLSv1_2
 from multiprocessing import Process
 from werkzeug.datastructures import Headers
+from collections import OrderedDict
 
 from libtaxii.messages_11 import (
     TAXIIMessage,
@@ -56,6 +57,8 @@ import pytz
 ''' GLOBAL VARIABLES '''
 INTEGRATION_NAME: str = 'TAXII Server'
 PAGE_SIZE = 200
+# the maximal number of indicators whose STIX content block is cached
+MAX_CACHED_STIX_INDICATORS = 10000
 APP: Flask = Flask('demisto-taxii')
 NAMESPACE_URI = 'https://www.paloaltonetworks.com/cortex'
 NAMESPACE = 'cortex'
@@ -105,6 +108,8 @@ class TAXIIServer:
         self.auth = None
         if credentials:
             self.auth = (credentials.get('identifier', ''), credentials.get('password', ''))
+        # indicator ID -> (indicator version, STIX content block XML), in least recently used order
+        self.stix_cache: OrderedDict = OrderedDict()
 
         self.service_instances = [
             {
@@ -259,18 +264,12 @@ class TAXIIServer:
 
             yield response
 
-            # yield the content blocks
+            # yield the content blocks, the indicators are searched page by page while they are streamed
             indicator_query = self.collections[str(collection_name)]
 
             for indicator in find_indicators_by_time_frame(indicator_query, exclusive_begin_time, inclusive_end_time):
                 try:
-                    stix_xml_indicator = get_stix_indicator(indicator).to_xml(ns_dict={NAMESPACE_URI: NAMESPACE})
-                    content_block = ContentBlock(
-                        content_binding=CB_STIX_XML_11,
-                        content=stix_xml_indicator
-                    )
-
-                    content_xml = content_block.to_xml().decode('utf-8')
+                    content_xml = self.get_content_block_xml(indicator)
                     yield f'{content_xml}\n'
                 except Exception as e:
                     handle_long_running_error(f'Failed parsing indicator to STIX: {e}')
@@ -289,6 +288,38 @@ class TAXIIServer:
             mimetype='application/xml'
         )
 
+    def get_content_block_xml(self, indicator: dict) -> str:
+        """
+        Get the STIX content block of an indicator, which is rendered once for each version of the indicator,
+        as the same indicators are polled by many consumers and overlapping time frames.
+        Args:
+            indicator: The Demisto indicator.
+
+        Returns:
+            The STIX content block XML string.
+        """
+        indicator_id = indicator.get('id')
+        indicator_version = (indicator.get('version'), indicator.get('modified'))
+        cached = self.stix_cache.get(indicator_id) if indicator_id else None
+        if cached and cached[0] == indicator_version:
+            self.stix_cache.move_to_end(indicator_id)
+            return cached[1]
+
+        stix_xml_indicator = get_stix_indicator(indicator).to_xml(ns_dict={NAMESPACE_URI: NAMESPACE})
+        content_block = ContentBlock(
+            content_binding=CB_STIX_XML_11,
+            content=stix_xml_indicator
+        )
+        content_xml = content_block.to_xml().decode('utf-8')
+
+        if indicator_id:
+            # replaces the content block of a previous version of the indicator
+            self.stix_cache[indicator_id] = (indicator_version, content_xml)
+            self.stix_cache.move_to_end(indicator_id)
+            if len(self.stix_cache) > MAX_CACHED_STIX_INDICATORS:
+                self.stix_cache.popitem(last=False)
+        return content_xml
+
     def get_url(self, request_headers: Headers) -> str:
         """
         Args:
@@ -722,7 +753,7 @@ def get_collections(params: dict = demisto.params()) -> dict:
     return collections
 
 
-def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, end_time: datetime) -> list:
+def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, end_time: datetime) -> Generator:
     """
     Find indicators according to a query and begin time/end time.
     Args:
@@ -731,7 +762,7 @@ def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, en
         end_time: The inclusive end time.
 
     Returns:
-        Indicator query results from Demisto.
+        Generator of the indicator query results from Demisto, searched page by page as they are consumed.
     """
 
     if indicator_query:
@@ -752,26 +783,23 @@ def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, en
     return find_indicators_loop(indicator_query)
 
 
-def find_indicators_loop(indicator_query: str):
+def find_indicators_loop(indicator_query: str) -> Generator:
     """
     Find indicators in a loop according to a query.
     Args:
         indicator_query: The indicator query.
 
-    Returns:
-        Indicator query results from Demisto.
+    Yields:
+        Indicator query results from Demisto, a page is searched only after the previous page was consumed.
     """
-    iocs: List[dict] = []
-    total_fetched = 0
     last_found_len = PAGE_SIZE
     search_indicators = IndicatorsSearcher()
 
     while last_found_len == PAGE_SIZE:
-        fetched_iocs = search_indicators.search_indicators_by_version(query=indicator_query, size=PAGE_SIZE).get('iocs')
-        iocs.extend(fetched_iocs)
+        fetched_iocs = search_indicators.search_indicators_by_version(
+            query=indicator_query, size=PAGE_SIZE).get('iocs') or []
         last_found_len = len(fetched_iocs)
-        total_fetched += last_found_len
-    return iocs
+        yield from fetched_iocs
 
 
 def taxii_make_response(taxii_message: TAXIIMessage):
@@ -398,13 +398,87 @@ def test_find_indicators_loop(mocker):
     mocker.patch.object(demisto, 'searchIndicators', return_value=json.loads(IP_INDICATORS))
 
     # Arrange
-    indicators = find_indicators_loop('q')
+    indicators = list(find_indicators_loop('q'))
 
     # Assert
     assert len(indicators) == 1
     assert indicators[0]['value'] == '52.218.100.20'
 
 
+def test_stream_stix_data_feed_searches_while_streaming(mocker):
+    """
+    Given:
+        - A collection with 2 pages of indicators
+
+    When:
+        - Streaming the poll response of the collection
+
+    Then:
+        - Ensure the opening tag is streamed before the indicators are searched
+        - Ensure the next page is searched only after the indicators of the first page were streamed
+    """
+    import TAXIIServer
+    ip_indicator = json.loads(IP_INDICATORS)['iocs'][0]
+    search_indicators = mocker.patch.object(demisto, 'searchIndicators', side_effect=[
+        {'iocs': [ip_indicator] * TAXIIServer.PAGE_SIZE, 'total': TAXIIServer.PAGE_SIZE + 1},
+        {'iocs': [ip_indicator], 'total': TAXIIServer.PAGE_SIZE + 1},
+    ])
+    mocker.patch.object(demisto, 'info')
+    taxii_server = TAXIIServer.TAXIIServer(
+        url_scheme='http', host='host', port=9000, collections={'default': 'type:IP'},
+        certificate='', private_key='', http_server=False, credentials={}
+    )
+
+    with TAXIIServer.APP.test_request_context():
+        response = taxii_server.stream_stix_data_feed(['default'], '1', 'default', None, None)
+        chunks = iter(response.response)
+
+        assert next(chunks).startswith('<taxii_11:Poll_Response')
+        assert search_indicators.call_count == 0
+        for _ in range(TAXIIServer.PAGE_SIZE):
+            assert '52.218.100.20' in next(chunks)
+        assert search_indicators.call_count == 1
+        assert '52.218.100.20' in next(chunks)
+        assert search_indicators.call_count == 2
+        assert list(chunks) == ['</taxii_11:Poll_Response>']
+
+
+def test_get_content_block_xml_cache(mocker):
+    """
+    Given:
+        - An indicator that is polled twice, then modified and polled again
+        - A cache bounded to a single indicator
+
+    When:
+        - Getting the STIX content block of the indicators
+
+    Then:
+        - Ensure the content block is rendered once for each version of the indicator
+        - Ensure the least recently used indicator is evicted from the cache
+    """
+    import TAXIIServer
+    mocker.patch.object(TAXIIServer, 'MAX_CACHED_STIX_INDICATORS', 1)
+    get_stix_indicator = mocker.patch.object(TAXIIServer, 'get_stix_indicator', wraps=TAXIIServer.get_stix_indicator)
+    taxii_server = TAXIIServer.TAXIIServer(
+        url_scheme='http', host='host', port=9000, collections={'default': 'type:IP'},
+        certificate='', private_key='', http_server=False, credentials={}
+    )
+    indicator = json.loads(IP_INDICATORS)['iocs'][0]
+    modified_indicator = dict(indicator, version=2, score=3)
+
+    content_xml = taxii_server.get_content_block_xml(indicator)
+    assert taxii_server.get_content_block_xml(indicator) == content_xml
+    assert get_stix_indicator.call_count == 1
+    modified_content_xml = taxii_server.get_content_block_xml(modified_indicator)
+    assert get_stix_indicator.call_count == 2
+    assert '>High<' in modified_content_xml
+    assert taxii_server.get_content_block_xml(modified_indicator) == modified_content_xml
+    assert get_stix_indicator.call_count == 2
+
+    taxii_server.get_content_block_xml(dict(indicator, id='other'))
+    assert list(taxii_server.stix_cache) == ['other']
+
+
 @pytest.mark.parametrize('indicator',
                          [json.loads(IP_INDICATORS)['iocs'][0], json.loads(URL_INDICATORS)['iocs'][0],
                           json.loads(EMAIL_INDICATORS)['iocs'][0], json.loads(CIDR_INDICATORS)['iocs'][0],